@@ -0,0 +1,206 @@
+/*
+  Microbenchmark of the copy engine of xndtools.c.
+
+  Measures xndtools_cpy (gather of a fixed dims argument into a C
+  contiguous temporary) and xndtools_invcpy (scatter back) for item
+  sizes 1, 2, 4, 8 and 16, ranks 1 to 4, and the following layouts of
+  the argument:
+
+    unit        C contiguous, copied with a single memcpy
+    strided     step 2 in the last dimension
+    negative    step -1 in the last dimension
+    transposed  Fortran contiguous (ranks 2 and larger)
+
+  The sizes of the copied data range from L1 cache size to beyond the
+  last level cache. Each record of the JSON output contains ns/call,
+  GB/s and the ratio to the bandwidth of memcpy of the same number of
+  bytes.
+
+  Usage:
+
+    xndtools_bench [<min seconds per case, default 0.01> [<max bytes, default 64 MiB>]]
+
+  The benchmark is built and run by
+
+    XNDTOOLS_BENCH=. py.test -sv -m bench xndtools/kernel_generator/tests/test_copy_bench.py
+
+  that saves the records to test_copy_bench-bench.json. To build it
+  manually:
+
+    cc -O2 -std=c11 -I<ndtypes and xnd include dirs> \
+       -I../xndtools/kernel_generator xndtools_bench.c \
+       ../xndtools/kernel_generator/xndtools.c -lxnd -lndtypes -lpthread -lm -o xndtools_bench
+
+  The benchmark is kept outside of xndtools/kernel_generator because
+  all C sources there are compiled into generated extension modules.
+
+  Set XNDTOOLS_COPY_THREADS to benchmark the parallel copy of large
+  arrays.
+*/
+
+#define _POSIX_C_SOURCE 200809L
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <inttypes.h>
+
+#include "xndtools.h"
+
+enum bench_layout { BENCH_UNIT, BENCH_STRIDED, BENCH_NEGATIVE, BENCH_TRANSPOSED, BENCH_NLAYOUTS };
+static const char* bench_layout_names[] = { "unit", "strided", "negative", "transposed" };
+static const int64_t bench_itemsizes[] = { 1, 2, 4, 8, 16, 0 };
+static const int64_t bench_sizes[] = { 16 << 10, 256 << 10, 2 << 20, 16 << 20, 64 << 20, 256 << 20, 0 };
+
+static int bench_nrecords = 0;
+
+/* called through a volatile pointer so that the baseline copies are not optimized away */
+static void* (*volatile bench_memcpy)(void*, const void*, size_t) = memcpy;
+
+static ndt_t* bench_dtype(int64_t itemsize, ndt_context_t *ctx) {
+  switch (itemsize) {
+  case 1: return ndt_primitive(Int8, 0, ctx);
+  case 2: return ndt_primitive(Int16, 0, ctx);
+  case 4: return ndt_primitive(Int32, 0, ctx);
+  case 8: return ndt_primitive(Int64, 0, ctx);
+  default: return ndt_primitive(Complex128, 0, ctx);
+  }
+}
+
+/*
+  Return the view type of rank ndim with nitems items of given
+  layout, and set the index of the first item and the number of items
+  in the underlying buffer. Return NULL on failure.
+ */
+static ndt_t* bench_type(int64_t itemsize, int ndim, int64_t nitems, enum bench_layout layout,
+			 int64_t* index, int64_t* buffer_items, ndt_context_t *ctx) {
+  int64_t shape[NDT_MAX_DIM], step[NDT_MAX_DIM];
+  int64_t n = 1, m = nitems;
+  /* equal dimensions, the last one takes the rest */
+  while (ndim > 1) {
+    int64_t p = 1;
+    for (int k=1; k<ndim; k++)
+      p *= n + 1;
+    if (p * (n + 1) > nitems)
+      break;
+    n++;
+  }
+  for (int k=0; k<ndim-1; k++) {
+    shape[k] = n;
+    m /= n;
+  }
+  shape[ndim-1] = m;
+  *index = 0;
+  *buffer_items = 1;
+  for (int k=0; k<ndim; k++)
+    *buffer_items *= shape[k];
+  switch (layout) {
+  case BENCH_UNIT:
+    for (int k=0; k<ndim; k++)
+      step[k] = INT64_MAX;
+    break;
+  case BENCH_TRANSPOSED:
+    step[0] = 1;
+    for (int k=1; k<ndim; k++)
+      step[k] = step[k-1] * shape[k-1];
+    break;
+  default:
+    step[ndim-1] = (layout == BENCH_STRIDED ? 2 : -1);
+    if (layout == BENCH_STRIDED)
+      *buffer_items *= 2;
+    else
+      *index = shape[ndim-1] - 1;
+    for (int k=ndim-2; k>=0; k--)
+      step[k] = (k == ndim-2 ? (layout == BENCH_STRIDED ? 2 : 1) * shape[k+1] : step[k+1] * shape[k+1]);
+  }
+  ndt_t* t = bench_dtype(itemsize, ctx);
+  for (int k=ndim-1; k>=0 && t != NULL; k--)
+    t = ndt_fixed_dim(t, shape[k], step[k], ctx);
+  return t;
+}
+
+/*
+  Return the average duration of a call in ns, doubling the number of
+  calls until min_seconds is reached.
+ */
+#define BENCH_TIME(result, ncalls, min_seconds, call)			\
+  do {									\
+    call; /* warm-up */							\
+    for (int64_t n_ = 1; ; n_ *= 2) {					\
+      int64_t start_ = xndtools_profile_clock();			\
+      for (int64_t i_=0; i_<n_; i_++)					\
+	call;								\
+      int64_t elapsed_ = xndtools_profile_clock() - start_;		\
+      if (elapsed_ >= (min_seconds) * 1e9 || n_ >= ((int64_t)1 << 40)) { \
+	(ncalls) = n_;							\
+	(result) = (double)elapsed_ / n_;				\
+	break;								\
+      }									\
+    }									\
+  } while (0)
+
+static void bench_record(const char* function, int64_t itemsize, int ndim, const char* layout,
+			 int64_t nbytes, int64_t ncalls, double ns, double memcpy_gbps) {
+  printf("%s\n  {\"function\": \"%s\", \"itemsize\": %" PRIi64 ", \"ndim\": %d, \"layout\": \"%s\", "
+	 "\"bytes\": %" PRIi64 ", \"threads\": %d, \"calls\": %" PRIi64 ", \"ns_per_call\": %.1f, "
+	 "\"gbps\": %.3f, \"memcpy_ratio\": %.3f}",
+	 (bench_nrecords++ ? "," : ""), function, itemsize, ndim, layout, nbytes,
+	 xndtools_get_copy_threads(), ncalls, ns, nbytes / ns, nbytes / ns / memcpy_gbps);
+}
+
+int main(int argc, char* argv[]) {
+  NDT_STATIC_CONTEXT(ctx);
+  double min_seconds = (argc > 1 ? atof(argv[1]) : 0.01);
+  int64_t max_bytes = (argc > 2 ? atoll(argv[2]) : (int64_t)64 << 20);
+  if (ndt_init(&ctx) < 0) {
+    ndt_err_fprint(stderr, &ctx);
+    return 1;
+  }
+  printf("[");
+  for (int s=0; bench_sizes[s] > 0 && bench_sizes[s] <= max_bytes; s++) {
+    int64_t nbytes = bench_sizes[s], ncalls;
+    char* buffer = xndtools_malloc(2 * nbytes, &ctx);
+    char* dest = xndtools_malloc(nbytes, &ctx);
+    double memcpy_ns, memcpy_gbps;
+    if (buffer == NULL || dest == NULL) {
+      ndt_err_fprint(stderr, &ctx);
+      return 1;
+    }
+    memset(buffer, 1, 2 * nbytes);
+    memset(dest, 0, nbytes);
+    BENCH_TIME(memcpy_ns, ncalls, min_seconds, bench_memcpy(dest, buffer, nbytes));
+    memcpy_gbps = nbytes / memcpy_ns;
+    bench_record("memcpy", 1, 1, "unit", nbytes, ncalls, memcpy_ns, memcpy_gbps);
+    for (int i=0; bench_itemsizes[i] > 0; i++) {
+      int64_t itemsize = bench_itemsizes[i];
+      for (int ndim=1; ndim<=4; ndim++)
+	for (int layout=0; layout<BENCH_NLAYOUTS; layout++) {
+	  int64_t index, buffer_items;
+	  double ns;
+	  if (layout == BENCH_TRANSPOSED && ndim < 2)
+	    continue;
+	  ndt_t* t = bench_type(itemsize, ndim, nbytes / itemsize, layout, &index, &buffer_items, &ctx);
+	  if (t == NULL) {
+	    ndt_err_fprint(stderr, &ctx);
+	    return 1;
+	  }
+	  xnd_t x = { .bitmap = {0}, .index = index, .type = t, .ptr = buffer };
+	  int64_t xbytes = xndtools_fixed_nbytes(&x);
+	  if (buffer_items * itemsize > 2 * nbytes) {
+	    fprintf(stderr, "xndtools_bench: buffer overflow\n");
+	    return 1;
+	  }
+	  BENCH_TIME(ns, ncalls, min_seconds, xndtools_cpy(dest, &x, false));
+	  bench_record("xndtools_cpy", itemsize, ndim, bench_layout_names[layout], xbytes, ncalls, ns, memcpy_gbps);
+	  BENCH_TIME(ns, ncalls, min_seconds, xndtools_invcpy(dest, &x, false));
+	  bench_record("xndtools_invcpy", itemsize, ndim, bench_layout_names[layout], xbytes, ncalls, ns, memcpy_gbps);
+	  ndt_del(t);
+	}
+    }
+    xndtools_free(dest);
+    xndtools_free(buffer);
+  }
+  printf("\n]\n");
+  ndt_finalize();
+  return 0;
+}
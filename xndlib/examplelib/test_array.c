@@ -30,3 +30,61 @@ long test_array_ranges(long n, long*x)
   }
   return s;
 }
+
+long test_array_ranges_lda(long m, long n, long*x, long lda)
+{
+  int i, j;
+  long s = 0;
+  for (i=0; i<m; i++) {
+    for (j=0; j<n; j++) {
+      s += x[i*lda+j]; // to verify expected input
+      x[i*lda+j] = i*10+j;
+    }
+  }
+  return s;
+}
+
+long test_array_range_inc(long n, long*x, long incx)
+{
+  int i;
+  long s = 0;
+  long ix = (incx < 0 ? (1 - n) * incx : 0); // BLAS convention
+  for (i=0; i<n; i++) {
+    s += x[ix]; // to verify expected input
+    x[ix] = i;
+    ix += incx;
+  }
+  return s;
+}
+
+void test_array_square(long n, long*x, long*r)
+{
+  int i;
+  for (i=0; i<n; i++) {
+    r[i] = x[i];
+    x[i] = x[i] * x[i];
+  }
+}
+
+void test_array_copy(long n, const long*a, long*r)
+{
+  int i;
+  for (i=0; i<n; i++)
+    r[i] = a[i];
+}
+
+void test_array_negate_inc(long n, long*x, long incx)
+{
+  int i;
+  for (i=0; i<n; i++)
+    x[i*incx] = -x[i*incx];
+}
+
+long test_array_sum(long n, const long*x)
+{
+  int i;
+  long s = 0;
+  for (i=0; i<n; i++)
+    s += x[i];
+  return s;
+}
@@ -1,2 +1,8 @@
 extern long test_array_range(long n, long*x);
 extern long test_array_ranges(long n, long*x);
+extern long test_array_ranges_lda(long m, long n, long*x, long lda);
+extern long test_array_range_inc(long n, long*x, long incx);
+extern void test_array_square(long n, long*x, long*r);
+extern void test_array_copy(long n, const long*a, long*r);
+extern void test_array_negate_inc(long n, long*x, long incx);
+extern long test_array_sum(long n, const long*x);
@@ -6,6 +6,8 @@ Requirements:
 """
 
 import os, sys
+import shutil
+import tempfile
 try:
     from setuptools import setup, Extension
 except ImportError:
@@ -31,18 +33,52 @@ kernel_configuration_files = ['example-kernels.cfg',
                               'test_scalar-kernels.cfg',
                               'test_array-kernels.cfg',
                               'test_mixed-kernels.cfg',
+                              'vml_nothing-kernels.cfg',
                               'mkl_vml-kernels.cfg'
 ][1:]
 
+def openmp_flags():
+    """Return compile and link flags that enable OpenMP, or empty lists
+    when the compiler does not support OpenMP.
+
+    The xndtools runtime uses GCC extensions and POSIX threads, hence
+    only GCC compatible compilers are supported.
+    """
+    from distutils.ccompiler import new_compiler
+    from distutils.sysconfig import customize_compiler
+    from distutils.errors import CompileError, LinkError
+    compiler = new_compiler()
+    customize_compiler(compiler)
+    tmpdir = tempfile.mkdtemp()
+    source = os.path.join(tmpdir, 'openmp_test.c')
+    with open(source, 'w') as f:
+        f.write('#include <omp.h>\nint main(void) { return omp_get_max_threads() > 0 ? 0 : 1; }\n')
+    try:
+        objects = compiler.compile([source], output_dir=tmpdir, extra_postargs=['-fopenmp'])
+        compiler.link_executable(objects, os.path.join(tmpdir, 'openmp_test'), extra_postargs=['-fopenmp'])
+    except (CompileError, LinkError):
+        print('OpenMP is not supported by the compiler, parallel kernels process items sequentially.')
+        return [], []
+    finally:
+        shutil.rmtree(tmpdir)
+    return ['-fopenmp'], ['-fopenmp']
+
+# OpenMP is used by kernels with parallel = True
+openmp_compile_args, openmp_link_args = openmp_flags()
+
 ext_modules = []
 for cfg in kernel_configuration_files:
     include_dirs = [NDTYPES_ROOT, XND_ROOT, GUMATH_ROOT, os.path.join(CONDA_PREFIX, 'include')]
     library_dirs = [NDTYPES_ROOT, XND_ROOT, GUMATH_ROOT, os.path.join(CONDA_PREFIX, 'lib')]
     libraries = ["ndtypes", "xnd", "gumath"]
 
-    extra_compile_args = []
-    extra_link_args = []
+    extra_compile_args = list(openmp_compile_args)
+    extra_link_args = list(openmp_link_args)
     runtime_library_dirs = []
+
+    # USDT probes of kernel wrappers require systemtap sys/sdt.h
+    if os.environ.get('XNDTOOLS_USDT'):
+        extra_compile_args += ['-DXNDTOOLS_USDT']
     
     if cfg.startswith('mkl_'):
         libraries += ['mkl_intel_ilp64', 'mkl_sequential', 'mkl_core', #'mkl_rt',
@@ -1,96 +1,104 @@
+import os
 import pytest
-from time import time
-import numpy as np
 from xnd import xnd
-import mkl_vml as vml
+from xndtools.kernel_generator.readers import load_kernel_config
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import mkl_vml as vml
+except ImportError: # mkl_vml requires Intel MKL
+    vml = None
 
+xndlib_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.mark.skipif(vml is None, reason="Requires mkl_vml.")
 def test_exp():
     a = xnd([1.0, 0.0])
     r = vml.exp(a)
-    
 
-def timeit(func, args, repeat=100): 
-    t0 = time()
-    for _r in range(repeat):
-        res = func(*args)
-    t1 = time()
-    return 1e3*(t1 - t0)/repeat
+#
+# Size-sweep benchmark of the mkl_vml kernels and of the nothing.h
+# stand-ins (module vml_nothing that does not require MKL) against
+# the NumPy equivalents. Run with
+#
+#   XNDTOOLS_BENCH=. py.test -sv xndlib/tests/test_mkl_vml.py
+#
+# The file test_mkl_vml-bench.json contains for each kernel and dtype
+# the best time per call of the xnd and NumPy functions, and the
+# crossover size from which on xnd calls are at most bench_tolerance
+# times slower than NumPy calls, that is, where the xnd overhead is
+# amortized. Use XNDTOOLS_BENCH_SIZES=<comma-separated list> to change
+# the array sizes.
+#
 
-@pytest.mark.skip(reason="Time consuming.")
-def test_bench_exp():
-    sizes = [2**i+1 for i in range(1,20)]
-    sizes = np.linspace(1,3_000_000, 100, dtype=int)
-    xnd_timings_exp = []
-    xnd_timings_exp_inout = []
-    xnd_timings_myexp = []
-    xnd_timings_myexp_inout = []
-    numpy_timings_exp = []
-    numpy_timings_exp_inout = []
-    xnd_timings_abs = []
-    numpy_timings_abs = []
-    xnd_timings_nothing = []
-    xnd_timings_nothing_inout = []
-    xnd_timings_copy = []
-    xnd_timings_copy_inout = []
-    xnd_timings_mycopy = []
-    xnd_timings_mycopy_inout = []
-    
-    for size in sizes:
-        print(f'size={size}')
-        a = np.random.uniform(0, 1, size=size)
-        r = np.empty(dtype=a.dtype, shape=size)
-        xa = xnd.from_buffer(a)
-        xr = xnd.from_buffer(r)
+bench_sizes = [int(s) for s in os.environ.get('XNDTOOLS_BENCH_SIZES', ','.join(str(4**i) for i in range(12))).split(',')]
+bench_tolerance = 1.1
+bench_configurations = [('mkl_vml', 'mkl_vml-kernels.cfg'), ('vml_nothing', 'vml_nothing-kernels.cfg')]
 
-        if 0:
-            xnd_timings_copy.append(timeit(vml.copy, (xa,)))
-            xnd_timings_copy_inout.append(timeit(vml.copy_inout, (xa,xr)))
-        if 0:
-            xnd_timings_mycopy.append(timeit(vml.mycopy, (xa,)))
-            xnd_timings_mycopy_inout.append(timeit(vml.mycopy_inout, (xa,xr)))
-        if 0:
-            xnd_timings_nothing.append(timeit(vml.nothing, (xa,)))
-            xnd_timings_nothing_inout.append(timeit(vml.nothing_inout, (xa,xr)))
-        if 0:
-            xnd_timings_myexp.append(timeit(vml.myexp, (xa,)))
-            xnd_timings_myexp_inout.append(timeit(vml.myexp_inout, (xa,xr)))
-        if 1:
-            xnd_timings_exp.append(timeit(vml.exp, (xa,)))
-            xnd_timings_exp_inout.append(timeit(vml.exp_inout, (xa,xr)))
-        if 1:
-            numpy_timings_exp.append(timeit(np.exp, (a,)))
-            numpy_timings_exp_inout.append(timeit(np.exp, (a,r)))
+# NumPy equivalents of kernels, the arguments of inout kernels are (a, r)
+numpy_equivalents = dict(
+    nothing = lambda a: np.empty_like(a),
+    copy = lambda a: np.copy(a),
+    copy_inout = lambda a, r: np.copyto(r, a),
+    mycopy = lambda a: np.copy(a),
+    mycopy_inout = lambda a, r: np.copyto(r, a),
+    abs = lambda a: np.abs(a),
+    exp = lambda a: np.exp(a),
+    exp_inout = lambda a, r: np.exp(a, out=r),
+    myexp = lambda a: np.exp(a),
+    myexp_inout = lambda a, r: np.exp(a, out=r),
+)
 
-        #xnd_timings_abs.append(timeit(vml.abs, (xa,)))
-        #numpy_timings_abs.append(timeit(np.abs, (a,)))
+def bench_kernels():
+    """Return (module name, kernel name, is inout) of configured kernels.
+    """
+    kernels = []
+    for module_name, cfg in bench_configurations:
+        config = load_kernel_config(os.path.join(xndlib_dir, cfg))
+        for section in config.sections():
+            if section.startswith('KERNEL '):
+                kernels.append((module_name, section.split(None, 1)[1], config.has_option(section, 'inout_arguments')))
+    return kernels
 
-    try:
-        from matplotlib import pyplot as plt
-    except ImportError:
-        return
-    if 0:
-        plt.plot(sizes, xnd_timings_copy, '+', label='mkl_vml.copy [XND]')
-        plt.plot(sizes, xnd_timings_copy_inout, '+', label='mkl_vml.copy_inout [XND]')
-    if 0:
-        plt.plot(sizes, xnd_timings_mycopy, '+', label='mkl_vml.mycopy [XND]')
-        plt.plot(sizes, xnd_timings_mycopy_inout, '+', label='mkl_vml.mycopy_inout [XND]')
-    if 0:
-        plt.plot(sizes, xnd_timings_nothing, '+', label='mkl_vml.nothing [XND]')
-        plt.plot(sizes, xnd_timings_nothing_inout, '+', label='mkl_vml.nothing_inout [XND]')
-    if 0:
-        plt.plot(sizes, xnd_timings_myexp, '+', label='mkl_vml.myexp [XND]')
-        plt.plot(sizes, xnd_timings_myexp_inout, 'x', label='mkl_vml.myexp_inout [XND]')
-    if 1:
-        plt.plot(sizes, xnd_timings_exp, '+', label='mkl_vml.exp(xa)->xr [XND]')
-        plt.plot(sizes, xnd_timings_exp_inout, 'x', label='mkl_vml.exp_inout(xa, xr) [XND]')
-    if 1:
-        plt.plot(sizes, numpy_timings_exp, '.', label='numpy.exp(a)->r')
-        plt.plot(sizes, numpy_timings_exp_inout, '.', label='numpy.exp(a, out=r)')
-    #plt.plot(sizes, xnd_timings_abs, 'x', label='mkl_vml.abs [XND]')
-    #plt.plot(sizes, numpy_timings_abs, '.', label='numpy.abs')
-    plt.legend()
-    plt.xlabel('Array size')
-    plt.ylabel('Timing, ms per call')
-    plt.savefig('mkl_vml_exp.png')
-    plt.show()
-        
+def crossover_size(sizes, xnd_timings, numpy_timings, tolerance=bench_tolerance):
+    """Return the smallest size from which on xnd timings are within
+    tolerance of NumPy timings, or None.
+    """
+    size = None
+    for s, tx, tn in reversed(list(zip(sizes, xnd_timings, numpy_timings))):
+        if tx > tolerance * tn:
+            break
+        size = s
+    return size
+
+@pytest.mark.bench
+@pytest.mark.skipif(np is None, reason="Requires numpy.")
+@pytest.mark.parametrize('dtype', ['float32', 'float64'])
+@pytest.mark.parametrize('module_name, kernel, inout', bench_kernels(),
+                         ids = ['{}.{}'.format(*k) for k in bench_kernels()])
+def test_bench(module_name, kernel, inout, dtype, bench):
+    m = pytest.importorskip(module_name)
+    func = getattr(m, kernel)
+    numpy_func = numpy_equivalents.get(kernel)
+    xnd_timings = []
+    numpy_timings = []
+    for size in bench_sizes:
+        a = np.random.uniform(0, 1, size=size).astype(dtype)
+        r = np.empty_like(a)
+        xa = xnd.from_buffer(a)
+        xr = xnd.from_buffer(r)
+        args, xargs = ((a, r), (xa, xr)) if inout else ((a,), (xa,))
+        xnd_timings.append(bench.timeit(func, xargs))
+        if numpy_func is not None:
+            numpy_timings.append(bench.timeit(numpy_func, args))
+    result = dict(module=module_name, kernel=kernel, dtype=dtype,
+                  xnd_seconds=xnd_timings, numpy_seconds=numpy_timings or None,
+                  crossover_size=None, overhead_seconds=None)
+    if numpy_timings:
+        result['crossover_size'] = crossover_size(bench_sizes, xnd_timings, numpy_timings)
+        result['overhead_seconds'] = xnd_timings[0] - numpy_timings[0]
+    print('{module}.{kernel}[{dtype}]: crossover_size={crossover_size}, overhead_seconds={overhead_seconds}'.format(**result))
+    bench.info.update(sizes=bench_sizes, tolerance=bench_tolerance)
+    bench.results.append(result)
@@ -55,6 +55,94 @@ def test_array_range_inplace():
     # Strided kernel
     # TODO
 
+def test_array_ranges_input():
+    # Fortran ordered input is transposed to C order
+    a = xnd([[1,2,3],[4,5,6],[7,8,9]], type='!3 * 3 * int64')
+    r = m.test_array_ranges_input(a)
+    assert_equal(r, xnd(45))
+    assert_equal(a, xnd([[1,2,3],[4,5,6],[7,8,9]], type='!3 * 3 * int64'))
+
+def test_array_ranges_inplace():
+    # Fortran ordered input, larger than the transpose tile
+    n = 40
+    a = xnd([[i*n+j for j in range(n)] for i in range(n)], type='!%s * %s * int64' % (n, n))
+    r = m.test_array_ranges_inplace(a)
+    assert_equal(r, xnd(n*n*(n*n-1)//2))
+    assert a.value == [[i*10+j for j in range(n)] for i in range(n)]
+
+    # sliced input
+    a = xnd([[i*7+j for j in range(7)] for i in range(7)])
+    x = a[1::2, 1::2]
+    assert x.value == [[8,10,12],[22,24,26],[36,38,40]]
+    r = m.test_array_ranges_inplace(x)
+    assert_equal(r, xnd(216))
+    assert x.value == [[0,1,2],[10,11,12],[20,21,22]]
+    assert a.value[0] == list(range(7))
+    assert a.value[1] == [7,0,9,1,11,2,13]
+
+    # reversed rows, contiguous inner runs
+    a = xnd([[1,2,3],[4,5,6],[7,8,9]])
+    x = a[::-1]
+    r = m.test_array_ranges_inplace(x)
+    assert_equal(r, xnd(45))
+    assert a.value == [[20,21,22],[10,11,12],[0,1,2]]
+
+def test_array_ranges_lda_inplace():
+    # C kernel
+    a = xnd([[1,2,3],[4,5,6]])
+    r = m.test_array_ranges_lda_inplace(a)
+    assert_equal(r, xnd(21))
+    assert a.value == [[0,1,2],[10,11,12]]
+
+    # Xnd kernel, submatrix with unit-stride rows is passed without copy
+    a = xnd([[i*5+j for j in range(5)] for i in range(4)])
+    x = a[1:3, 1:4]
+    assert x.value == [[6,7,8],[11,12,13]]
+    before = m.scratch_stats()
+    r = m.test_array_ranges_lda_inplace(x)
+    after = m.scratch_stats()
+    assert after == before
+    assert_equal(r, xnd(57))
+    assert x.value == [[0,1,2],[10,11,12]]
+    assert a.value == [[0,1,2,3,4],[5,0,1,2,9],[10,10,11,12,14],[15,16,17,18,19]]
+
+    # Xnd kernel, non-unit-stride rows are copied
+    a = xnd([[i*5+j for j in range(5)] for i in range(2)])
+    x = a[:, ::2]
+    r = m.test_array_ranges_lda_inplace(x)
+    assert_equal(r, xnd(36))
+    assert a.value == [[0,1,1,3,2],[10,6,11,8,12]]
+
+def test_array_range_inc_inplace():
+    # C kernel
+    a = xnd([1,2,3])
+    r = m.test_array_range_inc_inplace(a)
+    assert_equal(r, xnd(6))
+    assert_equal(a, xnd([0,1,2]))
+
+    # Xnd kernel, strided input is passed without copy
+    a = xnd([1,2,3,4,5,6,7])
+    x = a[1::2]
+    before = m.scratch_stats()
+    r = m.test_array_range_inc_inplace(x)
+    after = m.scratch_stats()
+    assert after == before
+    assert_equal(r, xnd(12))
+    assert_equal(a, xnd([1,0,3,1,5,2,7]))
+
+    # Xnd kernel, reversed input
+    a = xnd([1,2,3,4,5,6,7])
+    x = a[::-2]
+    r = m.test_array_range_inc_inplace(x)
+    assert_equal(r, xnd(16))
+    assert_equal(x, xnd([0,1,2,3]))
+    assert_equal(a, xnd([3,2,2,4,1,6,0]))
+
+    # Xnd kernel, broadcast (zero step) input has no increment
+    x = xnd.empty('fixed(shape=4, step=0) * int64')
+    with pytest.raises(ValueError, match='zero step'):
+        m.test_array_range_inc_inplace(x)
+
 def test_array_range_inout():
     # C kernel
     a = xnd([1,2,3])
@@ -156,3 +244,275 @@ def test_array_range_hide():
     r = m.test_array_range_hide(xnd(3))
     assert r.type == xnd(0).type
     # r value is random
+
+def test_scratch_stats():
+    # Xnd kernel copies sliced input into a scratch buffer that is
+    # reused by subsequent calls
+    a = xnd([1,2,3,4,5,6,7])
+    x = a[1::2]
+    m.test_array_range_input(x)
+    before = m.scratch_stats()
+    m.test_array_range_input(x)
+    after = m.scratch_stats()
+    assert after['hits'] == before['hits'] + 1
+    assert after['misses'] == before['misses']
+
+def test_kernel_stats():
+    m.reset_kernel_stats()
+    a = xnd([1,2,3,4,5,6,7])
+    m.test_array_range_input(a[1::2])
+    m.test_array_range_input(a[::2])
+    stats = m.kernel_stats()
+    calls = dict((s['kind'], s['calls']) for s in stats.values()
+                 if s['kernel'] == 'test_array_range_input')
+    assert calls == {'C': 0, 'Xnd': 2}
+    m.reset_kernel_stats()
+    assert sum(s['calls'] for s in m.kernel_stats().values()) == 0
+
+def test_kernel_copy_stats():
+    m.reset_kernel_stats()
+    a = xnd([1,2,3,4,5,6,7])
+    # sliced input is copied in and out, contiguous input is passed as is
+    m.test_array_range_inplace(a[::2])
+    m.test_array_range_inplace(a[::2])
+    m.test_array_range_inplace(a[2:5])
+    stats = dict((s['kind'], s['arguments']) for s in m.kernel_stats().values()
+                 if s['kernel'] == 'test_array_range_inplace')
+    assert stats['Xnd'] == {'a': {'zero_copy': 1, 'copy_in': 2, 'copy_out': 2, 'bytes': 2 * 2 * 4 * 8}}
+
+def test_kernel_phases():
+    m.reset_kernel_stats()
+    a = xnd(list(range(1000)))
+    m.test_array_range_profile_input(a[::2])
+    stats = m.kernel_stats()
+    # only kernels with profile_phases = True are reported
+    assert set(s['kernel'] for s in stats.values() if 'phases' in s) == {'test_array_range_profile_input', 'test_array_square_inplace'}
+    phases = [s['phases'] for s in stats.values() if s['kernel'] == 'test_array_range_profile_input' and s['kind'] == 'Xnd'][0]
+    assert phases['copy_in_ns'] > 0 and phases['call_ns'] > 0 and phases['copy_out_ns'] >= 0
+    m.reset_kernel_stats()
+    phases = [s['phases'] for s in m.kernel_stats().values() if 'phases' in s]
+    assert all(sum(p.values()) == 0 for p in phases)
+
+def test_kernel_profile():
+    m.reset_kernel_stats()
+    a = xnd([1,2,3,4,5,6,7])
+    for i in range(10):
+        m.test_array_range_profile_input(a[1::2])
+    profile = m.kernel_profile()
+    # only kernels with profile = True are reported
+    assert set(p['kernel'] for p in profile.values()) == {'test_array_range_profile_input'}
+    p = [p for p in profile.values() if p['kind'] == 'Xnd'][0]
+    assert p['count'] == 10
+    assert 0 < p['p50_ns'] <= p['p99_ns']
+    assert p['total_ns'] >= p['p50_ns']
+    m.reset_kernel_stats()
+    assert sum(p['count'] for p in m.kernel_profile().values()) == 0
+
+def test_init_stats():
+    stats = m.__init_stats__
+    assert stats['kernels'] == len([n for n in dir(m) if n.startswith('test_array_')])
+    assert stats['signatures'] >= stats['kernels']
+    for key in ['typemaps_ns', 'tbl_new_ns', 'add_kernels_ns', 'init_kernels_ns', 'add_functions_ns']:
+        assert 0 <= stats[key] <= stats['total_ns']
+
+def test_kernel_log():
+    m.dump_log()
+    assert m.get_log_level() == m.LOG_OFF
+    a = xnd([1,2,3,4,5,6,7])
+    m.test_array_range_input(a[1::2])
+    assert m.dump_log() == []
+    m.set_log_level(m.LOG_DEBUG, kernel='test_array_range_input')
+    try:
+        m.test_array_range_input(a[1::2])
+        m.test_array_range_inplace(a[1::2])
+    finally:
+        m.set_log_level(m.LOG_OFF)
+    log = m.dump_log()
+    messages = [message for time_ns, level, message in log]
+    assert messages[0].endswith(': entering')
+    assert messages[-1].endswith(': leaving with status 0')
+    assert all('test_array_range_input_' in message.split(':')[0] for message in messages)
+    assert all(level == m.LOG_DEBUG for time_ns, level, message in log)
+    assert [entry[0] for entry in log] == sorted(entry[0] for entry in log)
+    assert m.dump_log() == []
+    with pytest.raises(ValueError):
+        m.set_log_level(10)
+
+def test_memory_stats():
+    a = xnd(list(range(2000)))
+    m.reset_memory_peak()
+    assert m.memory_stats()['current'] == 0
+    m.test_array_range_input(a[::2])  # non-contiguous input is copied
+    stats = m.memory_stats()
+    assert stats['current'] == 0
+    assert stats['peak'] >= 1000 * 8
+    assert stats['cap'] == -1
+    m.set_memory_cap(1000)
+    try:
+        with pytest.raises(MemoryError, match='memory cap'):
+            m.test_array_range_input(a[::2])
+        assert m.memory_stats()['current'] == 0
+        m.test_array_range_input(a[:10:2])
+    finally:
+        m.set_memory_cap(None)
+    assert m.memory_stats()['cap'] == -1
+    m.test_array_range_input(a[::2])
+
+def test_array_square_inplace():
+    # Xnd kernel, sliced input is processed in tiles
+    n = 10000
+    a = xnd(list(range(2 * n)))
+    x = a[::2]
+    r = xnd([0] * n)
+    m.test_array_square_inplace(x, r)
+    assert_equal(x, xnd([(2 * i) ** 2 for i in range(n)]))
+    assert_equal(r, xnd(list(range(0, 2 * n, 2))))
+    assert_equal(a[1::2], xnd(list(range(1, 2 * n, 2))))
+
+def test_array_copy_inout():
+    n = 10000
+    a = xnd(list(range(2 * n)))
+    r = xnd([0] * n)
+    m.test_array_copy_inout(a[1::2], r)
+    assert_equal(r, xnd(list(range(1, 2 * n, 2))))
+
+def test_array_square_strided_inplace():
+    # contiguous input
+    x = xnd([1,2,3])
+    r = xnd([0,0,0])
+    m.test_array_square_strided_inplace(x, r)
+    assert_equal(x, xnd([1,4,9]))
+    assert_equal(r, xnd([1,2,3]))
+
+    # strided input is copied
+    a = xnd([1,2,3,4,5,6,7])
+    m.test_array_square_strided_inplace(a[1::2], r)
+    assert_equal(a, xnd([1,4,3,16,5,36,7]))
+    assert_equal(r, xnd([2,4,6]))
+
+def test_array_negate_inc_strided_inplace():
+    # strided input is passed with increment
+    a = xnd([1,2,3,4,5,6,7])
+    m.test_array_negate_inc_strided_inplace(a[1::2])
+    assert_equal(a, xnd([1,-2,3,-4,5,-6,7]))
+
+    # negative increment
+    a = xnd([1,2,3,4,5,6,7])
+    m.test_array_negate_inc_strided_inplace(a[::-3])
+    assert_equal(a, xnd([-1,2,3,-4,5,6,-7]))
+
+    # broadcast (zero step) input has no increment, Strided kernels
+    # cannot report error messages to gumath
+    x = xnd.empty('fixed(shape=4, step=0) * int64')
+    x[0] = 1
+    with pytest.raises(RuntimeError):
+        m.test_array_negate_inc_strided_inplace(x)
+    assert_equal(x, xnd([1,1,1,1]))
+
+def test_array_copy_strided_inout():
+    a = xnd([1,2,3,4,5,6,7])
+    r = xnd([0,0,0])
+    m.test_array_copy_strided_inout(a[1::2], r)
+    assert_equal(r, xnd([2,4,6]))
+
+    # Strided kernels cannot report error messages to gumath
+    with pytest.raises(RuntimeError):
+        m.test_array_copy_strided_inout(a[:3], a[1::2])
+
+def test_array_sum_parallel():
+    # no outer dimension
+    x = xnd([1,2,3])
+    assert_equal(m.test_array_sum_parallel(x), xnd(6))
+
+    # items of outer dimension
+    x = xnd([[1,2,3],[4,5,6],[7,8,9],[10,11,12]])
+    assert_equal(m.test_array_sum_parallel(x), xnd([6,15,24,33]))
+
+    # non-contiguous items are copied
+    assert_equal(m.test_array_sum_parallel(x[::2, ::2]), xnd([4,16]))
+
+    # nested outer dimensions
+    x = xnd([[[1,2],[3,4]],[[5,6],[7,8]],[[9,10],[11,12]]])
+    assert_equal(m.test_array_sum_parallel(x), xnd([[3,7],[11,15],[19,23]]))
+
+def test_array_sum_parallel_stats():
+    m.reset_kernel_stats()
+    x = xnd([[1,2,3],[4,5,6],[7,8,9],[10,11,12]])
+    assert_equal(m.test_array_sum_parallel(x), xnd([6,15,24,33]))
+    # calls are counted once per wrapper call, not per item
+    calls = sum(s['calls'] for s in m.kernel_stats().values()
+                if s['kernel'] == 'test_array_sum_parallel')
+    assert calls == 1
+
+#
+# Wrapper overhead benchmark over intents, kinds and layouts. Run with
+#
+#   XNDTOOLS_BENCH=. py.test -sv -m bench xndlib/tests/test_test_array.py
+#
+# For each kernel (one per intent), argument layout and size, the file
+# test_test_array-bench.json contains the kinds of the called kernels,
+# the best time per call and the bytes copied per call by the
+# wrappers. The time per call of the smallest size is the per-call
+# overhead of the wrapper. Layouts that a kernel rejects (e.g. sliced
+# inout arguments) are recorded with an error message.
+#
+
+bench_sizes = [1, 16, 256, 4096, 65536, 1048576]
+bench_layouts = ['contiguous', 'sliced', 'transposed']
+bench_kernels = [
+    # (intent, kernel name, rank of the array argument)
+    ('input', 'test_array_range_input', 1),
+    ('inplace', 'test_array_range_inplace', 1),
+    ('inout', 'test_array_range_inout', 1),
+    ('input_output', 'test_array_range_input_output', 1),
+    ('inplace_output', 'test_array_range_inplace_output', 1),
+    ('inout_output', 'test_array_range_inout_output', 1),
+    ('output', 'test_array_range_output', 0),
+    ('hide', 'test_array_range_hide', 0),
+    ('input', 'test_array_ranges_input', 2),
+    ('inplace', 'test_array_ranges_inplace', 2),
+]
+
+def bench_argument(rank, layout, size):
+    """Return argument of given rank and layout that has size items, or
+    None when the layout is not applicable.
+    """
+    if rank == 0: # size of the array created by the kernel
+        return xnd(size) if layout == 'contiguous' else None
+    if rank == 1:
+        if layout == 'contiguous':
+            return xnd(list(range(size)))
+        if layout == 'sliced':
+            return xnd(list(range(2 * size)))[::2]
+        return None
+    n = max(1, int(size ** 0.5))
+    if layout == 'contiguous':
+        return xnd([list(range(n))] * n)
+    if layout == 'sliced':
+        return xnd([list(range(2 * n))] * n)[:, ::2]
+    return xnd([list(range(n))] * n, type='!{0} * {0} * int64'.format(n))
+
+@pytest.mark.bench
+@pytest.mark.parametrize('layout', bench_layouts)
+@pytest.mark.parametrize('intent, kernel, rank', bench_kernels,
+                         ids = [kernel for intent, kernel, rank in bench_kernels])
+def test_bench(intent, kernel, rank, layout, bench):
+    func = getattr(m, kernel)
+    for size in bench_sizes:
+        x = bench_argument(rank, layout, size)
+        if x is None:
+            continue
+        result = dict(intent=intent, kernel=kernel, layout=layout, size=size)
+        m.reset_kernel_stats()
+        try:
+            result['seconds'] = bench.timeit(func, (x,))
+        except Exception as msg:
+            result['error'] = str(msg)
+        else:
+            stats = [s for s in m.kernel_stats().values() if s['kernel'] == kernel and s['calls']]
+            calls = sum(s['calls'] for s in stats)
+            result['kinds'] = sorted(s['kind'] for s in stats)
+            result['copy_bytes'] = sum(a['bytes'] for s in stats for a in s['arguments'].values()) // calls
+        print(result)
+        bench.results.append(result)
+    bench.info.update(sizes=bench_sizes)
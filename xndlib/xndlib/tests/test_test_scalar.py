@@ -691,3 +691,20 @@ def test_scalar_ptr_value_return_inout_output():
     a = xnd([10,None], type=dt)
     assert_equal(m.test_scalar_ptr_value_return_inout_output(a), (xnd([20,15]),xnd([40,35])))
     assert_equal(a, xnd([20,15], type=dt))
+
+def test_scalar_return_strided_input():
+    a = xnd(10)
+    assert_equal(m.test_scalar_return_strided_input(a), xnd(30))
+
+    a = xnd([10,11,12,13])
+    assert_equal(m.test_scalar_return_strided_input(a[::2]), xnd([30,32]))
+    assert_equal(a, xnd([10,11,12,13]))
+
+def test_scalar_ptr_return_strided_inplace():
+    a = xnd(10)
+    assert_equal(m.test_scalar_ptr_return_strided_inplace(a), xnd(40))
+    assert_equal(a, xnd(20))
+
+    a = xnd([10,11,12,13])
+    assert_equal(m.test_scalar_ptr_return_strided_inplace(a[::2]), xnd([40,42]))
+    assert_equal(a, xnd([20,11,22,13]))
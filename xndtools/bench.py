@@ -0,0 +1,70 @@
+""" Provides pytest support of benchmarks.
+
+Benchmarks are tests marked with `bench` that use the `bench`
+fixture. They are time consuming and run only when XNDTOOLS_BENCH is
+set to a directory where the results of the test module <name>.py
+are saved to <name>-bench.json:
+
+  XNDTOOLS_BENCH=. py.test -sv -m bench xndlib/tests/
+
+Test directories enable benchmarks in their conftest.py with
+
+  from xndtools.bench import pytest_configure, pytest_runtest_setup, bench
+"""
+
+import os
+import json
+import pytest
+from time import perf_counter
+
+bench_dir = os.environ.get('XNDTOOLS_BENCH')
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'bench: time consuming benchmark, set XNDTOOLS_BENCH=<directory> to run')
+
+def pytest_runtest_setup(item):
+    if bench_dir is None and item.get_closest_marker('bench') is not None:
+        pytest.skip('Time consuming. Set XNDTOOLS_BENCH=<directory> to run.')
+
+
+class Bench(object):
+    """Collects benchmark results of a test module.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.info = {}
+        self.results = []
+
+    def timeit(self, func, args, min_seconds=0.02, repeat=3):
+        """Return the best time of a call in seconds.
+        """
+        number = 1
+        while True:
+            t0 = perf_counter()
+            for _n in range(number):
+                func(*args)
+            t = perf_counter() - t0
+            if t >= min_seconds:
+                break
+            number *= 2
+        best = t
+        for _r in range(repeat - 1):
+            t0 = perf_counter()
+            for _n in range(number):
+                func(*args)
+            best = min(best, perf_counter() - t0)
+        return best / number
+
+    def dump(self):
+        filename = os.path.join(bench_dir, '{}-bench.json'.format(self.name))
+        with open(filename, 'w') as f:
+            json.dump(dict(self.info, results=self.results), f, indent=2)
+        print('\nBenchmark results are saved to {}'.format(filename))
+
+
+@pytest.fixture(scope='module')
+def bench(request):
+    b = Bench(request.module.__name__.rsplit('.', 1)[-1])
+    yield b
+    if b.results:
+        b.dump()
@@ -70,6 +70,59 @@ def generate_kernel(args):
     print('HINT: To create extension module, run:\n\n  {} module {}\n'.format(xnd_tools_script, args.config_file))
     return r
 
+def generate_bench(args):
+    """ Generate C source of a microbenchmark program of gumath kernels.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+      Specify `xnd_tools bench` arguments:
+
+        Namespace(config_file=..., target_file=..., kernels_source_file=None,
+                  sizes=None, source_dir=...)
+
+    Returns
+    -------
+    r : dict
+      dict(sources = [...], config_file=..., include_dirs=[...])
+    """
+    r = None
+    print('\n--- Benchmark file generator ---\n')
+    if not os.path.isfile(args.config_file):
+        print('Not a file: {!r}. Expected file path to kernel configuration file. Exiting.'.format(args.config_file))
+        return
+    if args.source_dir is None:
+        args.source_dir = ''
+    source_dir = args.source_dir
+    sources = []
+    if args.kernels_source_file is None:
+        from xndtools.kernel_generator.generate_kernel import generate_kernel
+        r = generate_kernel(config_file = args.config_file,
+                            source_dir = source_dir)
+        args.kernels_source_file = r['sources'][0]
+        sources.extend(r['sources'])
+    if not os.path.isfile(args.kernels_source_file):
+        print('Not a file: {!r}. Expected file path to kernel C source file. Exiting.'.format(args.kernels_source_file))
+        return
+    if not sources:
+        # the benchmark program is linked with the existing kernels and module sources
+        from xndtools.kernel_generator.generate_kernel import get_module_data
+        sources.append(args.kernels_source_file)
+        sources.extend(get_module_data(args.config_file)['sources'])
+
+    from xndtools.kernel_generator.generate_bench import generate_bench, default_sizes
+    sizes = default_sizes
+    if args.sizes is not None:
+        sizes = [int(s) for s in args.sizes.split(',')]
+    r = generate_bench(config_file = args.config_file,
+                       target_file = args.target_file,
+                       sizes = sizes,
+                       sources = sources,
+                       source_dir = source_dir)
+    print('HINT: To build the benchmark program, compile and link {} with ndtypes, xnd and gumath libraries.\n'
+          .format(' '.join(r['sources'])))
+    return r
+
 def generate_module(args):
     """ Generate C source of gumath extension module.
 
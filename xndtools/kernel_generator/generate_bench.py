@@ -0,0 +1,438 @@
+""" Provides: generate_bench.
+"""
+
+import os
+from .generate_kernel import get_module_data
+
+default_sizes = [16, 1024, 65536, 1048576]
+
+def generate_bench(config_file,
+                   target_file = None,
+                   source_dir = '',
+                   sizes = default_sizes,
+                   sources = []):
+    """Generate C source of a microbenchmark program of the kernels.
+
+    The program calls the kernels of all gumath functions of the
+    module directly (without Python and gumath dispatch) using
+    synthetic arguments of given sizes in contiguous, sliced and
+    transposed layouts, and prints ns/call and GB/s in JSON format.
+
+    Parameters
+    ----------
+    config_file : str
+      Specify path to kernel configuration file.
+
+    target_file : {None, str}
+      Specify path to the benchmark C source file. Default is
+      `<source_dir>/<module_name>-bench.c`.
+
+    sizes : list
+      Specify the number of items in array arguments.
+
+    Returns
+    -------
+    r : dict
+      dict(sources = [...], config_file=..., include_dirs=[...])
+    """
+    module_data = get_module_data(config_file)
+    if target_file is None:
+        target_file = os.path.join(source_dir, '{module_name}-bench.c'.format(**module_data))
+    bench_source = bench_template.format(sizes = ', '.join(map(str, sizes)), **module_data)
+    f = open(target_file, 'w')
+    f.write(bench_source)
+    f.close()
+    print('Created {!r}'.format(target_file))
+
+    return dict(config_file = config_file,
+                sources = [target_file] + sources,
+                include_dirs = module_data['include_dirs'])
+
+bench_template = '''
+/*
+  Microbenchmark of {module_name} kernels, generated by xnd_tools bench.
+
+  Calls the kernels of every gumath function of the module with
+  synthetic arguments in contiguous, sliced (every second item of the
+  last dimension) and transposed (Fortran order) layouts, and prints
+  ns/call and GB/s of the argument data in JSON format. Symbolic
+  dimensions of a signature have the same size so that array
+  arguments of maximal rank contain at most the given number of items;
+  scalar arguments and array items are set to one.
+
+  Usage:
+
+    {module_name}-bench [<min seconds per case, default 0.01>]
+
+  Build by compiling and linking it together with the kernels and
+  xndtools.c sources of the module against the ndtypes, xnd and gumath
+  libraries.
+*/
+
+#define _POSIX_C_SOURCE 200809L
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <inttypes.h>
+#include "ndtypes.h"
+#include "xnd.h"
+#include "gumath.h"
+#include "xndtools.h"
+
+int gmk_init_{module_name}_kernels(gm_tbl_t *tbl, ndt_context_t *ctx);
+
+enum bench_layout {{ BENCH_CONTIGUOUS, BENCH_SLICED, BENCH_TRANSPOSED, BENCH_NLAYOUTS }};
+static const char *bench_layout_names[] = {{ "contiguous", "sliced", "transposed" }};
+static const char *bench_kind_names[] = {{ "C", "Fortran", "Strided", "Xnd" }};
+static const int64_t bench_sizes[] = {{ {sizes}, 0 }};
+
+typedef struct {{
+  double min_seconds;
+  int nrecords;
+}} bench_state_t;
+
+typedef struct {{
+  ndt_t *buffer_type;
+  xnd_master_t *buffer;
+  ndt_t *type;      /* type of the view */
+  xnd_t view;
+  int64_t nbytes;   /* bytes of the view data */
+}} bench_arg_t;
+
+/* Set nitems items of dtype at ptr to one, other dtypes remain zero. */
+static void
+bench_fill(char *ptr, const ndt_t *dtype, int64_t nitems)
+{{
+  for (int64_t i = 0; i < nitems; i++, ptr += dtype->datasize) {{
+    switch (dtype->tag) {{
+    case Bool: *(bool *)ptr = 1; break;
+    case Int8: *(int8_t *)ptr = 1; break;
+    case Int16: *(int16_t *)ptr = 1; break;
+    case Int32: *(int32_t *)ptr = 1; break;
+    case Int64: *(int64_t *)ptr = 1; break;
+    case Uint8: *(uint8_t *)ptr = 1; break;
+    case Uint16: *(uint16_t *)ptr = 1; break;
+    case Uint32: *(uint32_t *)ptr = 1; break;
+    case Uint64: *(uint64_t *)ptr = 1; break;
+    case Float32: case Complex64: *(float *)ptr = 1; break;
+    case Float64: case Complex128: *(double *)ptr = 1; break;
+    default: break;
+    }}
+  }}
+}}
+
+static void
+bench_arg_del(bench_arg_t *arg)
+{{
+  if (arg->buffer != NULL)
+    xnd_del(arg->buffer);
+  if (arg->buffer_type != NULL)
+    ndt_del(arg->buffer_type);
+  if (arg->type != NULL)
+    ndt_del(arg->type);
+  memset(arg, 0, sizeof(bench_arg_t));
+}}
+
+/*
+  Return the rank of signature type t, or -1 when its dtype is not
+  concrete (e.g. variable dimensions).
+ */
+static int
+bench_ndim(const ndt_t *t)
+{{
+  int ndim = 0;
+  while (1) {{
+    if (t->tag == FixedDim) {{
+      ndim++; t = t->FixedDim.type;
+    }} else if (t->tag == SymbolicDim) {{
+      ndim++; t = t->SymbolicDim.type;
+    }} else if (t->tag == EllipsisDim) {{
+      t = t->EllipsisDim.type;
+    }} else
+      break;
+  }}
+  return (ndt_is_concrete(t) ? ndim : -1);
+}}
+
+/*
+  Create an argument of signature type t where symbolic dimensions
+  have size n and ellipses are empty. Return 1 if the layout is not
+  applicable, 0 on success, and -1 on failure.
+ */
+static int
+bench_arg_new(bench_arg_t *arg, const ndt_t *t, int64_t n, enum bench_layout layout, ndt_context_t *ctx)
+{{
+  int64_t shape[NDT_MAX_DIM], step[NDT_MAX_DIM];
+  int64_t nitems = 1, buffer_items;
+  int ndim = 0;
+  const ndt_t *dtype = t;
+  memset(arg, 0, sizeof(bench_arg_t));
+  while (1) {{
+    if (dtype->tag == FixedDim) {{
+      shape[ndim++] = dtype->FixedDim.shape; dtype = dtype->FixedDim.type;
+    }} else if (dtype->tag == SymbolicDim) {{
+      shape[ndim++] = n; dtype = dtype->SymbolicDim.type;
+    }} else if (dtype->tag == EllipsisDim) {{
+      dtype = dtype->EllipsisDim.type;
+    }} else
+      break;
+  }}
+  if ((layout == BENCH_SLICED && ndim < 1) || (layout == BENCH_TRANSPOSED && ndim < 2))
+    return 1;
+  for (int k = 0; k < ndim; k++)
+    nitems *= shape[k];
+  buffer_items = nitems;
+  switch (layout) {{
+  case BENCH_CONTIGUOUS:
+    for (int k = 0; k < ndim; k++)
+      step[k] = INT64_MAX;
+    break;
+  case BENCH_SLICED:
+    step[ndim - 1] = 2;
+    for (int k = ndim - 2; k >= 0; k--)
+      step[k] = step[k + 1] * shape[k + 1];
+    buffer_items = 2 * nitems;
+    break;
+  default:
+    step[0] = 1;
+    for (int k = 1; k < ndim; k++)
+      step[k] = step[k - 1] * shape[k - 1];
+  }}
+
+  arg->type = ndt_copy(dtype, ctx);
+  for (int k = ndim - 1; k >= 0 && arg->type != NULL; k--)
+    arg->type = ndt_fixed_dim(arg->type, shape[k], step[k], ctx);
+  arg->buffer_type = ndt_copy(dtype, ctx);
+  if (ndim > 0 && arg->buffer_type != NULL)
+    arg->buffer_type = ndt_fixed_dim(arg->buffer_type, buffer_items, INT64_MAX, ctx);
+  if (arg->type == NULL || arg->buffer_type == NULL) {{
+    bench_arg_del(arg);
+    return -1;
+  }}
+  arg->buffer = xnd_empty_from_type(arg->buffer_type, XND_OWN_EMBEDDED, ctx);
+  if (arg->buffer == NULL) {{
+    bench_arg_del(arg);
+    return -1;
+  }}
+  bench_fill(arg->buffer->master.ptr, dtype, buffer_items);
+  arg->view = arg->buffer->master;
+  arg->view.type = arg->type;
+  arg->nbytes = nitems * dtype->datasize;
+  return 0;
+}}
+
+/* Return true when gumath would select kind for the arguments. */
+static bool
+bench_kind_applies(const gm_kernel_set_t *set, enum ndt_apply kind, enum ndt_apply tag)
+{{
+  switch (kind) {{
+  case C: return set->C != NULL && tag == C;
+  case Fortran: return set->Fortran != NULL && tag == Fortran;
+  case Strided: return set->Strided != NULL && tag != Xnd;
+  default: return set->Xnd != NULL;
+  }}
+}}
+
+static int
+bench_call(const gm_kernel_set_t *set, enum ndt_apply kind, xnd_t stack[], int outer_dims, ndt_context_t *ctx)
+{{
+  const int nargs = (int)set->sig->Function.nargs;
+  gm_kernel_t kernel = {{ kind, set }};
+  switch (kind) {{
+  case C: return gm_xnd_map(set->C, stack, nargs, outer_dims, set->vectorize, ctx);
+  case Fortran: return gm_xnd_map(set->Fortran, stack, nargs, outer_dims, set->vectorize, ctx);
+  case Strided: return gm_apply(&kernel, stack, outer_dims, ctx);
+  default: return gm_xnd_map(set->Xnd, stack, nargs, outer_dims, set->vectorize, ctx);
+  }}
+}}
+
+/*
+  Return the average duration of a call in ns, doubling the number of
+  calls until min_seconds is reached. Return -1 on failure.
+ */
+static double
+bench_time(const gm_kernel_set_t *set, enum ndt_apply kind, xnd_t stack[], int outer_dims,
+           double min_seconds, int64_t *ncalls, ndt_context_t *ctx)
+{{
+  if (bench_call(set, kind, stack, outer_dims, ctx) < 0) /* warm-up */
+    return -1;
+  for (int64_t n = 1; ; n *= 2) {{
+    int64_t start = xndtools_profile_clock();
+    for (int64_t i = 0; i < n; i++)
+      if (bench_call(set, kind, stack, outer_dims, ctx) < 0)
+        return -1;
+    int64_t elapsed = xndtools_profile_clock() - start;
+    if (elapsed >= min_seconds * 1e9 || n >= ((int64_t)1 << 40)) {{
+      *ncalls = n;
+      return (double)elapsed / n;
+    }}
+  }}
+}}
+
+static void
+bench_print_string(const char *s)
+{{
+  putchar('"');
+  for (; *s; s++)
+    putchar(*s == '"' || *s == '\\\\' || *s == '\\n' ? '\\'' : *s);
+  putchar('"');
+}}
+
+static void
+bench_record(bench_state_t *state, const char *name, const char *sig, const char *kind,
+             enum bench_layout layout, int64_t size, int64_t ncalls, double ns, int64_t nbytes,
+             const char *error)
+{{
+  printf("%s\\n  {{\\"function\\": ", (state->nrecords++ ? "," : ""));
+  bench_print_string(name);
+  printf(", \\"signature\\": ");
+  bench_print_string(sig);
+  printf(", \\"kind\\": ");
+  if (kind != NULL)
+    bench_print_string(kind);
+  else
+    printf("null");
+  printf(", \\"layout\\": \\"%s\\", \\"size\\": %" PRIi64, bench_layout_names[layout], size);
+  if (error == NULL)
+    printf(", \\"calls\\": %" PRIi64 ", \\"ns_per_call\\": %.1f, \\"bytes\\": %" PRIi64 ", \\"gbps\\": %.3f}}",
+           ncalls, ns, nbytes, nbytes / ns);
+  else {{
+    printf(", \\"error\\": ");
+    bench_print_string(error);
+    printf("}}");
+  }}
+}}
+
+static void
+bench_case(bench_state_t *state, const char *name, const char *sig, const gm_kernel_set_t *set,
+           enum bench_layout layout, int64_t size)
+{{
+  NDT_STATIC_CONTEXT(ctx);
+  const int nin = (int)set->sig->Function.nin;
+  bench_arg_t args[NDT_MAX_ARGS];
+  xnd_master_t *outputs[NDT_MAX_ARGS];
+  const ndt_t *in_types[NDT_MAX_ARGS];
+  xnd_t stack[NDT_MAX_ARGS];
+  ndt_apply_spec_t spec = ndt_apply_spec_empty;
+  int64_t n = 1, nbytes = 0, ncalls = 0;
+  int ndim = 0, nready = 0, noutputs = 0, status = 0;
+
+  for (int i = 0; i < nin; i++) {{
+    int ndim_ = bench_ndim(set->sig->Function.types[i]);
+    if (ndim_ < 0)
+      return; /* variable dimensions are not supported */
+    ndim = (ndim_ > ndim ? ndim_ : ndim);
+  }}
+  if (layout != BENCH_CONTIGUOUS && ndim < (layout == BENCH_SLICED ? 1 : 2))
+    return;
+  for (int64_t m = 1; ndim > 0; m++) {{
+    int64_t p = 1;
+    for (int k = 0; k < ndim; k++)
+      p *= m;
+    if (p > size)
+      break;
+    n = m;
+  }}
+  for (; nready < nin; nready++) {{
+    status = bench_arg_new(&args[nready], set->sig->Function.types[nready], n, layout, &ctx);
+    if (status < 0)
+      goto error;
+    if (status == 0) {{
+      stack[nready] = args[nready].view;
+      in_types[nready] = args[nready].type;
+      nbytes += args[nready].nbytes;
+      continue;
+    }}
+    /* a scalar argument in a non-contiguous layout */
+    status = bench_arg_new(&args[nready], set->sig->Function.types[nready], n, BENCH_CONTIGUOUS, &ctx);
+    if (status < 0)
+      goto error;
+    stack[nready] = args[nready].view;
+    in_types[nready] = args[nready].type;
+    nbytes += args[nready].nbytes;
+  }}
+
+  if (ndt_typecheck(&spec, set->sig, in_types, nin, set->constraint, stack, &ctx) < 0)
+    goto error;
+  for (int i = 0; i < spec.nbroadcast; i++)
+    stack[i].type = spec.broadcast[i];
+  for (; noutputs < spec.nout; noutputs++) {{
+    outputs[noutputs] = xnd_empty_from_type(spec.out[noutputs], XND_OWN_EMBEDDED, &ctx);
+    if (outputs[noutputs] == NULL)
+      goto error;
+    stack[nin + noutputs] = outputs[noutputs]->master;
+    nbytes += spec.out[noutputs]->datasize;
+  }}
+
+  for (int kind = C; kind <= Xnd; kind++) {{
+    if (!bench_kind_applies(set, kind, spec.tag))
+      continue;
+    double ns = bench_time(set, kind, stack, spec.outer_dims, state->min_seconds, &ncalls, &ctx);
+    if (ns < 0) {{
+      /* strided kernels report errors to stderr only */
+      bench_record(state, name, sig, bench_kind_names[kind], layout, size, 0, 0, 0,
+                   (ndt_err_occurred(&ctx) ? ndt_context_msg(&ctx) : "kernel failed, see stderr"));
+      ndt_err_clear(&ctx);
+    }} else
+      bench_record(state, name, sig, bench_kind_names[kind], layout, size, ncalls, ns, nbytes, NULL);
+  }}
+  goto cleanup;
+
+error:
+  bench_record(state, name, sig, NULL, layout, size, 0, 0, 0, ndt_context_msg(&ctx));
+  ndt_err_clear(&ctx);
+
+cleanup:
+  for (int i = 0; i < noutputs; i++)
+    xnd_del(outputs[i]);
+  if (spec.nout > 0 || spec.nbroadcast > 0)
+    ndt_apply_spec_clear(&spec);
+  for (int i = 0; i < nready; i++)
+    bench_arg_del(&args[i]);
+}}
+
+static int
+bench_function(const gm_func_t *f, void *state)
+{{
+  NDT_STATIC_CONTEXT(ctx);
+  for (int i = 0; i < f->nkernels; i++) {{
+    const gm_kernel_set_t *set = &f->kernels[i];
+    char *sig = ndt_as_string(set->sig, &ctx);
+    if (sig == NULL) {{
+      ndt_err_fprint(stderr, &ctx);
+      return -1;
+    }}
+    for (int j = 0; bench_sizes[j] > 0; j++)
+      for (int layout = 0; layout < BENCH_NLAYOUTS; layout++)
+        bench_case((bench_state_t *)state, f->name, sig, set, layout, bench_sizes[j]);
+    ndt_free(sig);
+  }}
+  return 0;
+}}
+
+int
+main(int argc, char *argv[])
+{{
+  NDT_STATIC_CONTEXT(ctx);
+  bench_state_t state = {{ .min_seconds = (argc > 1 ? atof(argv[1]) : 0.01), .nrecords = 0 }};
+  gm_tbl_t *tbl = NULL;
+
+  if (ndt_init(&ctx) < 0)
+    goto error;
+  gm_init();
+  tbl = gm_tbl_new(&ctx);
+  if (tbl == NULL || gmk_init_{module_name}_kernels(tbl, &ctx) < 0)
+    goto error;
+
+  printf("[");
+  if (gm_tbl_map(tbl, bench_function, &state) < 0)
+    return 1;
+  printf("\\n]\\n");
+  return 0; /* the table is kept until exit as in extension modules */
+
+error:
+  ndt_err_fprint(stderr, &ctx);
+  return 1;
+}}
+'''
@@ -32,6 +32,7 @@ from collections import defaultdict
 import configparser
 from xndtools.kernel_generator.readers import PrototypeReader, load_kernel_config
 from xndtools.kernel_generator.utils import NormalizedTypeMap
+from xndtools.kernel_generator.profiling import profiler
 
 def main():
     # See
@@ -113,6 +114,18 @@ Editing instructions
 1.2 MODULE section contains header_code that may contain C code that
     is inserted after include statements of extension modules source.
 
+1.3 MODULE section may contain threads field that specifies the number
+    of threads used for copying large non-contiguous arrays
+    [OPTIONAL]. Can be overridden by XNDTOOLS_COPY_THREADS environment
+    variable.
+
+1.4 MODULE section may contain memory_cap field that specifies the
+    maximal number of bytes of temporaries (copies of non-contiguous
+    arrays, output and hide arrays) that kernels may hold at a time,
+    kernels exceeding it fail with MemoryError [OPTIONAL]. Negative
+    value (default) means unlimited. Can be overridden by
+    XNDTOOLS_MEMORY_CAP environment variable.
+
 2.1 KERNEL name must be changed to appropriate one [REQUIRED].
 
 2.2 KERNEL section contains skip field. When present, the corrsponding
@@ -144,6 +157,39 @@ Editing instructions
     is inserted before/after the call to the backend function
     [OPTIONAL]. This is useful in special circumstances.
 
+2.8 Section may contain kinds field that lists the kernel kinds
+    (C, Fortran, Strided, Xnd) to be generated [OPTIONAL]. Strided
+    kernels avoid building xnd_t stack per element and are generated
+    for kernels with scalar arguments, or with 1-d array arguments
+    only when ellipses is none.
+
+2.9 Section may contain parallel field. When true, Xnd kernels with
+    fixed ellipses receive the outer dimension of the arguments and
+    process its items in parallel using OpenMP when the arguments
+    contain at least parallel_threshold bytes (default is 1048576)
+    [OPTIONAL]. Both fields can be specified also in MODULE section.
+
+2.10 Section may contain profile field. When true, kernel wrappers
+    record their durations to histograms that are available via
+    kernel_profile() function of the extension module [OPTIONAL].
+    Can be specified also in MODULE section.
+
+2.11 Section may contain profile_phases field. When true, kernel
+    wrappers accumulate the time spent before (copy_in_ns), in
+    (call_ns), and after (copy_out_ns) the function calls that are
+    available via phases item of kernel_stats() function of the
+    extension module [OPTIONAL]. Can be specified also in MODULE
+    section.
+
+Kernel wrappers contain USDT probes (kernel_entry, kernel_exit,
+copy_in, copy_out of provider xndtools) when the kernels source is
+compiled with -DXNDTOOLS_USDT, see xndtools.h.
+
+Kernel wrappers write log messages to a ring buffer when enabled at
+runtime via set_log_level() function of the extension module or
+XNDTOOLS_LOG_LEVEL environment variable. Section may contain debug
+field that adds argument types to the debug messages [OPTIONAL].
+
 '''
 
 def generate_config(modulename,
@@ -207,11 +253,14 @@ def generate_config(modulename,
     elif isinstance(target_file, str):
         if os.path.exists(target_file):
             reader = PrototypeReader()    
-            config = load_kernel_config(target_file)
+            with profiler.phase('load_config'):
+                config = load_kernel_config(target_file)
             for section in config.sections():
                 if section.startswith('KERNEL'):
                     f = config[section]
-                    for prototype in reader(f['prototypes']):
+                    with profiler.phase('read_prototypes'):
+                        prototypes = reader(f['prototypes'])
+                    for prototype in prototypes:
                         existing_names.append(prototype['name'])
             original_content = open(target_file).read()
             #print ('generate_config: target file {!r} exists! SKIPPING'.format(target_file))
@@ -247,9 +296,12 @@ def generate_config(modulename,
     functions = []
     for filename in header_files:
         source = open (filename).read()
-        for prototype in reader(source, match_patterns = match_patterns, exclude_patterns = exclude_patterns + existing_names):
+        with profiler.phase('read_prototypes'):
+            prototypes = reader(source, match_patterns = match_patterns, exclude_patterns = exclude_patterns + existing_names)
+        for prototype in prototypes:
             print('generate_config: included: {}'.format(prototype['name']))
-            prototype.update_typemap(typemap)
+            with profiler.phase('apply_typemap'):
+                prototype.update_typemap(typemap)
             s = prototype.signature(typemap=typemap, kind='match')
             groups[s].append(prototype)
 
@@ -306,7 +358,8 @@ def generate_config(modulename,
     for name, func_config in functions:
         config['KERNEL '+name] = func_config
 
-    config.write(target_file)
+    with profiler.phase('write'):
+        config.write(target_file)
 
     if own_target_file:
         target_file.close()
@@ -11,14 +11,15 @@ from copy import deepcopy
 from collections import defaultdict
 import pprint
 from .readers import PrototypeReader, load_kernel_config
-from .utils import NormalizedTypeMap, split_expression, intent_names, prettify
+from .utils import NormalizedTypeMap, split_expression, intent_names, prettify, is_intent_inany
 from .kernel_source_template import source_template
+from .profiling import profiler
 
 def update_argument_maps(expr, depends_map, values_map, shapes_map, arguments):
     if isinstance(expr, tuple): # (<name>, <value|shape>)
         name, value = expr
         for n in re.findall(r'(\b[a-zA-Z_]\w*\b)', value):
-            if n in arguments:
+            if n in arguments and n != name: # e.g. `lda = lda(a)`
                 if name not in depends_map[n]: # avoid circular dependencies
                     depends_map[name].add(n)
     elif '=' in expr: # <name>=<expr>
@@ -59,11 +60,86 @@ def apply_typemap(prototype, typemap, typemap_tests):
         if orig_type != normal_type:
             typemap_tests.add((orig_type, c_type))
     
+def get_tile_count(prototype):
+    """Return the name of hidden argument that holds the number of items
+    in the array arguments of an elementwise kernel. Return None when
+    the kernel arguments cannot be processed in tiles.
+    """
+    count = None
+    for arg in prototype['arguments']:
+        shape = arg.get('shape')
+        if shape is None:
+            if 'output' in arg.get('intent', ()):
+                return # scalar results would be overwritten by each tile
+            continue
+        if len(shape) != 1 or arg.get('intent') not in [('input',), ('inplace',), ('inout',), ('output',)]:
+            return
+        if 'increment' in arg:
+            return # tiles are contiguous copies
+        if count is None:
+            count = shape[0]['value']
+        elif count != shape[0]['value']:
+            return
+    if count in prototype['argument_map']:
+        arg = prototype.get_argument(count)
+        if arg.get('intent') == ('hide',) and 'value' in arg:
+            return count
+
+def get_stride_issue(prototype):
+    """Return the reason why the inc() or lda() arguments of prototype
+    cannot be bound. Return None when they can.
+
+    Increments and leading dimensions are computed from the steps of
+    the input array, so the array must be passed to the C function as
+    is. Only input, inplace and inout arrays are passed as is, the data
+    of the *_output intents is copied to a contiguous buffer. Leading
+    dimensions are row steps, so lda() requires C-ordered 2-d arrays.
+    """
+    for arg in prototype['arguments']:
+        for key, func in [('increment', 'inc'), ('leading_dimension', 'lda')]:
+            if key in arg and arg.get('intent') not in [('input',), ('inplace',), ('inout',)]:
+                return '{}({}) requires input, inplace or inout argument, got {}'.format(func, arg['name'], '_'.join(arg.get('intent', ('hide',))))
+        if 'leading_dimension' in arg and len(arg.get('shape') or ()) != 2:
+            return 'lda({}) requires 2-d argument'.format(arg['name'])
+        if 'leading_dimension' in arg and arg.is_fortran:
+            return 'lda({}) requires C-ordered argument'.format(arg['name'])
+
+def get_strided_issue(prototype, ellipses):
+    """Return the reason why Strided kind kernel cannot be generated
+    for given prototype and ellipses. Return None when it can.
+
+    Strided kernels receive one dimension and step per stack argument,
+    so array arguments must be 1-d and, as the number of outer
+    dimensions is not passed to the kernel, array arguments cannot be
+    combined with ellipses. gumath selects Strided kernels only when
+    all arguments are arrays or all are scalars.
+    """
+    if ellipses.startswith('var'):
+        return 'variable dimensions are not supported'
+    arrays, scalars = 0, int(prototype['type'] != 'void')
+    for arg in prototype['arguments']:
+        if arg.is_intent_hide:
+            continue
+        shape = arg.get('shape')
+        if shape is None:
+            if 'value' in arg and is_intent_inany(arg):
+                return 'optional arguments are not supported'
+            scalars += 1
+            continue
+        if len(shape) > 1:
+            return 'only scalar and 1-d array arguments are supported'
+        if ellipses:
+            return 'array arguments require ellipses none'
+        arrays += 1
+    if arrays and scalars:
+        return 'array arguments cannot be mixed with scalar arguments or return value'
+
 def generate_kernel(config_file,
                     target_file = None,
                     source_dir = ''):
     data = get_module_data(config_file)
-    source = source_template(data)
+    with profiler.phase('render'):
+        source = source_template(data)
     own_target_file = False
     if target_file == 'stdout':
         target_file = sys.stdout
@@ -78,14 +154,17 @@ def generate_kernel(config_file,
         else:
             own_target_file = False
 
-    target_file.write(prettify(source['c_source'], target='c'))
+    with profiler.phase('prettify'):
+        source = prettify(source['c_source'], target='c')
+    target_file.write(source)
     if own_target_file:
         target_file.close()
     return dict(config_file = config_file,
                 sources = [target_file.name] + data['sources'])
 
 def get_module_data(config_file, package=None):
-    config = load_kernel_config(config_file)
+    with profiler.phase('load_config'):
+        config = load_kernel_config(config_file)
     reader = PrototypeReader()    
     current_module = None
     xndtools_datadir = os.path.dirname(__file__)
@@ -95,9 +174,16 @@ def get_module_data(config_file, package=None):
     typemap_tests = set()
 
     default_debug_value = False
+    default_profile_value = False
+    default_profile_phases_value = False
     default_kinds_value = 'Xnd' # TODO: move to command line options
     default_ellipses_value = '...'
     default_arraytypes_value = 'symbolic'
+    default_threads_value = 1
+    default_memory_cap_value = -1
+    default_elementwise_value = False
+    default_parallel_value = False
+    default_parallel_threshold_value = 1024 * 1024
     
     for section in config.sections():
         if section.startswith('MODULE'):
@@ -126,9 +212,16 @@ def get_module_data(config_file, package=None):
                 sources.append(line)
 
             default_debug = bool(current_module.get('debug', default_debug_value))
+            default_profile = current_module.getboolean('profile', default_profile_value)
+            default_profile_phases = current_module.getboolean('profile_phases', default_profile_phases_value)
             default_kinds = split_expression(current_module.get('kinds', default_kinds_value))
             default_ellipses = split_expression(current_module.get('ellipses', default_ellipses_value))
             default_arraytypes = split_expression(current_module.get('arraytypes', default_arraytypes_value))
+            threads = current_module.getint('threads', default_threads_value)
+            memory_cap = current_module.getint('memory_cap', default_memory_cap_value)
+            default_elementwise = current_module.getboolean('elementwise', default_elementwise_value)
+            default_parallel = current_module.getboolean('parallel', default_parallel_value)
+            default_parallel_threshold = current_module.getint('parallel_threshold', default_parallel_threshold_value)
             
         elif section.startswith('KERNEL'):
             f = config[section]
@@ -138,15 +231,21 @@ def get_module_data(config_file, package=None):
             kernel_name = section.split(maxsplit=1)[1].strip()
             description = f.get('description','').strip()
 
-            prototypes = reader(f.get('prototypes',''))
-            prototypes_C = reader(f.get('prototypes_C', ''))
-            prototypes_Fortran = reader(f.get('prototypes_Fortran',''))
+            with profiler.phase('read_prototypes'):
+                prototypes = reader(f.get('prototypes',''))
+                prototypes_C = reader(f.get('prototypes_C', ''))
+                prototypes_Fortran = reader(f.get('prototypes_Fortran',''))
 
             if not (prototypes or prototypes_C or prototypes_Fortran):
                 print('get_module_data: no prototypes|prototypes_C|prototypes_Fortran defined in [KERNEL {}]'.format(kernel_name))
                 continue
 
             debug = bool(f.get('debug', default_debug))
+            profile = f.getboolean('profile', default_profile)
+            profile_phases = f.getboolean('profile_phases', default_profile_phases)
+            elementwise = f.getboolean('elementwise', default_elementwise)
+            parallel = f.getboolean('parallel', default_parallel)
+            parallel_threshold = f.getint('parallel_threshold', default_parallel_threshold)
             kinds = split_expression(f.get('kinds', ''))
             ellipses = f.get('ellipses')
             if ellipses is None:
@@ -178,8 +277,13 @@ def get_module_data(config_file, package=None):
                     prototype['description'] = description
                     prototype['function_name'] = prototype.pop('name')
                     prototype['debug'] = debug
+                    if profile:
+                        prototype['profile'] = True
+                    if profile_phases:
+                        prototype['profile_phases'] = True
                     prototype['oneline_description'] = prototype['description'].lstrip().split('\n',1)[0] or '<description not specified>'
-                    apply_typemap(prototype, typemap, typemap_tests)
+                    with profiler.phase('apply_typemap'):
+                        apply_typemap(prototype, typemap, typemap_tests)
 
                     depends_map = defaultdict(set)
                     values_map = {}
@@ -218,31 +322,58 @@ def get_module_data(config_file, package=None):
                     for name, value in values_map.items():
                         prototype.set_argument_value(name, value)
 
+                    issue = get_stride_issue(prototype)
+                    if issue is not None:
+                        raise ValueError('get_module_data: {}. [KERNEL {}]'.format(issue, kernel_name))
+
+                    if elementwise:
+                        tile_count = get_tile_count(prototype)
+                        if tile_count is None:
+                            print('get_module_data: elementwise kernel requires input|inplace|inout|output arrays with the same hidden length argument and no scalar outputs, ignoring elementwise. [KERNEL {}]'.format(kernel_name))
+                        else:
+                            prototype['elementwise'] = True
+                            prototype['tile_count'] = tile_count
+
                     input_args, output_args = prototype.get_input_output_arguments()
 
-                    for arraytype in arraytypes:
-                        for kind in kinds_:
-                            if arraytype == 'variable' and kind != 'Xnd':
-                                continue
-                            if max_rank < 2 and kind == 'Fortran':
-                                print('get_module_data: Fortran {}-rank kernel is equivalent to C kernel, skipping. [KERNEL {}]'.format(max_rank, kernel_name))
-                                continue
-                            for ellipses_ in ellipses:
-                                kernel = deepcopy(prototype)
-                                kernel['kind'] = kind
-                                kernel['arraytype'] = arraytype
-                                if ellipses_ and ellipses_.lower() != 'none':
-                                    if not input_args: # `void -> ... * T` not allowed
-                                        continue
-                                    if ellipses_ == '...' and arraytype == 'variable':
-                                        kernel['ellipses'] = 'var' + ellipses_ + ' * '
+                    with profiler.phase('expand_variants'):
+                        for arraytype in arraytypes:
+                            for kind in kinds_:
+                                if arraytype == 'variable' and kind != 'Xnd':
+                                    continue
+                                if max_rank < 2 and kind == 'Fortran':
+                                    print('get_module_data: Fortran {}-rank kernel is equivalent to C kernel, skipping. [KERNEL {}]'.format(max_rank, kernel_name))
+                                    continue
+                                if kind == 'Fortran' and any('leading_dimension' in arg for arg in prototype['arguments']):
+                                    print('get_module_data: Fortran kernel does not pass lda() arguments as is, skipping. [KERNEL {}]'.format(kernel_name))
+                                    continue
+                                for ellipses_ in ellipses:
+                                    kernel = deepcopy(prototype)
+                                    kernel['kind'] = kind
+                                    kernel['arraytype'] = arraytype
+                                    if ellipses_ and ellipses_.lower() != 'none':
+                                        if not input_args: # `void -> ... * T` not allowed
+                                            continue
+                                        if ellipses_ == '...' and arraytype == 'variable':
+                                            kernel['ellipses'] = 'var' + ellipses_ + ' * '
+                                        else:
+                                            kernel['ellipses'] = ellipses_ + ' * '
                                     else:
-                                        kernel['ellipses'] = ellipses_ + ' * '
-                                else:
-                                    kernel['ellipses'] = ''
-                                kernel['ellipses_name'] = kernel['ellipses'].replace('...','_DOTS_').replace('.','_DOT_').replace('*','_STAR_').replace(' ','')
-                                kernel['kernel_repr'] = pprint.pformat(kernel, indent=4, compact=True)
-                                kernels.append(kernel)
+                                        kernel['ellipses'] = ''
+                                    if kind == 'Strided':
+                                        issue = get_strided_issue(prototype, kernel['ellipses'])
+                                        if issue is not None:
+                                            print('get_module_data: Strided kernel {}, skipping. [KERNEL {}]'.format(issue, kernel_name))
+                                            continue
+                                    if parallel and kind == 'Xnd' and kernel['ellipses']:
+                                        if kernel['ellipses'].startswith('var'):
+                                            print('get_module_data: parallel kernel requires fixed outer dimensions, ignoring parallel. [KERNEL {}]'.format(kernel_name))
+                                        else:
+                                            kernel['parallel'] = True
+                                            kernel['parallel_threshold'] = parallel_threshold
+                                    kernel['ellipses_name'] = kernel['ellipses'].replace('...','_DOTS_').replace('.','_DOT_').replace('*','_STAR_').replace(' ','')
+                                    kernel['kernel_repr'] = pprint.pformat(kernel, indent=4, compact=True)
+                                    kernels.append(kernel)
 
     l = []
     for h in current_module.get('includes','').split():
@@ -256,6 +387,8 @@ def get_module_data(config_file, package=None):
         #header_code = current_module.get('header_code', ''),
         include_dirs = include_dirs,
         sources = sources,
+        threads = threads,
+        memory_cap = memory_cap,
         kernels = kernels,
         typemap_tests = list([dict(orig_type=o[0], normal_type=o[1]) for o in typemap_tests]),
     )
@@ -5,6 +5,7 @@
 
 import os
 from .generate_kernel import get_module_data
+from .profiling import profiler
 
 def generate_module(config_file,
                     target_file = None,
@@ -17,7 +18,8 @@ def generate_module(config_file,
     if target_file is None:
         target_file = os.path.join(source_dir, '{module_name}-{language}.c'.format(**module_data))
     if target_language == 'python':
-        module_source = pymodule_template.format(**module_data)
+        with profiler.phase('render:pymodule'):
+            module_source = pymodule_template.format(**module_data)
     else:
         raise NotImplementedError(repr(target_language))
     f = open(target_file, 'w')
@@ -39,6 +41,7 @@ pymodule_template = '''
 #include "pyndtypes.h"
 #include "gumath.h"
 #include "pygumath.h"
+#include "xndtools.h"
 
 
 /****************************************************************************/
@@ -48,6 +51,279 @@ pymodule_template = '''
 /* Function table */
 static gm_tbl_t *gmk_{module_name}_table = NULL;
 
+/* Wrapper call statistics, NULL terminated */
+extern xndtools_kernel_stats_t *gmk_{module_name}_kernel_stats[];
+
+/* Timings of module initialization, exposed as __init_stats__ */
+extern xndtools_init_stats_t gmk_{module_name}_init_stats;
+static int64_t gmk_{module_name}_tbl_new_ns = 0;
+static int64_t gmk_{module_name}_init_kernels_ns = 0;
+static int64_t gmk_{module_name}_nfunctions = 0;
+
+/****************************************************************************/
+/*                              Module functions                            */
+/****************************************************************************/
+
+static PyObject *
+{module_name}_scratch_stats(PyObject *self, PyObject *Py_UNUSED(ignored))
+{{
+    xndtools_scratch_stats_t stats;
+    xndtools_scratch_get_stats(&stats);
+    return Py_BuildValue("{{s:L,s:L}}",
+                         "hits", (long long)stats.hits,
+                         "misses", (long long)stats.misses);
+}}
+
+static PyObject *
+{module_name}_reset_scratch_stats(PyObject *self, PyObject *Py_UNUSED(ignored))
+{{
+    xndtools_scratch_reset_stats();
+    Py_RETURN_NONE;
+}}
+
+static PyObject *
+{module_name}_memory_stats(PyObject *self, PyObject *Py_UNUSED(ignored))
+{{
+    xndtools_memory_stats_t stats;
+    xndtools_memory_get_stats(&stats);
+    return Py_BuildValue("{{s:L,s:L,s:L}}",
+                         "current", (long long)stats.current,
+                         "peak", (long long)stats.peak,
+                         "cap", (long long)stats.cap);
+}}
+
+static PyObject *
+{module_name}_reset_memory_peak(PyObject *self, PyObject *Py_UNUSED(ignored))
+{{
+    xndtools_memory_reset_peak();
+    Py_RETURN_NONE;
+}}
+
+static PyObject *
+{module_name}_set_memory_cap(PyObject *self, PyObject *arg)
+{{
+    long long cap = -1;
+    if (arg != Py_None) {{
+        cap = PyLong_AsLongLong(arg);
+        if (cap == -1 && PyErr_Occurred()) {{
+            return NULL;
+        }}
+    }}
+    xndtools_set_memory_cap(cap);
+    Py_RETURN_NONE;
+}}
+
+static PyObject *
+{module_name}_copy_stats(xndtools_kernel_stats_t *stats)
+{{
+    xndtools_copy_stats_summary_t summary;
+    PyObject *item = NULL;
+    PyObject *result = PyDict_New();
+    if (result == NULL) {{
+        return NULL;
+    }}
+    for (int i = 0; i < stats->ncopy_stats; i++) {{
+        xndtools_copy_stats_get_summary(&stats->copy_stats[i], &summary);
+        item = Py_BuildValue("{{s:L,s:L,s:L,s:L}}",
+                             "zero_copy", (long long)summary.zero_copy,
+                             "copy_in", (long long)summary.copy_in,
+                             "copy_out", (long long)summary.copy_out,
+                             "bytes", (long long)summary.bytes);
+        if (item == NULL || PyDict_SetItemString(result, stats->copy_stats[i].name, item) < 0) {{
+            Py_XDECREF(item);
+            Py_DECREF(result);
+            return NULL;
+        }}
+        Py_DECREF(item);
+    }}
+    return result;
+}}
+
+static int
+{module_name}_phases(xndtools_kernel_stats_t *stats, PyObject *item)
+{{
+    xndtools_kernel_phases_summary_t summary;
+    PyObject *phases = NULL;
+    int status;
+    xndtools_kernel_phases_get_summary(stats->phases, &summary);
+    phases = Py_BuildValue("{{s:L,s:L,s:L}}",
+                           "copy_in_ns", (long long)summary.copy_in_ns,
+                           "call_ns", (long long)summary.call_ns,
+                           "copy_out_ns", (long long)summary.copy_out_ns);
+    if (phases == NULL) {{
+        return -1;
+    }}
+    status = PyDict_SetItemString(item, "phases", phases);
+    Py_DECREF(phases);
+    return status;
+}}
+
+static PyObject *
+{module_name}_kernel_stats(PyObject *self, PyObject *Py_UNUSED(ignored))
+{{
+    xndtools_kernel_stats_t **stats;
+    PyObject *item = NULL;
+    PyObject *result = PyDict_New();
+    if (result == NULL) {{
+        return NULL;
+    }}
+    for (stats = gmk_{module_name}_kernel_stats; *stats != NULL; stats++) {{
+        item = Py_BuildValue("{{s:s,s:s,s:L,s:N}}",
+                             "kernel", (*stats)->kernel,
+                             "kind", (*stats)->kind,
+                             "calls", (long long)xndtools_kernel_stats_get_calls(*stats),
+                             "arguments", {module_name}_copy_stats(*stats));
+        if (item != NULL && (*stats)->phases != NULL && {module_name}_phases(*stats, item) < 0) {{
+            Py_CLEAR(item);
+        }}
+        if (item == NULL || PyDict_SetItemString(result, (*stats)->name, item) < 0) {{
+            Py_XDECREF(item);
+            Py_DECREF(result);
+            return NULL;
+        }}
+        Py_DECREF(item);
+    }}
+    return result;
+}}
+
+static PyObject *
+{module_name}_kernel_profile(PyObject *self, PyObject *Py_UNUSED(ignored))
+{{
+    xndtools_kernel_stats_t **stats;
+    xndtools_kernel_profile_summary_t summary;
+    PyObject *item = NULL;
+    PyObject *result = PyDict_New();
+    if (result == NULL) {{
+        return NULL;
+    }}
+    for (stats = gmk_{module_name}_kernel_stats; *stats != NULL; stats++) {{
+        if ((*stats)->profile == NULL) {{
+            continue;
+        }}
+        xndtools_kernel_profile_get_summary((*stats)->profile, &summary);
+        item = Py_BuildValue("{{s:s,s:s,s:L,s:L,s:L,s:L}}",
+                             "kernel", (*stats)->kernel,
+                             "kind", (*stats)->kind,
+                             "count", (long long)summary.count,
+                             "total_ns", (long long)summary.total_ns,
+                             "p50_ns", (long long)summary.p50_ns,
+                             "p99_ns", (long long)summary.p99_ns);
+        if (item == NULL || PyDict_SetItemString(result, (*stats)->name, item) < 0) {{
+            Py_XDECREF(item);
+            Py_DECREF(result);
+            return NULL;
+        }}
+        Py_DECREF(item);
+    }}
+    return result;
+}}
+
+static PyObject *
+{module_name}_reset_kernel_stats(PyObject *self, PyObject *Py_UNUSED(ignored))
+{{
+    xndtools_kernel_stats_t **stats;
+    for (stats = gmk_{module_name}_kernel_stats; *stats != NULL; stats++) {{
+        xndtools_kernel_stats_reset(*stats);
+    }}
+    Py_RETURN_NONE;
+}}
+
+static PyObject *
+{module_name}_set_log_level(PyObject *self, PyObject *args, PyObject *kwds)
+{{
+    static char *kwlist[] = {{"level", "kernel", NULL}};
+    int level;
+    const char *kernel = NULL;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "i|z", kwlist, &level, &kernel)) {{
+        return NULL;
+    }}
+    if (level < XNDTOOLS_LOG_OFF || level > XNDTOOLS_LOG_DEBUG) {{
+        PyErr_Format(PyExc_ValueError, "log level must be in [%d, %d], got %d",
+                     XNDTOOLS_LOG_OFF, XNDTOOLS_LOG_DEBUG, level);
+        return NULL;
+    }}
+    xndtools_log_set_level(level, kernel);
+    Py_RETURN_NONE;
+}}
+
+static PyObject *
+{module_name}_get_log_level(PyObject *self, PyObject *Py_UNUSED(ignored))
+{{
+    return PyLong_FromLong(xndtools_log_get_level());
+}}
+
+static PyObject *
+{module_name}_dump_log(PyObject *self, PyObject *args, PyObject *kwds)
+{{
+    static char *kwlist[] = {{"clear", NULL}};
+    int clear = 1;
+    int64_t i, n;
+    xndtools_log_entry_t *entries = NULL;
+    PyObject *item = NULL;
+    PyObject *result = NULL;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|p", kwlist, &clear)) {{
+        return NULL;
+    }}
+    entries = PyMem_Malloc(XNDTOOLS_LOG_CAPACITY * sizeof(xndtools_log_entry_t));
+    if (entries == NULL) {{
+        return PyErr_NoMemory();
+    }}
+    n = xndtools_log_read(entries, XNDTOOLS_LOG_CAPACITY, clear);
+    result = PyList_New(n);
+    if (result == NULL) {{
+        PyMem_Free(entries);
+        return NULL;
+    }}
+    for (i = 0; i < n; i++) {{
+        item = Py_BuildValue("(Lis)", (long long)entries[i].time_ns, entries[i].level, entries[i].message);
+        if (item == NULL) {{
+            PyMem_Free(entries);
+            Py_DECREF(result);
+            return NULL;
+        }}
+        PyList_SET_ITEM(result, i, item);
+    }}
+    PyMem_Free(entries);
+    return result;
+}}
+
+static PyMethodDef {module_name}_methods[] = {{
+    {{"kernel_stats", {module_name}_kernel_stats, METH_NOARGS,
+     "Return call statistics of kernel wrappers as a dict keyed by wrapper name.\\n\\n"
+     "Arguments item counts how array arguments are passed to the function:\\n"
+     "as is (zero_copy) or via temporary (copy_in, copy_out, bytes).\\n"
+     "Phases item, of kernels with profile_phases = True, contains the time in ns\\n"
+     "spent before (copy_in_ns), in (call_ns), and after (copy_out_ns) function calls."}},
+    {{"reset_kernel_stats", {module_name}_reset_kernel_stats, METH_NOARGS,
+     "Reset call statistics and duration histograms of kernel wrappers."}},
+    {{"kernel_profile", {module_name}_kernel_profile, METH_NOARGS,
+     "Return call count, total, median, and 99th percentile duration in ns of profiled kernel wrappers."}},
+    {{"scratch_stats", {module_name}_scratch_stats, METH_NOARGS,
+     "Return scratch arena hit/miss counters of kernel temporaries."}},
+    {{"reset_scratch_stats", {module_name}_reset_scratch_stats, METH_NOARGS,
+     "Reset scratch arena hit/miss counters."}},
+    {{"memory_stats", {module_name}_memory_stats, METH_NOARGS,
+     "Return current and peak bytes of kernel temporaries in use, and the memory cap."}},
+    {{"reset_memory_peak", {module_name}_reset_memory_peak, METH_NOARGS,
+     "Reset the peak bytes of kernel temporaries to the current bytes in use."}},
+    {{"set_memory_cap", {module_name}_set_memory_cap, METH_O,
+     "set_memory_cap(cap)\\n\\n"
+     "Set the maximal number of bytes of kernel temporaries in use. Kernels\\n"
+     "exceeding the cap fail with MemoryError. None or negative cap means unlimited."}},
+    {{"set_log_level", (PyCFunction){module_name}_set_log_level, METH_VARARGS | METH_KEYWORDS,
+     "set_log_level(level, kernel=None)\\n\\n"
+     "Set the level of kernel wrapper log messages (LOG_OFF, LOG_ERROR, LOG_WARNING,\\n"
+     "LOG_INFO, LOG_DEBUG). When kernel is specified, only messages of wrappers\\n"
+     "whose name contains kernel are logged."}},
+    {{"get_log_level", {module_name}_get_log_level, METH_NOARGS,
+     "Return the level of kernel wrapper log messages."}},
+    {{"dump_log", (PyCFunction){module_name}_dump_log, METH_VARARGS | METH_KEYWORDS,
+     "dump_log(clear=True)\\n\\n"
+     "Return a list of (time_ns, level, message) entries of the kernel wrapper log.\\n"
+     "When clear is true, the returned entries are removed from the log."}},
+    {{NULL, NULL, 0, NULL}}
+}};
+
 /****************************************************************************/
 /*                                  Module                                  */
 /****************************************************************************/
@@ -57,7 +333,7 @@ static struct PyModuleDef {module_name}_module = {{
     "{module_name}",                 /* m_name */
     NULL,                         /* m_doc */
     -1,                           /* m_size */
-    NULL,                         /* m_methods */
+    {module_name}_methods,        /* m_methods */
     NULL,                         /* m_slots */
     NULL,                         /* m_traverse */
     NULL,                         /* m_clear */
@@ -66,12 +342,22 @@ static struct PyModuleDef {module_name}_module = {{
 
 int gmk_init_{module_name}_kernels(gm_tbl_t *tbl, ndt_context_t *ctx);
 
+static int
+{module_name}_count_function(const gm_func_t *f, void *state)
+{{
+    (*(int64_t *)state)++;
+    return 0;
+}}
+
 PyMODINIT_FUNC
 PyInit_{module_name}(void)
 {{
     NDT_STATIC_CONTEXT(ctx);
     PyObject *m = NULL;
+    PyObject *init_stats = NULL;
     static int initialized = 0;
+    int64_t start_ns = xndtools_profile_clock();
+    int64_t add_functions_ns;
 
     if (!initialized) {{
        if (import_ndtypes() < 0) {{
@@ -81,14 +367,19 @@ PyInit_{module_name}(void)
             return NULL;
        }}
 
+       int64_t start = xndtools_profile_clock();
        gmk_{module_name}_table = gm_tbl_new(&ctx);
        if (gmk_{module_name}_table == NULL) {{
            return Ndt_SetError(&ctx);
        }}
+       gmk_{module_name}_tbl_new_ns = xndtools_profile_clock() - start;
 
+       start = xndtools_profile_clock();
        if (gmk_init_{module_name}_kernels(gmk_{module_name}_table, &ctx) < 0) {{
            return Ndt_SetError(&ctx);
        }}
+       gmk_{module_name}_init_kernels_ns = xndtools_profile_clock() - start;
+       gm_tbl_map(gmk_{module_name}_table, {module_name}_count_function, &gmk_{module_name}_nfunctions);
 
        initialized = 1;
     }}
@@ -98,9 +389,33 @@ PyInit_{module_name}(void)
         goto error;
     }}
 
+    add_functions_ns = xndtools_profile_clock();
     if (Gumath_AddFunctions(m, gmk_{module_name}_table) < 0) {{
         goto error;
     }}
+    add_functions_ns = xndtools_profile_clock() - add_functions_ns;
+
+    if (PyModule_AddIntConstant(m, "LOG_OFF", XNDTOOLS_LOG_OFF) < 0 ||
+        PyModule_AddIntConstant(m, "LOG_ERROR", XNDTOOLS_LOG_ERROR) < 0 ||
+        PyModule_AddIntConstant(m, "LOG_WARNING", XNDTOOLS_LOG_WARNING) < 0 ||
+        PyModule_AddIntConstant(m, "LOG_INFO", XNDTOOLS_LOG_INFO) < 0 ||
+        PyModule_AddIntConstant(m, "LOG_DEBUG", XNDTOOLS_LOG_DEBUG) < 0) {{
+        goto error;
+    }}
+
+    init_stats = Py_BuildValue("{{s:L,s:L,s:L,s:L,s:L,s:L,s:L,s:L}}",
+                               "typemaps_ns", (long long)gmk_{module_name}_init_stats.typemaps_ns,
+                               "tbl_new_ns", (long long)gmk_{module_name}_tbl_new_ns,
+                               "add_kernels_ns", (long long)gmk_{module_name}_init_stats.add_kernels_ns,
+                               "init_kernels_ns", (long long)gmk_{module_name}_init_kernels_ns,
+                               "add_functions_ns", (long long)add_functions_ns,
+                               "total_ns", (long long)(xndtools_profile_clock() - start_ns),
+                               "kernels", (long long)gmk_{module_name}_nfunctions,
+                               "signatures", (long long)gmk_{module_name}_init_stats.nsignatures);
+    if (init_stats == NULL || PyModule_AddObject(m, "__init_stats__", init_stats) < 0) {{
+        Py_XDECREF(init_stats);
+        goto error;
+    }}
 
     return m;
 
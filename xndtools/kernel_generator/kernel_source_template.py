@@ -3,6 +3,7 @@
 # Author: Pearu Peterson
 # Created: May 2018
 
+import re
 from collections import defaultdict
 from copy import deepcopy
 from .templating import Template, Predicate, flatten
@@ -24,6 +25,10 @@ def arraytype_is(arraytype):
 is_symbolic = arraytype_is('symbolic')
 is_variable = arraytype_is('variable')
 debug = Predicate(lambda data: data.get('debug', False))
+elementwise = Predicate(lambda data: data.get('elementwise', False))
+profile = Predicate(lambda data: data.get('profile', False))
+profile_phases = Predicate(lambda data: data.get('profile_phases', False))
+parallel = Predicate(lambda data: data.get('parallel', False))
 is_scalar = Predicate(lambda data: not (data.get('left_modifier') or data.get('right_modifier')))
 is_scalar_ptr = Predicate(lambda data: data.get('left_modifier')=='*' and not data.get('right_modifier') and data.get('shape') is None)
 is_array = Predicate(lambda data: (data.get('left_modifier')=='*' or data.get('right_modifier')=='[]') and data.get('shape') is not None)
@@ -174,6 +179,9 @@ def initialize_kernels(data):
     3. Extends arguments with function return value.
     4. Initialize various lists.
     5. Computes nin, nout, symbols for constraint function.
+    6. Sets the number and inner rank of stack arguments of parallel kernels.
+    7. Sets argument copy_index for copy statistics of array arguments.
+    8. Sets probe_nitems, the number of items in the first argument.
     """    
     dimension_symbols = 'NMLKPQRSVWXYZBCDFGHJAEIOU'
     dims_map = {}
@@ -227,6 +235,26 @@ def initialize_kernels(data):
         output_args.append(arg)
     for arg in output_args:
         arg['output_index'] += input_index
+    copy_stats = []
+    for arg in data['arguments']:
+        if is_array(arg) and not is_hide(arg):
+            arg['copy_index'] = len(copy_stats)
+            copy_stats.append('{{ .name = "{}", .wrapper = "{}", .itemsize = sizeof({}) }}'.format(
+                arg['name'], wrapper_name.format_map(data), arg['ctype']))
+    if input_index + output_index == 0:
+        data['probe_nitems'] = '0'
+    elif data.get('kind') == 'Strided':
+        data['probe_nitems'] = 'gmk_dimensions[0]'
+    else:
+        data['probe_nitems'] = 'xndtools_fixed_nitems(&gmk_stack[0])'
+    if copy_stats:
+        data['copy_stats_initializers'] = ', '.join(copy_stats)
+        data['ncopy_stats'] = len(copy_stats)
+    if data.get('parallel'):
+        data['parallel_nargs'] = input_index + output_index
+        for arg in data['arguments']:
+            if arg.get('input_index') == 0:
+                data['parallel_inner_ndim'] = len(arg.get('shape') or ())
 
     # To suppress warnings when no input or no output, must be empty lists:
     data['arguments-list'] = []
@@ -235,6 +263,48 @@ def initialize_kernels(data):
     data['output_utype-list'] = []
     data['body-list'] = []
 
+    if data.get('kind') == 'Strided':
+        initialize_strided_kernel(data)
+
+strided_value_map = [
+    (re.compile(r'xnd_fixed_shape_at\(&gmk_input_(\w+), 0\)'), 'gmk_dimensions[{input_index}]'),
+    (re.compile(r'xnd_ndim\(&gmk_input_(\w+)\)'), '1'),
+    (re.compile(r'xndtools_increment\(&gmk_input_(\w+)\)'),
+     'xndtools_strided_increment(gmk_dimensions[{input_index}], gmk_steps[{input_index}], sizeof({ctype}))'),
+]
+
+def initialize_strided_kernel(data):
+    """
+    Strided kernels receive data pointers, dimensions, and steps of
+    gumath stack arguments. Array arguments are 1-d and used without
+    ellipses (see get_module_data), so each argument has exactly one
+    dimension and step at its stack index. Kernels with scalar
+    arguments only are applied to dimensions[0] items in a loop that
+    is specialized for unit steps.
+
+    1. Sets strided_unit_test and strided_unit_steps for scalar loops.
+    2. Replaces xnd_t based values of hidden arguments.
+    """
+    args = dict((arg['name'], arg) for arg in data['arguments'])
+    steps = {}
+    for arg in data['arguments']:
+        if is_array(arg) and not is_hide(arg):
+            steps = None
+            break
+        for index in [arg.get('input_index'), arg.get('output_index')]:
+            if index is not None:
+                steps[index] = 'sizeof({})'.format(arg.get('ctype', data['ctype']))
+    if steps:
+        data['strided_unit_test'] = ' && '.join('gmk_steps[{}] == {}'.format(i, steps[i]) for i in sorted(steps))
+        data['strided_unit_steps'] = ', '.join(steps[i] for i in sorted(steps))
+    for arg in data['arguments']:
+        value = arg.get('value')
+        if value is None:
+            continue
+        for pattern, repl in strided_value_map:
+            value = pattern.sub(lambda m: repl.format_map(args[m.group(1)]), value)
+        arg['value'] = value
+
 def initialize_argument(data):
     if is_scalar(data):
         data['cfmt'] = dict(int32='%d', int64='%ld', float32='%f', float64='%f')[data['type']]
@@ -272,10 +342,6 @@ c_source_template = '''\
 #define GMK_FIXED_ARRAY_DATA(CTYPE, NAME) ((CTYPE *)(NAME.ptr + NAME.index * NAME.type->Concrete.FixedDim.itemsize))
 #define GMK_SCALAR_DATA(CTYPE, NAME) ((CTYPE *)(NAME.ptr))
 
-#define DEBUGMSG(MSG) printf("debug: " MSG);
-#define DEBUGMSG1(MSG, VALUE) printf("debug: " MSG, VALUE);
-#define DEBUGMSG2(MSG, VALUE1, VALUE2) printf("debug: " MSG, VALUE1, VALUE2);
-
 
 /****************************************************************************/
 /*                       Generated constraints                              */
@@ -300,25 +366,22 @@ gmk_test_{module_name}_typemaps(ndt_context_t *ctx) {{
 }}
 
 /****************************************************************************/
-/*                       Report wrapper call statistics                     */
+/*                       Wrapper call statistics                            */
 /****************************************************************************/
 
-static void
-gmk_wrapper_stats_{module_name}(void) {{
-    printf("----------------------------------------------------------------\\n");
-    printf("Module: {module_name}\\n");
-    printf("------+---------------------------------------------------------\\n");
-    printf("Calls | Wrapper name\\n");
-    printf("------+---------------------------------------------------------\\n");
-    {report_wrapper_counter-list}
-    printf("------+---------------------------------------------------------\\n");
-}}
+xndtools_kernel_stats_t *gmk_{module_name}_kernel_stats[] = {{
+    {kernel_stats-list}
+    NULL
+}};
 
 
 static const gm_kernel_init_t {module_name}_kernels[] = {{
   {signatures-list}
 }};
 
+/* Timings of gmk_init_{module_name}_kernels */
+xndtools_init_stats_t gmk_{module_name}_init_stats = {{ 0 }};
+
 /****************************************************************************/
 /*                       Initialize kernel table                            */
 /****************************************************************************/
@@ -327,17 +390,24 @@ int
 gmk_init_{module_name}_kernels(gm_tbl_t *tbl, ndt_context_t *ctx)
 {{
     const gm_kernel_init_t *k;
+    int64_t start = xndtools_profile_clock();
 
     if (gmk_test_{module_name}_typemaps(ctx) < 0) {{
          return -1;
     }}
+    gmk_{module_name}_init_stats.typemaps_ns = xndtools_profile_clock() - start;
 
+    xndtools_set_copy_threads({threads});
+    xndtools_init_memory_cap({memory_cap});
+
+    start = xndtools_profile_clock();
     for (k = {module_name}_kernels; k->name != NULL; k++) {{
         if (gm_add_kernel(tbl, k, ctx) < 0) {{
             return -1;
         }}
+        gmk_{module_name}_init_stats.nsignatures++;
     }}
-    atexit(gmk_wrapper_stats_{module_name});
+    gmk_{module_name}_init_stats.add_kernels_ns = xndtools_profile_clock() - start;
     return 0;
 }}
 
@@ -354,10 +424,6 @@ typemap_tests_template = '''
     }}
 '''
 
-report_wrapper_counter_template = '''\
-if (!{wrapper_name}_counter)
-  printf("%5d | {wrapper_name}\\n", {wrapper_name}_counter);
-'''
 
 constraints_template = '''
 static int 
@@ -380,31 +446,137 @@ kernel_template = '''
   Configuration:
 {kernel_repr}
 */
-static int {wrapper_name}_counter = 0;
-static int
-{wrapper_name}(xnd_t gmk_stack[], ndt_context_t *gmk_ctx) {{
-  {wrapper_name}_counter += 1;
-  {entering}
+{profile_declaration}
+{phases_declaration}
+{copy_stats_declaration}
+static xndtools_kernel_stats_t {wrapper_name}_stats = {{ .name = "{wrapper_name}", .kernel = "{kernel_name}", .kind = "{kind}"{profile_field}{phases_field}{copy_stats_field} }};
+static {item_specifier}int
+{wrapper_name}{item_suffix}(xnd_t gmk_stack[], ndt_context_t *gmk_ctx) {{
+  {item_instrument_start}
   int gmk_success = 0;
   {declarations-list}
+  {tile_declarations}
+  {phases_start}
   {body-start-list}
+  {tile_loop_start}
+  {phases_call_start}
   {return_value}{function_name}({arguments-list});
+  {phases_call_stop}
+  {tile_loop_end}
   {body-end-list}
-  {leaving}
+  {phases_stop}
+  {item_instrument_stop}
+  return gmk_success;
+}}
+'''
+
+# Parallel kernels receive the outer dimension of the arguments
+# (gumath vectorize flag) and apply the kernel to its items in
+# parallel using OpenMP. Without OpenMP the items are processed
+# sequentially. Call statistics, profile, probes and logs are recorded
+# once per wrapper call, so the item function (kernel_template with
+# parallel predicate) has no instrumentation other than copy
+# statistics and phases of the items.
+parallel_kernel_template = kernel_template + '''
+static int
+{wrapper_name}_items(xnd_t gmk_stack[], ndt_context_t *gmk_ctx) {{
+  const int64_t gmk_n = xnd_fixed_shape(&gmk_stack[0]);
+  int64_t gmk_nbytes = 0;
+  for (int gmk_k = 0; gmk_k < {parallel_nargs}; gmk_k++) {{
+    if (gmk_stack[gmk_k].type->tag != FixedDim || gmk_stack[gmk_k].type->FixedDim.shape != gmk_n) {{
+      ndt_err_format(gmk_ctx, NDT_RuntimeError, "type or shape mismatch in outer dimensions");
+      return -1;
+    }}
+    gmk_nbytes += xndtools_fixed_nbytes(&gmk_stack[gmk_k]);
+  }}
+  int gmk_success = 0;
+  #pragma omp parallel for schedule(static) if (gmk_nbytes >= {parallel_threshold})
+  for (int64_t gmk_i = 0; gmk_i < gmk_n; gmk_i++) {{
+    xnd_t gmk_item_stack[{parallel_nargs}];
+    NDT_STATIC_CONTEXT(gmk_item_context);
+    int gmk_item_success;
+    #pragma omp atomic read
+    gmk_item_success = gmk_success;
+    if (gmk_item_success < 0)
+      continue;
+    for (int gmk_k = 0; gmk_k < {parallel_nargs}; gmk_k++) {{
+      gmk_item_stack[gmk_k] = xnd_fixed_dim_next(&gmk_stack[gmk_k], gmk_i);
+    }}
+    if ({wrapper_name}_item(gmk_item_stack, &gmk_item_context) < 0) {{
+      #pragma omp critical
+      {{
+        if (gmk_success == 0) {{
+          ndt_err_format(gmk_ctx, gmk_item_context.err, "%s", ndt_context_msg(&gmk_item_context));
+          #pragma omp atomic write
+          gmk_success = -1;
+        }}
+      }}
+      ndt_err_clear(&gmk_item_context);
+    }}
+  }}
+  return gmk_success;
+}}
+
+static int
+{wrapper_name}(xnd_t gmk_stack[], ndt_context_t *gmk_ctx) {{
+  {instrument_start}
+  int gmk_success;
+  if (xnd_ndim(&gmk_stack[0]) == {parallel_inner_ndim})
+    gmk_success = {wrapper_name}_item(gmk_stack, gmk_ctx);
+  else
+    gmk_success = {wrapper_name}_items(gmk_stack, gmk_ctx);
+  {instrument_stop}
   return gmk_success;
 }}
 '''
 
 strided_kernel_template = '''
+/*
+  Kernel: {kernel_name}
+  Signature: "{sig}"
+  External function: {function_name}
+  Configuration:
+{kernel_repr}
+*/
+{profile_declaration}
+{phases_declaration}
+{copy_stats_declaration}
+static xndtools_kernel_stats_t {wrapper_name}_stats = {{ .name = "{wrapper_name}", .kernel = "{kernel_name}", .kind = "{kind}"{profile_field}{phases_field}{copy_stats_field} }};
+static inline int
+{wrapper_name}_loop(char **gmk_args, const intptr_t *gmk_dimensions, const intptr_t *gmk_steps, intptr_t gmk_n, ndt_context_t *gmk_ctx) {{
+  int gmk_success = 0;
+  {declarations-list}
+  (void)gmk_dimensions;
+  (void)gmk_ctx;
+  {phases_start}
+  for (intptr_t gmk_i = 0; gmk_i < gmk_n && gmk_success == 0; gmk_i++) {{
+    {body-start-list}
+    {phases_call_start}
+    {return_value}{function_name}({arguments-list});
+    {phases_call_stop}
+    {body-end-list}
+  }}
+  {phases_stop}
+  return gmk_success;
+}}
+
 static int
-{wrapper_name}(char **args, intptr_t *dimensions, intptr_t *steps, void *data) {{
-  {entering}
+{wrapper_name}(char **gmk_args, intptr_t *gmk_dimensions, intptr_t *gmk_steps, void *gmk_data) {{
+  {instrument_start}
   int gmk_success = 0;
-  NOT_IMPLEMENTED_KIND_{kind}_for_{function_name};
-  {leaving}
+  NDT_STATIC_CONTEXT(gmk_context);
+  ndt_context_t *gmk_ctx = &gmk_context;
+  (void)gmk_data;
+  {strided_call}
+  if (gmk_success < 0) {{
+    /* Strided kernels have no context for reporting errors to gumath */
+    ndt_err_fprint(stderr, gmk_ctx);
+    ndt_err_clear(gmk_ctx);
+  }}
+  {instrument_stop}
   return gmk_success;
 }}
- '''
+'''
 
 #
 # Templates
@@ -418,10 +590,8 @@ source_template = Template(
         'constraints-list': join_constraints_list,
         'signatures-list': join_signatures_list,
         'typemap_tests-list': '',
-        'report_wrapper_counter-list': '',
+        'kernel_stats-list': '\n    ',
         'short_doc-list': join_short_doc_list,
-        'constraint_entering-list': '\n', # not used, to suppress warnigns
-        'constraint_leaving-list': '\n',  # not used, to suppress warnigns
         'all_warnings-list': join_warnings_list,
     }
 )
@@ -436,19 +606,16 @@ wrapper_name = 'gmk_{kernel_name}_{ellipses_name}_{arraytype}_{kind}_{function_n
 constraint_name = 'gmk_{kernel_name}_constraint_func'
 source_template['kernels'] = Template(
     dict(kernels = [
-        (strided_kernel_template, kernel_template) * kind_is('Strided'),
+        (strided_kernel_template, (parallel_kernel_template, kernel_template) * parallel) * kind_is('Strided'),
     ],
          constraints = [
              constraints_template * need_constraint,
          ],
-         constraint_entering = 'DEBUGMSG("Entering {constraint_name}\\n");' * debug,
-         constraint_leaving = 'DEBUGMSG("Leaving {constraint_name}\\n");' * debug,
          
-         signatures = '{kernel_name}|{sig}|{nout_symbols}|.{kind} = {wrapper_name}',
-         report_wrapper_counter = report_wrapper_counter_template,
+         signatures = ('{kernel_name}|{sig}|{nout_symbols}|.{kind} = {wrapper_name}, .vectorize = true',
+                       '{kernel_name}|{sig}|{nout_symbols}|.{kind} = {wrapper_name}') * parallel,
+         kernel_stats = '&{wrapper_name}_stats,',
          short_doc = '{kernel_name} - "{oneline_description}" @:@ {sig} @:@ {kind}',
-         entering = 'DEBUGMSG("Entering {wrapper_name}\\n");' * debug,
-         leaving = 'DEBUGMSG("Leaving {wrapper_name}\\n");' * debug,
          all_warnings = '{warnings-list}',
     ),
     variables = dict(
@@ -458,14 +625,76 @@ source_template['kernels'] = Template(
         empty_output_utype = 'void',
         sig = '{input_utype-list|empty_input_utype} -> {output_utype-list| empty_output_utype}',
         return_value = ('{function_name}_return_value_ = ', '') * -type_is('void'),
-        entering = ('DEBUGMSG("entering {}\\n");'.format(wrapper_name),'') * debug,
-        leaving = ('DEBUGMSG("leaving {}\\n");'.format(wrapper_name),'') * debug,
+        # log messages are written only when enabled at runtime
+        entering = 'XNDTOOLS_LOG(XNDTOOLS_LOG_DEBUG, {wrapper_name}_stats.name, "entering");',
+        leaving = '''\
+if (gmk_success < 0)
+  XNDTOOLS_LOG(XNDTOOLS_LOG_ERROR, {wrapper_name}_stats.name, "%s", ndt_context_msg(gmk_ctx));
+XNDTOOLS_LOG(XNDTOOLS_LOG_DEBUG, {wrapper_name}_stats.name, "leaving with status %d", gmk_success);''',
+        constraint_entering = 'XNDTOOLS_LOG(XNDTOOLS_LOG_DEBUG, "{constraint_name}", "entering");',
+        constraint_leaving = 'XNDTOOLS_LOG(XNDTOOLS_LOG_DEBUG, "{constraint_name}", "leaving");',
+        # array arguments count how their data is passed to the function
+        copy_stats_declaration = ('static xndtools_copy_stats_t {wrapper_name}_copy_stats[] = {{ {copy_stats_initializers} }};', '') * has('copy_stats_initializers'),
+        copy_stats_field = (', .copy_stats = {wrapper_name}_copy_stats, .ncopy_stats = {ncopy_stats}', '') * has('copy_stats_initializers'),
+        # profiled wrappers record their durations to a histogram
+        profile_declaration = ('static xndtools_kernel_profile_t {wrapper_name}_profile;', '') * profile,
+        profile_field = (', .profile = &{wrapper_name}_profile', '') * profile,
+        profile_start = ('int64_t gmk_profile_start = xndtools_profile_clock();', '') * profile,
+        profile_stop = ('xndtools_kernel_profile_record(&{wrapper_name}_profile, gmk_profile_start);', '') * profile,
+        # time between function calls is accounted to copy-in phase
+        phases_declaration = ('static xndtools_kernel_phases_t {wrapper_name}_phases;', '') * profile_phases,
+        phases_field = (', .phases = &{wrapper_name}_phases', '') * profile_phases,
+        phases_start = ('int64_t gmk_phase_mark = xndtools_profile_clock(), gmk_phase_call, gmk_phase_copy_in_ns = 0, gmk_phase_call_ns = 0;', '') * profile_phases,
+        phases_call_start = ('gmk_phase_call = xndtools_profile_clock(); gmk_phase_copy_in_ns += gmk_phase_call - gmk_phase_mark;', '') * profile_phases,
+        phases_call_stop = ('gmk_phase_mark = xndtools_profile_clock(); gmk_phase_call_ns += gmk_phase_mark - gmk_phase_call;', '') * profile_phases,
+        phases_stop = ('xndtools_kernel_phases_record(&{wrapper_name}_phases, gmk_phase_copy_in_ns, gmk_phase_call_ns, xndtools_profile_clock() - gmk_phase_mark);', '') * profile_phases,
+        # wrapper instrumentation: call statistics, probes, logs and profile
+        instrument_start = '''\
+xndtools_kernel_stats_call(&{wrapper_name}_stats);
+XNDTOOLS_PROBE_ENTRY({wrapper_name}_stats.name, {probe_nitems});
+{entering}
+{profile_start}''',
+        instrument_stop = '''\
+{profile_stop}
+XNDTOOLS_PROBE_EXIT({wrapper_name}_stats.name, gmk_success);
+{leaving}''',
+        # parallel kernels call the uninstrumented item function of
+        # kernel_template in parallel, the outer wrapper is instrumented
+        item_specifier = ('inline ', '') * parallel,
+        item_suffix = ('_item', '') * parallel,
+        item_instrument_start = ('', '{instrument_start}') * parallel,
+        item_instrument_stop = ('', '{instrument_stop}') * parallel,
+        # scalar Strided kernels loop over contiguous items with
+        # constant steps so that the inlined loop can be vectorized
+        strided_call = ('''\
+if ({strided_unit_test}) {{
+  const intptr_t gmk_unit_steps[] = {{ {strided_unit_steps} }};
+  gmk_success = {wrapper_name}_loop(gmk_args, gmk_dimensions, gmk_unit_steps, gmk_dimensions[0], gmk_ctx);
+}} else {{
+  gmk_success = {wrapper_name}_loop(gmk_args, gmk_dimensions, gmk_steps, gmk_dimensions[0], gmk_ctx);
+}}''',
+                        'gmk_success = {wrapper_name}_loop(gmk_args, gmk_dimensions, gmk_steps, 1, gmk_ctx);') * has('strided_unit_steps'),
+        # elementwise kernels process non-contiguous arrays in tiles
+        tile_declarations = ('bool gmk_tile_copied = false;', '') * (kind_is('Xnd') * elementwise),
+        tile_loop_start = ('''\
+int64_t gmk_tile_total = {tile_count};
+int64_t gmk_tile_items = (gmk_tile_copied ? XNDTOOLS_ELEMENTWISE_TILE : gmk_tile_total);
+for (int64_t gmk_tile_start = 0; gmk_tile_start < gmk_tile_total; gmk_tile_start += gmk_tile_items) {{
+  int64_t gmk_tile_size = (gmk_tile_total - gmk_tile_start < gmk_tile_items ? gmk_tile_total - gmk_tile_start : gmk_tile_items);
+  {tile_count} = gmk_tile_size;
+  {tile-start-list}''', '') * (kind_is('Xnd') * elementwise),
+        tile_loop_end = ('''\
+  {tile-end-list}
+}} /* for gmk_tile_start */''', '') * (kind_is('Xnd') * elementwise),
     ),
     initialize = initialize_kernels,
     join = {'declarations-list': '\n  ',
             'body-start-list': '\n  ',
             'body-end-list': '\n  ',
             'body-list': '\n  ',
+            'tile-start-list': '\n  ',
+            'tile-end-list': '\n  ',
+            'tile-list': '\n  ', # not used, to suppress warnigns
             'arguments-list': ', ',
             'cleanup-list': '\n  ',
             'input_utype-list': ', ',
@@ -479,6 +708,74 @@ source_template['kernels'] = Template(
     }
 )
 
+# Array arguments of elementwise kernels: allocate a tile buffer
+# when the array is not contiguous
+tiled_input_body = '''\
+bool gmk_{name}_copied = !ndt_is_c_contiguous(gmk_input_{name}.type);
+{ctype}* gmk_{name}_tile = NULL;
+if (gmk_{name}_copied) {{
+  gmk_tile_copied = true;
+  gmk_{name}_tile = ({ctype}*)xndtools_malloc(sizeof({ctype})*XNDTOOLS_ELEMENTWISE_TILE, gmk_ctx);
+}}
+if (!gmk_{name}_copied || gmk_{name}_tile != NULL) {{
+...
+  xndtools_copy_stats_record({copy_stats}, gmk_{name}_copied, false, {nbytes});
+  xndtools_free(gmk_{name}_tile);
+}} else gmk_success = -1; /* if (gmk_{name}_tile != NULL) */
+'''
+tiled_inplace_body = tiled_input_body.replace('gmk_{name}_copied, false,', 'gmk_{name}_copied, gmk_{name}_copied,')
+tiled_output_body = tiled_input_body.replace('gmk_input_', 'gmk_output_').replace('gmk_{name}_copied, false,', 'false, gmk_{name}_copied,')
+
+# 1-d array arguments of Strided kernels: copy to a contiguous
+# buffer when the step differs from the item size
+strided_input_body = '''\
+bool gmk_{name}_copied = !{strided_input_is_contiguous};
+if (gmk_{name}_copied) {{
+  {name} = ({ctype}*)xndtools_malloc(sizeof({ctype})*{strided_input_size}, gmk_ctx);
+  if ({name} != NULL)
+    xndtools_strided_gather((char*){name}, gmk_input_{name}, {strided_input_size}, {strided_input_step}, sizeof({ctype}));
+}} else
+  {name} = ({ctype}*)gmk_input_{name};
+if ({name} != NULL) {{
+...
+  xndtools_copy_stats_record({copy_stats}, gmk_{name}_copied, false, {nbytes});
+  if (gmk_{name}_copied)
+    xndtools_free({name});
+}} else gmk_success = -1; /* if ({name} != NULL) */
+'''
+strided_inplace_body = strided_input_body.replace('gmk_{name}_copied, false,', 'gmk_{name}_copied, gmk_{name}_copied,').replace('''\
+  if (gmk_{name}_copied)
+    xndtools_free({name});''', '''\
+  if (gmk_{name}_copied) {{
+    xndtools_strided_scatter(gmk_input_{name}, {strided_input_step}, (const char*){name}, {strided_input_size}, sizeof({ctype}));
+    xndtools_free({name});
+  }}''')
+# arguments with increment are passed as is, broadcast arguments (zero
+# step) cannot be described by an increment and are rejected
+strided_increment_body = '''\
+if (xndtools_strided_increment({strided_input_size}, {strided_input_step}, sizeof({ctype})) != 0) {{
+  {name} = ({ctype}*)xndtools_strided_increment_base(gmk_input_{name}, {strided_input_size}, {strided_input_step});
+...
+  xndtools_copy_stats_record({copy_stats}, false, false, 0);
+}} else {{
+  ndt_err_format(gmk_ctx, NDT_ValueError, "argument `{name}` with zero step has no increment [{kernel_name}]");
+  gmk_success = -1;
+}}
+'''
+
+# Array arguments passed as is
+direct_input_body = '{name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name});...xndtools_copy_stats_record({copy_stats}, false, false, 0);'
+increment_input_body = '''\
+if (xndtools_increment(&gmk_input_{name}) != 0) {{
+  {name} = ({ctype}*)xndtools_increment_base(&gmk_input_{name});
+...
+  xndtools_copy_stats_record({copy_stats}, false, false, 0);
+}} else {{
+  ndt_err_format(gmk_ctx, NDT_ValueError, "argument `{name}` with zero step has no increment [{kernel_name}]");
+  gmk_success = -1;
+}}
+'''
+
 source_template['kernels']['arguments'] = Template(
     dict(
         declarations = [
@@ -487,9 +784,11 @@ source_template['kernels']['arguments'] = Template(
 
             [('xnd_t gmk_input_{name} = gmk_stack[{input_index}];',
               'const xnd_t gmk_input_{name} = gmk_stack[{input_index}];')*(has('value')*(is_inplace+is_inout+is_inplace_output+is_inout_output)),
-             'DEBUGMSG1("gmk_input_{name}.type=%s\\n", ndt_as_string(gmk_input_{name}.type, gmk_ctx));'*debug,
-            ] * (is_inany),
-            'const xnd_t gmk_output_{name} = gmk_stack[{output_index}];' * (is_outany),
+             'XNDTOOLS_LOG_TYPE(XNDTOOLS_LOG_DEBUG, "{wrapper_name}", "gmk_input_{name}", gmk_input_{name}.type);'*debug,
+            ] * (is_inany * -kind_is('Strided')),
+            'const xnd_t gmk_output_{name} = gmk_stack[{output_index}];' * (is_outany * -kind_is('Strided')),
+            'char* gmk_input_{name} = gmk_args[{input_index}];' * (is_inany * kind_is('Strided')),
+            'char* gmk_output_{name} = gmk_args[{output_index}];' * (is_outany * kind_is('Strided')),
         ],
         constraint_declarations = [
             # constraints can use scalar arguments to initialize shapes of output arrays
@@ -528,11 +827,14 @@ else
 ''' * (is_inplace+is_inout+is_inplace_output+is_inout_output),
                 ] * has('value'),
                 [
-                    '{name} = *GMK_SCALAR_DATA({ctype}, gmk_input_{name});...' * (is_inany),
+                    '{name} = *GMK_SCALAR_DATA({ctype}, gmk_input_{name});...' * (is_inany * -kind_is('Strided')),
+                    '{name} = *{strided_input_item};...' * (is_inany * kind_is('Strided')),
                 ] * -has('value'),
                 [
-                    '...*GMK_SCALAR_DATA({ctype}, gmk_input_{name}) = {name};' * (is_inplace+is_inout+is_inplace_output+is_inout_output)*is_scalar_ptr,
-                    '...*GMK_SCALAR_DATA({ctype}, gmk_output_{name}) = {name};' * is_outany,
+                    '...*GMK_SCALAR_DATA({ctype}, gmk_input_{name}) = {name};' * (is_inplace+is_inout+is_inplace_output+is_inout_output)*is_scalar_ptr*-kind_is('Strided'),
+                    '...*GMK_SCALAR_DATA({ctype}, gmk_output_{name}) = {name};' * (is_outany * -kind_is('Strided')),
+                    '...*{strided_input_item} = {name};' * (is_inplace+is_inout+is_inplace_output+is_inout_output)*is_scalar_ptr*kind_is('Strided'),
+                    '...*{strided_output_item} = {name};' * (is_outany * kind_is('Strided')),
                 ]
             ] * (is_scalar+is_scalar_ptr),
             # ==================================================
@@ -548,43 +850,49 @@ else
                 # is-Fortran means that particular input needs to be F-contiguous
                 # (is_c + is_fortran) == True, If is_vector then is_c == True 
                 [
-                    '{name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name});...'*(kind_is('C')*is_c + kind_is('Fortran')*is_fortran + is_vector*(kind_is('C') + kind_is('Fortran'))),
+                    direct_input_body*(kind_is('C')*is_c + kind_is('Fortran')*is_fortran + is_vector*(kind_is('C') + kind_is('Fortran'))),
                     '''\
-bool gmk_{name}_copied = !ndt_{is_contiguous}(gmk_input_{name}.type);
+bool gmk_{name}_copied = !{input_is_contiguous};
 if (gmk_{name}_copied)
   {name} = ({ctype}*){xndtools_copy}(&gmk_input_{name}, gmk_ctx);
 else
   {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name});
 if ({name} != NULL) {{
 ...
+  xndtools_copy_stats_record({copy_stats}, gmk_{name}_copied, false, {nbytes});
   if (gmk_{name}_copied)
-    free({name});
+    xndtools_free({name});
 }} else gmk_success = -1; /* if ({name} != NULL) */
-'''*(kind_is('Xnd') * (is_c+is_fortran)),
+'''*(kind_is('Xnd') * (is_c+is_fortran) * -has('increment') * -elementwise),
+                    increment_input_body * (kind_is('Xnd') * has('increment') * -elementwise),
+                    tiled_input_body * (kind_is('Xnd') * elementwise),
                     '''
 {name} = ({ctype}*){xndtools_copy}(&gmk_input_{name}, gmk_ctx);
 if ({name} != NULL) {{
 ...
-  free({name});
+  xndtools_copy_stats_record({copy_stats}, true, false, {nbytes});
+  xndtools_free({name});
 }} else gmk_success = -1; /* if ({name} != NULL) */
 ''' * is_tensor * (kind_is('Fortran') * is_c + kind_is('C') * is_fortran),
-                    '''NOTIMPLEMENTED_INPUT_STRIDED...''' * (kind_is('Strided') * is_c),   # Xnd handles it
-                    '''NOTIMPLEMENTED_FORTRAN_INPUT_STRIDED...''' * (kind_is('Strided') * is_fortran), # Xnd handles it
+                    strided_input_body * (kind_is('Strided') * -has('increment')),
+                    strided_increment_body * (kind_is('Strided') * has('increment')),
                 ] * is_input,
                 # --------------------------------------------------
                 #                   Array arguments - inout
                 # --------------------------------------------------
                 [
-                    '{name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name});...'*(kind_is('C')*is_c + kind_is('Fortran')*is_fortran + is_vector*(kind_is('C') + kind_is('Fortran'))),
+                    direct_input_body*(kind_is('C')*is_c + kind_is('Fortran')*is_fortran + is_vector*(kind_is('C') + kind_is('Fortran'))),
                     '''\
-if (ndt_{is_contiguous}(gmk_input_{name}.type)) {{
+if ({input_is_contiguous}) {{
   {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name});
 ...
+  xndtools_copy_stats_record({copy_stats}, false, false, 0);
 }} else {{
-  ndt_err_format(gmk_ctx, NDT_ValueError, "intent inout argument `{name}` must be {contiguous} [{kernel_name}]");
+  ndt_err_format(gmk_ctx, NDT_ValueError, "intent inout argument `{name}` must be {input_contiguous} [{kernel_name}]");
   gmk_success = -1; /* if ({name} != NULL) */
 }}
-'''*(kind_is('Xnd') * (is_c+is_fortran)),
+'''*(kind_is('Xnd') * (is_c+is_fortran) * -has('increment')),
+                    increment_input_body * (kind_is('Xnd') * has('increment')),
                     '''
 if (0) {{
 ...
@@ -592,38 +900,51 @@ if (0) {{
 ndt_err_format(gmk_ctx, NDT_ValueError, "incompatible {contiguous} inout tensor argument `{name}` with given kernel {kernel_name} kind");
 gmk_success = -1;
 ''' * (is_tensor*(kind_is('Fortran')*is_c + kind_is('C') * is_fortran)),
-                    '''NOTIMPLEMENTED_INOUT_STRIDED...''' * (kind_is('Strided')*is_c),
-                    '''NOTIMPLEMENTED_FORTRAN_INOUT_STRIDED...''' * (kind_is('Strided') * is_fortran),
+                    '''\
+if ({strided_input_is_contiguous}) {{
+  {name} = ({ctype}*)gmk_input_{name};
+...
+  xndtools_copy_stats_record({copy_stats}, false, false, 0);
+}} else {{
+  ndt_err_format(gmk_ctx, NDT_ValueError, "intent inout argument `{name}` must be C-contiguous [{kernel_name}]");
+  gmk_success = -1; /* if ({name} != NULL) */
+}}
+''' * (kind_is('Strided') * -has('increment')),
+                    strided_increment_body * (kind_is('Strided') * has('increment')),
                   ] * is_inout,
             # --------------------------------------------------
             #                   Array arguments - inplace
             # --------------------------------------------------
                 [
-                    '{name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name});...'*(kind_is('C')*is_c + kind_is('Fortran')*is_fortran + is_vector*(kind_is('C') + kind_is('Fortran'))),
+                    direct_input_body*(kind_is('C')*is_c + kind_is('Fortran')*is_fortran + is_vector*(kind_is('C') + kind_is('Fortran'))),
                     '''\
 {name} = ({ctype}*){xndtools_copy}(&gmk_input_{name}, gmk_ctx);
 if ({name} != NULL) {{
 ...
+  xndtools_copy_stats_record({copy_stats}, true, true, {nbytes});
   {xndtools_inv_copy}((const char*){name}, &gmk_input_{name});
-  free({name});
+  xndtools_free({name});
 }} else gmk_success = -1; /* if ({name} != NULL) */
 ''' * (is_tensor * ((kind_is('Fortran') * is_c + kind_is('C') * is_fortran))),
                 '''\
-bool gmk_{name}_copied = !ndt_{is_contiguous}(gmk_input_{name}.type);
+bool gmk_{name}_copied = !{input_is_contiguous};
 if (gmk_{name}_copied)
   {name} = ({ctype}*){xndtools_copy}(&gmk_input_{name}, gmk_ctx);
 else
   {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name});
 if ({name} != NULL) {{
 ...
+  xndtools_copy_stats_record({copy_stats}, gmk_{name}_copied, gmk_{name}_copied, {nbytes});
   if (gmk_{name}_copied) {{
     {xndtools_inv_copy}((const char*){name}, &gmk_input_{name});
-    free({name});
+    xndtools_free({name});
   }}
 }} else gmk_success = -1; /* if ({name} != NULL) */
-                ''' * ((kind_is('Xnd') * (is_c + is_fortran))),
-                    '''NOTIMPLEMENTED_INPLACE_STRIDED...''' * (kind_is('Strided') * is_c),
-                    '''NOTIMPLEMENTED_FORTRAN_INPLACE_STRIDED...''' * (kind_is('Strided') * is_fortran),
+                ''' * ((kind_is('Xnd') * (is_c + is_fortran) * -has('increment') * -elementwise)),
+                    increment_input_body * (kind_is('Xnd') * has('increment') * -elementwise),
+                    tiled_inplace_body * (kind_is('Xnd') * elementwise),
+                    strided_inplace_body * (kind_is('Strided') * -has('increment')),
+                    strided_increment_body * (kind_is('Strided') * has('increment')),
                 ] * is_inplace,
                 # --------------------------------------------------
                 #                   Array arguments - input_output
@@ -632,20 +953,22 @@ if ({name} != NULL) {{
                     '''\
 {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_output_{name});
 xndtools_cpy((char*){name}, &gmk_input_{name}, ndt_{is_contiguous}(gmk_input_{name}.type));
-...'''*(kind_is('C')*is_c + kind_is('Fortran')*is_fortran + is_vector*(kind_is('C') + kind_is('Fortran'))),                    
+...
+xndtools_copy_stats_record({copy_stats}, true, false, {nbytes});'''*(kind_is('C')*is_c + kind_is('Fortran')*is_fortran + is_vector*(kind_is('C') + kind_is('Fortran'))),                    
                     '''\
 bool gmk_{name}_transpose = !ndt_{is_contiguous}(gmk_output_{name}.type);
 if (gmk_{name}_transpose)
-  {name} = ({ctype}*)malloc(xndtools_fixed_nbytes(&gmk_output_{name}));
+  {name} = ({ctype}*)xndtools_malloc(xndtools_fixed_nbytes(&gmk_output_{name}), gmk_ctx);
 else
   {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_output_{name}); // C-contiguous
 
 if ({name} != NULL) {{
   xndtools_cpy((char*){name}, &gmk_input_{name}, !ndt_{is_contiguous}(gmk_input_{name}.type));
 ...
+  xndtools_copy_stats_record({copy_stats}, true, gmk_{name}_transpose, {nbytes});
   if (gmk_{name}_transpose) {{
      {xndtools_inv_copy}((const char*){name}, &gmk_output_{name});
-     free({name});
+     xndtools_free({name});
   }}  
 }} else gmk_success = -1; /* if ({name} != NULL) */
 '''*(kind_is('Xnd') * (is_c+is_fortran)),
@@ -653,12 +976,27 @@ if ({name} != NULL) {{
 {name} = ({ctype}*){xndtools_copy}(&gmk_input_{name}, gmk_ctx);
 if ({name} != NULL) {{
 ...
+  xndtools_copy_stats_record({copy_stats}, true, true, {nbytes});
   {xndtools_inv_copy}((const char*){name}, &gmk_output_{name});
-  free({name});
+  xndtools_free({name});
 }} else gmk_success = -1; /* if ({name} != NULL) */
 ''' * is_tensor * (kind_is('Fortran') * is_c + kind_is('C') * is_fortran),
-                    '''NOTIMPLEMENTED_INPUT_OUTPUT_STRIDED...''' * (kind_is('Strided') * is_c),   # Xnd handles this
-                    '''NOTIMPLEMENTED_FORTRAN_INPUT_OUTPUT_STRIDED...''' * (kind_is('Strided') * is_fortran), # Xnd handles this
+                    '''\
+bool gmk_{name}_copied = !{strided_output_is_contiguous};
+if (gmk_{name}_copied)
+  {name} = ({ctype}*)xndtools_malloc(sizeof({ctype})*{strided_output_size}, gmk_ctx);
+else
+  {name} = ({ctype}*)gmk_output_{name};
+if ({name} != NULL) {{
+  xndtools_strided_gather((char*){name}, gmk_input_{name}, {strided_input_size}, {strided_input_step}, sizeof({ctype}));
+...
+  xndtools_copy_stats_record({copy_stats}, true, gmk_{name}_copied, {nbytes});
+  if (gmk_{name}_copied) {{
+    xndtools_strided_scatter(gmk_output_{name}, {strided_output_step}, (const char*){name}, {strided_output_size}, sizeof({ctype}));
+    xndtools_free({name});
+  }}
+}} else gmk_success = -1; /* if ({name} != NULL) */
+''' * kind_is('Strided'),
                 ] * is_input_output,
             # --------------------------------------------------
             #                   Array arguments - inplace_output
@@ -667,6 +1005,7 @@ if ({name} != NULL) {{
                     '''\
 {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name});
 ...
+xndtools_copy_stats_record({copy_stats}, false, true, {nbytes});
 {xndtools_inv_copy}((const char*){name}, &gmk_output_{name});
 '''*(kind_is('C')*is_c + kind_is('Fortran')*is_fortran + is_vector*(kind_is('C') + kind_is('Fortran'))),
                     '''\
@@ -677,10 +1016,11 @@ else
   {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name});
 if ({name} != NULL) {{
 ...
+  xndtools_copy_stats_record({copy_stats}, !gmk_{name}_input_is_contiguous, true, {nbytes});
   {xndtools_inv_copy}((const char*){name}, &gmk_output_{name});
   if (!gmk_{name}_input_is_contiguous) {{
     {xndtools_inv_copy}((const char*){name}, &gmk_input_{name});
-    free({name});
+    xndtools_free({name});
   }}
 }} else gmk_success = -1; /* if ({name} != NULL) */
 '''*(kind_is('Xnd') * (is_c+is_fortran)),
@@ -688,13 +1028,20 @@ if ({name} != NULL) {{
 {name} = ({ctype}*){xndtools_copy}(&gmk_input_{name}, gmk_ctx);
 if ({name} != NULL) {{
 ...
+  xndtools_copy_stats_record({copy_stats}, true, true, {nbytes});
   {xndtools_inv_copy}((const char*){name}, &gmk_output_{name});
   {xndtools_inv_copy}((const char*){name}, &gmk_input_{name});
-  free({name});
+  xndtools_free({name});
 }} else gmk_success = -1; /* if ({name} != NULL) */
 ''' * (is_tensor * ((kind_is('Fortran') * is_c + kind_is('C') * is_fortran))),
-                    '''NOTIMPLEMENTED_INPLACE_OUTPUT_STRIDED...''' * (kind_is('Strided')*is_c),               # Xnd handles this
-                    '''NOTIMPLEMENTED_FORTRAN_INPLACE_OUTPUT_STRIDED...''' * (kind_is('Strided')*is_fortran), # Xnd handles this
+                    strided_input_body.replace('gmk_{name}_copied, false,', 'gmk_{name}_copied, true,').replace('''\
+  if (gmk_{name}_copied)
+    xndtools_free({name});''', '''\
+  xndtools_strided_scatter(gmk_output_{name}, {strided_output_step}, (const char*){name}, {strided_output_size}, sizeof({ctype}));
+  if (gmk_{name}_copied) {{
+    xndtools_strided_scatter(gmk_input_{name}, {strided_input_step}, (const char*){name}, {strided_input_size}, sizeof({ctype}));
+    xndtools_free({name});
+  }}''') * kind_is('Strided'),
                     ] * is_inplace_output,
             # --------------------------------------------------
             #                   Array arguments - inout_output
@@ -703,12 +1050,14 @@ if ({name} != NULL) {{
                     '''\
 {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name});
 ...
+xndtools_copy_stats_record({copy_stats}, false, true, {nbytes});
 {xndtools_inv_copy}((const char*){name}, &gmk_output_{name});
 '''*(kind_is('C')*is_c + kind_is('Fortran')*is_fortran + is_vector*(kind_is('C') + kind_is('Fortran'))),
                     '''\
 if (ndt_{is_contiguous}(gmk_input_{name}.type)) {{
   {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name});
 ...
+  xndtools_copy_stats_record({copy_stats}, false, true, {nbytes});
   {xndtools_inv_copy}((const char*){name}, &gmk_output_{name});
 }} else {{
   ndt_err_format(gmk_ctx, NDT_ValueError, "intent inout-output argument `{name}` must be {contiguous} [{kernel_name}]");
@@ -722,54 +1071,114 @@ if (0) {{
 ndt_err_format(gmk_ctx, NDT_ValueError, "incompatible {contiguous} inout-output tensor argument `{name}` with given kernel {kernel_name} kind");
 gmk_success = -1;
 ''' * (is_tensor*(kind_is('Fortran')*is_c + kind_is('C') * is_fortran)),
-                    '''NOTIMPLEMENTED_INOUT_OUTPUT_STRIDED...''' * (kind_is('Strided')*is_c),
-                    '''NOTIMPLEMENTED_FORTRAN_INOUT_OUTPUT_STRIDED...''' * (kind_is('Strided')*is_fortran),
+                    '''\
+if ({strided_input_is_contiguous}) {{
+  {name} = ({ctype}*)gmk_input_{name};
+...
+  xndtools_copy_stats_record({copy_stats}, false, true, {nbytes});
+  xndtools_strided_scatter(gmk_output_{name}, {strided_output_step}, (const char*){name}, {strided_output_size}, sizeof({ctype}));
+}} else {{
+  ndt_err_format(gmk_ctx, NDT_ValueError, "intent inout-output argument `{name}` must be C-contiguous [{kernel_name}]");
+  gmk_success = -1; /* if ({name} != NULL) */
+}}
+''' * kind_is('Strided'),
                 ] * is_inout_output,
             # --------------------------------------------------
             #                   Array arguments - output
             # --------------------------------------------------
                 [
-                    '{name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_output_{name});...'*(kind_is('C')*is_c + kind_is('Fortran')*is_fortran + is_vector*(kind_is('C') + kind_is('Fortran'))),
+                    '{name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_output_{name});...xndtools_copy_stats_record({copy_stats}, false, false, 0);'*(kind_is('C')*is_c + kind_is('Fortran')*is_fortran + is_vector*(kind_is('C') + kind_is('Fortran'))),
                     '''
-{name} = malloc(xndtools_fixed_nbytes(&gmk_output_{name}));
+{name} = ({ctype}*)xndtools_malloc(xndtools_fixed_nbytes(&gmk_output_{name}), gmk_ctx);
 if ({name} != NULL) {{
 ...
+  xndtools_copy_stats_record({copy_stats}, false, true, {nbytes});
   {xndtools_inv_copy}((const char*){name}, &gmk_output_{name});
-  free({name});
+  xndtools_free({name});
 }} else gmk_success = -1; /* if ({name} != NULL) */
 ''' * (is_tensor * ((kind_is('Fortran') * is_c + kind_is('C') * is_fortran))),
                     '''\
 bool gmk_{name}_transpose = !ndt_{is_contiguous}(gmk_output_{name}.type);
 if (gmk_{name}_transpose)
-  {name} = ({ctype}*)malloc(xndtools_fixed_nbytes(&gmk_output_{name}));
+  {name} = ({ctype}*)xndtools_malloc(xndtools_fixed_nbytes(&gmk_output_{name}), gmk_ctx);
 else
   {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_output_{name});
 if ({name} != NULL) {{
 ...
+  xndtools_copy_stats_record({copy_stats}, false, gmk_{name}_transpose, {nbytes});
   if (gmk_{name}_transpose) {{
      {xndtools_inv_copy}((const char*){name}, &gmk_output_{name});
-     free({name});
+     xndtools_free({name});
   }}
 }} else gmk_success = -1; /* if ({name} != NULL) */
-''' * ((kind_is('Xnd') * (is_c + is_fortran))),                    
-                    '''NOTIMPLEMENTED_OUTPUT_STRIDED...''' * (kind_is('Strided') * is_c),
-                    '''NOTIMPLEMENTED_FORTRAN_OUTPUT_STRIDED...''' * (kind_is('Strided') * is_fortran),
-
+''' * ((kind_is('Xnd') * (is_c + is_fortran) * -elementwise)),
+                    tiled_output_body * (kind_is('Xnd') * elementwise),
+                    '''\
+bool gmk_{name}_copied = !{strided_output_is_contiguous};
+if (gmk_{name}_copied)
+  {name} = ({ctype}*)xndtools_malloc(sizeof({ctype})*{strided_output_size}, gmk_ctx);
+else
+  {name} = ({ctype}*)gmk_output_{name};
+if ({name} != NULL) {{
+...
+  xndtools_copy_stats_record({copy_stats}, false, gmk_{name}_copied, {nbytes});
+  if (gmk_{name}_copied) {{
+    xndtools_strided_scatter(gmk_output_{name}, {strided_output_step}, (const char*){name}, {strided_output_size}, sizeof({ctype}));
+    xndtools_free({name});
+  }}
+}} else gmk_success = -1; /* if ({name} != NULL) */
+''' * kind_is('Strided'),
                 ] * is_output,
             # --------------------------------------------------
             #                   Array arguments - hide
             # --------------------------------------------------
                     '''\
-                    size_t gmk_{name}_size = {shape_product};
-                    {name} = ({ctype}*)malloc(sizeof({ctype})*gmk_{name}_size);
+size_t gmk_{name}_size = {shape_product};
+{name} = ({ctype}*)xndtools_malloc(sizeof({ctype})*gmk_{name}_size, gmk_ctx);
+if ({name} != NULL) {{
 ...
-free({name});
+  xndtools_free({name});
+}} else gmk_success = -1; /* if ({name} != NULL) */
 ''' * is_hide
             ]*(is_array*-has('value')),
         ],
                 '{name}',
                 ('{depends}','') * has('depends')
         ], # 3-list is handled by sorted_list
+        #
+        # tile generates tile-start-list and tile-end-list, applied to
+        # each tile of elementwise kernels
+        #
+        tile = [
+            '''\
+if (gmk_{name}_copied) {{
+  {name} = gmk_{name}_tile;
+  xndtools_tile_gather((char*){name}, &gmk_input_{name}, gmk_tile_start, gmk_tile_size);
+}} else
+  {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name}) + gmk_tile_start;
+...
+''' * is_input,
+            '''\
+if (gmk_{name}_copied) {{
+  {name} = gmk_{name}_tile;
+  xndtools_tile_gather((char*){name}, &gmk_input_{name}, gmk_tile_start, gmk_tile_size);
+}} else
+  {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name}) + gmk_tile_start;
+...
+if (gmk_{name}_copied)
+  xndtools_tile_scatter((const char*){name}, &gmk_input_{name}, gmk_tile_start, gmk_tile_size);
+''' * is_inplace,
+            '{name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_input_{name}) + gmk_tile_start;...' * is_inout,
+            '''\
+if (gmk_{name}_copied)
+  {name} = gmk_{name}_tile;
+else
+  {name} = GMK_FIXED_ARRAY_DATA({ctype}, gmk_output_{name}) + gmk_tile_start;
+...
+if (gmk_{name}_copied)
+  xndtools_tile_scatter((const char*){name}, &gmk_output_{name}, gmk_tile_start, gmk_tile_size);
+''' * is_output,
+        ] * (is_array * kind_is('Xnd') * elementwise),
         arguments = ('&{name}', '{name}') * is_scalar_ptr * is_argument,
         input_utype = ('{sigdims}?{type}' * is_inany,'{sigdims}{type}' * is_inany)*has('value'),
         output_utype = '{sigdims}{type}' * is_outany,
@@ -777,13 +1186,29 @@ free({name});
     variables = dict(
         fortran = ('!', '') * is_fortran,
         is_contiguous = ('is_f_contiguous', 'is_c_contiguous') * is_fortran,
+        # arrays with leading dimension argument are passed as is when rows are unit-strided
+        input_is_contiguous = ('xndtools_is_row_strided(&gmk_input_{name})', 'ndt_{is_contiguous}(gmk_input_{name}.type)') * (has('leading_dimension') * is_c),
         contiguous = ('F-contiguous', 'C-contiguous') * is_fortran,
+        input_contiguous = ('row strided', '{contiguous}') * (has('leading_dimension') * is_c),
         xndtools_copy = ('xndtools_fcopy', 'xndtools_copy') * is_fortran,
         xndtools_inv_copy = ('xndtools_inv_fcopy', 'xndtools_inv_copy') * is_fortran,
         #xndtools_fcopy = ('xndtools_copy', 'xndtools_fcopy') * is_fortran,
         sigdims = ('{ellipses}{fortran}{dimension-list} * ', '{ellipses}')*has('dimension-list'),
         wrapper_name = wrapper_name,
         shape_product = '{shape-list}',
+        # Strided kernel arguments, gmk_i is nonzero only for scalar loops
+        strided_input_item = ('({ctype}*)(gmk_input_{name} + gmk_i*gmk_steps[{input_index}])', '') * has('input_index'),
+        strided_output_item = ('({ctype}*)(gmk_output_{name} + gmk_i*gmk_steps[{output_index}])', '') * has('output_index'),
+        strided_input_size = ('gmk_dimensions[{input_index}]', '') * has('input_index'),
+        strided_input_step = ('gmk_steps[{input_index}]', '') * has('input_index'),
+        strided_output_size = ('gmk_dimensions[{output_index}]', '') * has('output_index'),
+        strided_output_step = ('gmk_steps[{output_index}]', '') * has('output_index'),
+        strided_input_is_contiguous = ('({strided_input_size} <= 1 || {strided_input_step} == (intptr_t)sizeof({ctype}))', '') * has('input_index'),
+        strided_output_is_contiguous = ('({strided_output_size} <= 1 || {strided_output_step} == (intptr_t)sizeof({ctype}))', '') * has('output_index'),
+        # array arguments record copies to {wrapper_name}_copy_stats
+        copy_stats = ('&{wrapper_name}_copy_stats[{copy_index}]', '') * has('copy_index'),
+        nbytes = (('sizeof({ctype})*{strided_input_size}', 'xndtools_fixed_nbytes(&gmk_input_{name})') * kind_is('Strided'),
+                  ('sizeof({ctype})*{strided_output_size}', 'xndtools_fixed_nbytes(&gmk_output_{name})') * kind_is('Strided')) * has('input_index'),
     ),
     initialize = initialize_argument,
     join = {'dimension-list': join_dimension_list,
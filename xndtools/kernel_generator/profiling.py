@@ -0,0 +1,135 @@
+""" Provides: profiler, PhaseProfiler.
+"""
+
+import sys
+import json
+import time
+import tracemalloc
+from collections import OrderedDict
+
+
+class _Phase(object):
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler._leave()
+
+
+class _NoPhase(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+_no_phase = _NoPhase()
+
+
+class PhaseProfiler(object):
+    """Collect wall time and peak memory of kernel generator phases.
+
+    Phases are measured when the profiler is enabled, otherwise
+    `phase` returns a no-op context manager. Memory is measured with
+    tracemalloc that slows down the generator, so the wall times are
+    useful for comparing phases and runs with each other only.
+
+    Phases can be nested, the time and peak memory of a phase include
+    its subphases. Phases with the same name are accumulated.
+
+    Usage::
+
+      profiler.enable()
+      with profiler.phase('load_config'):
+          ...
+      profiler.dump('stdout')
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._owns_tracemalloc = False
+        self._clear()
+
+    def _clear(self):
+        self.phases = OrderedDict()
+        self._stack = []
+        self._start = time.perf_counter()
+        self._peak = 0
+
+    def enable(self):
+        self._clear()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+
+    def phase(self, name):
+        """Return context manager that measures the phase with given name.
+        """
+        if self.enabled:
+            return _Phase(self, name)
+        return _no_phase
+
+    def _traced_peak(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        if hasattr(tracemalloc, 'reset_peak'): # Python 3.9+
+            tracemalloc.reset_peak()
+        return peak
+
+    def _enter(self, name):
+        peak = self._traced_peak()
+        if self._stack:
+            self._stack[-1][2] = max(self._stack[-1][2], peak)
+        self._stack.append([name, time.perf_counter(), 0])
+
+    def _leave(self):
+        name, start, peak = self._stack.pop()
+        seconds = time.perf_counter() - start
+        peak = max(peak, self._traced_peak())
+        if self._stack:
+            self._stack[-1][2] = max(self._stack[-1][2], peak)
+        self._peak = max(self._peak, peak)
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = dict(name=name, calls=0, seconds=0.0, peak_bytes=0)
+        phase['calls'] += 1
+        phase['seconds'] += seconds
+        phase['peak_bytes'] = max(phase['peak_bytes'], peak)
+
+    def report(self):
+        """Return profiling results as a JSON serializable dict.
+        """
+        if self.enabled:
+            self._peak = max(self._peak, self._traced_peak())
+        return dict(seconds = time.perf_counter() - self._start,
+                    peak_bytes = self._peak,
+                    phases = list(self.phases.values()))
+
+    def dump(self, target_file = 'stderr'):
+        """Write profiling results in JSON format to target file. The
+        default is stderr, apart from the generator messages in stdout.
+        """
+        report = self.report()
+        if target_file == 'stderr':
+            json.dump(report, sys.stderr, indent=2)
+            sys.stderr.write('\n')
+        else:
+            with open(target_file, 'w') as f:
+                json.dump(report, f, indent=2)
+            print('Profiling results are saved to {}'.format(target_file))
+
+
+profiler = PhaseProfiler()
@@ -21,6 +21,7 @@ See test() function for an example.
 
 from pprint import pprint
 from collections import defaultdict
+from .profiling import profiler
 
 def flatten(lst_of_lst):
     """ Flatten list of list objects.
@@ -302,10 +303,12 @@ class Template(object):
                 elif not callable(subtemplate):
                     print('{}(name={}).__call__:warning: sub-template {!r} not callable'.format(type(self).__name__, self.name, k))
                 else:
+                    phase = profiler.phase('render:{}'.format(k))
                     for v_ in v:
                         v__ = parent_data.copy()
                         v__.update(data)
-                        r = subtemplate(v_, v__)
+                        with phase:
+                            r = subtemplate(v_, v__)
                         if r is None:
                             pass
                         elif isinstance(r, str):
@@ -0,0 +1,2 @@
+# Benchmarks, see xndtools/bench.py
+from xndtools.bench import pytest_configure, pytest_runtest_setup, bench
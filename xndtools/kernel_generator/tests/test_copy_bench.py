@@ -0,0 +1,71 @@
+
+import os
+import json
+import subprocess
+import pytest
+try:
+    import ndtypes, xnd
+except ImportError:
+    xnd = None
+
+#
+# Microbenchmark of the copy engine of xndtools.c. Run with
+#
+#   XNDTOOLS_BENCH=. py.test -sv -m bench xndtools/kernel_generator/tests/test_copy_bench.py
+#
+# The file test_copy_bench-bench.json contains the records of
+# benchmarks/xndtools_bench.c. Use XNDTOOLS_BENCH_COPY_BYTES=<max bytes>
+# to change the largest copied size.
+#
+
+bench_copy_bytes = int(os.environ.get('XNDTOOLS_BENCH_COPY_BYTES', 64 << 20))
+
+kernel_generator_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+bench_source = os.path.abspath(os.path.join(kernel_generator_dir, '..', '..', 'benchmarks', 'xndtools_bench.c'))
+
+def build_copy_bench(tmpdir):
+    """Compile benchmarks/xndtools_bench.c with the xndtools runtime
+    and return the path of the executable.
+    """
+    from distutils.ccompiler import new_compiler
+    from distutils.sysconfig import customize_compiler
+    from distutils.errors import LinkError
+    # same include and library directories as in xndlib/setup.py
+    roots = [os.path.dirname(m.__file__) for m in [ndtypes, xnd]]
+    include_dirs = roots + [kernel_generator_dir]
+    library_dirs = list(roots)
+    if 'CONDA_PREFIX' in os.environ:
+        include_dirs.append(os.path.join(os.environ['CONDA_PREFIX'], 'include'))
+        library_dirs.append(os.path.join(os.environ['CONDA_PREFIX'], 'lib'))
+    for header in ['ndtypes.h', 'xnd.h']:
+        if not any(os.path.isfile(os.path.join(d, header)) for d in include_dirs):
+            pytest.skip('{} is not found.'.format(header))
+    compiler = new_compiler()
+    customize_compiler(compiler)
+    objects = compiler.compile([bench_source, os.path.join(kernel_generator_dir, 'xndtools.c')],
+                               output_dir=str(tmpdir), include_dirs=include_dirs,
+                               extra_preargs=['-std=c11', '-O2'])
+    executable = str(tmpdir.join('xndtools_bench'))
+    try:
+        compiler.link_executable(objects, executable,
+                                 libraries=['xnd', 'ndtypes', 'pthread', 'm'],
+                                 library_dirs=library_dirs, runtime_library_dirs=library_dirs)
+    except LinkError:
+        pytest.skip('ndtypes and xnd libraries cannot be linked.')
+    return executable
+
+@pytest.mark.skipif(xnd is None, reason="Requires ndtypes and xnd.")
+def test_copy_bench_build(tmpdir):
+    executable = build_copy_bench(tmpdir)
+    # smallest size with a single call per case
+    records = json.loads(subprocess.check_output([executable, '0', str(16 << 10)], universal_newlines=True))
+    assert records[0]['function'] == 'memcpy'
+    assert {r['function'] for r in records[1:]} == {'xndtools_cpy', 'xndtools_invcpy'}
+
+@pytest.mark.bench
+@pytest.mark.skipif(xnd is None, reason="Requires ndtypes and xnd.")
+def test_bench_copy(tmpdir, bench):
+    executable = build_copy_bench(tmpdir)
+    output = subprocess.check_output([executable, '0.01', str(bench_copy_bytes)], universal_newlines=True)
+    bench.info['max_bytes'] = bench_copy_bytes
+    bench.results.extend(json.loads(output))
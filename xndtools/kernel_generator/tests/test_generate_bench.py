@@ -0,0 +1,84 @@
+
+import os
+import re
+import sys
+import subprocess
+import pytest
+from xndtools.kernel_generator.generate_kernel import generate_kernel
+from xndtools.kernel_generator.generate_bench import generate_bench
+try:
+    import ndtypes, xnd, gumath
+except ImportError:
+    gumath = None
+
+xndlib_dir = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'xndlib')
+
+
+def test_generate_bench(tmpdir, monkeypatch):
+    monkeypatch.chdir(xndlib_dir)
+    target_file = str(tmpdir.join('test_array-bench.c'))
+    r = generate_bench('test_array-kernels.cfg', target_file=target_file, sizes=[8, 64])
+    assert r['sources'] == [target_file]
+    source = open(target_file).read()
+    assert 'int gmk_init_test_array_kernels(gm_tbl_t *tbl, ndt_context_t *ctx);' in source
+    assert 'bench_sizes[] = { 8, 64, 0 };' in source
+    assert 'int\nmain(int argc, char *argv[])' in source
+
+
+def generate_test_array_bench(tmpdir):
+    # as `xnd_tools bench`, generate the kernels and list their sources
+    r = generate_kernel('test_array-kernels.cfg', source_dir=str(tmpdir))
+    return generate_bench('test_array-kernels.cfg', target_file=str(tmpdir.join('test_array-bench.c')),
+                          sizes=[8], sources=r['sources'])
+
+def test_bench_sources(tmpdir, monkeypatch):
+    monkeypatch.chdir(xndlib_dir)
+    r = generate_test_array_bench(tmpdir)
+    # the benchmark program is linked with the kernels and runtime sources
+    defines_main = [source for source in r['sources']
+                    if re.search(r'^\s*(int\s+)?main\s*\(', open(source).read(), re.MULTILINE)]
+    assert defines_main == [str(tmpdir.join('test_array-bench.c'))]
+
+@pytest.mark.skipif(gumath is None, reason="Requires ndtypes, xnd and gumath.")
+def test_bench_build(tmpdir, monkeypatch):
+    from distutils.ccompiler import new_compiler
+    from distutils.sysconfig import customize_compiler
+    from distutils.errors import LinkError
+    monkeypatch.chdir(xndlib_dir)
+    r = generate_test_array_bench(tmpdir)
+    # same include and library directories as in xndlib/setup.py
+    roots = [os.path.dirname(m.__file__) for m in [ndtypes, xnd, gumath]]
+    include_dirs = roots + r['include_dirs']
+    library_dirs = list(roots)
+    if 'CONDA_PREFIX' in os.environ:
+        include_dirs.append(os.path.join(os.environ['CONDA_PREFIX'], 'include'))
+        library_dirs.append(os.path.join(os.environ['CONDA_PREFIX'], 'lib'))
+    for header in ['ndtypes.h', 'xnd.h', 'gumath.h']:
+        if not any(os.path.isfile(os.path.join(d, header)) for d in include_dirs):
+            pytest.skip('{} is not found.'.format(header))
+    compiler = new_compiler()
+    customize_compiler(compiler)
+    objects = compiler.compile(r['sources'], output_dir=str(tmpdir), include_dirs=include_dirs,
+                               extra_preargs=['-std=c11', '-O1'])
+    try:
+        compiler.link_executable(objects, str(tmpdir.join('test_array-bench')),
+                                 libraries=['gumath', 'xnd', 'ndtypes', 'pthread', 'm'],
+                                 library_dirs=library_dirs)
+    except LinkError:
+        pytest.skip('ndtypes, xnd and gumath libraries cannot be linked.')
+
+def test_bench_kernels_source_file(tmpdir, monkeypatch):
+    monkeypatch.chdir(xndlib_dir)
+    kernels_file = str(tmpdir.join('test_array-kernels.c'))
+    target_file = str(tmpdir.join('test_array-bench.c'))
+    generate_kernel('test_array-kernels.cfg', target_file=kernels_file)
+    xnd_tools_script = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'scripts', 'xnd_tools')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.join(os.path.dirname(xnd_tools_script), '..')]
+                                        + env.get('PYTHONPATH', '').split(os.pathsep))
+    output = subprocess.check_output([sys.executable, xnd_tools_script, 'bench', 'test_array-kernels.cfg',
+                                      '-k', kernels_file, '-t', target_file], env=env, universal_newlines=True)
+    hint = [line for line in output.splitlines() if line.startswith('HINT:')][0]
+    # existing kernels are linked together with the module sources
+    for source in [target_file, kernels_file, 'xndtools.c', 'examplelib/test_array.c']:
+        assert source in hint
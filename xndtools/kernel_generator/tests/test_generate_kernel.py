@@ -0,0 +1,81 @@
+
+import pytest
+from xndtools.kernel_generator.generate_kernel import get_module_data
+
+def write_config(tmpdir, kernel):
+    config_file = str(tmpdir.join('stride-kernels.cfg'))
+    with open(config_file, 'w') as f:
+        f.write('''[MODULE stride]
+typemaps =
+	long: int64
+includes =
+	stride.h
+kinds = C, Xnd
+
+[KERNEL stride_kernel]
+''' + kernel)
+    return config_file
+
+@pytest.mark.parametrize('intent', ['input', 'inplace', 'inout'])
+def test_inc(tmpdir, intent):
+    config_file = write_config(tmpdir, '''prototypes =
+	long stride_func(long n, long* a, long inca);
+{}_arguments = a(n)
+hide_arguments = n = len(a), inca = inc(a)
+'''.format(intent))
+    kernels = get_module_data(config_file)['kernels']
+    assert kernels and all('increment' in kernel.get_argument('a') for kernel in kernels)
+
+@pytest.mark.parametrize('intent', ['input', 'inplace', 'inout'])
+def test_inc_output(tmpdir, intent):
+    config_file = write_config(tmpdir, '''prototypes =
+	long stride_func(long n, long* a, long inca);
+{}_arguments = a(n)
+output_arguments = a
+hide_arguments = n = len(a), inca = inc(a)
+'''.format(intent))
+    with pytest.raises(ValueError, match=r'inc\(a\) requires input, inplace or inout argument'):
+        get_module_data(config_file)
+
+def test_inc_elementwise(tmpdir):
+    config_file = write_config(tmpdir, '''elementwise = True
+prototypes =
+	void stride_func(long n, long* a, long inca, long* r);
+input_arguments = a(n)
+output_arguments = r(n)
+hide_arguments = n = len(a), inca = inc(a)
+''')
+    kernels = get_module_data(config_file)['kernels']
+    assert kernels and not any(kernel.get('elementwise') for kernel in kernels)
+
+@pytest.mark.parametrize('intent', ['input', 'inplace', 'inout'])
+def test_lda(tmpdir, intent):
+    config_file = write_config(tmpdir, '''kinds = C, Fortran, Xnd
+prototypes =
+	long stride_func(long m, long n, long* a, long lda);
+{}_arguments = a(m, n)
+hide_arguments = m = len(a), n = shape(a, 1), lda = lda(a)
+'''.format(intent))
+    kernels = get_module_data(config_file)['kernels']
+    assert set(kernel['kind'] for kernel in kernels) == {'C', 'Xnd'}
+    assert all('leading_dimension' in kernel.get_argument('a') for kernel in kernels)
+
+@pytest.mark.parametrize('intent', ['input', 'inplace', 'inout'])
+def test_lda_output(tmpdir, intent):
+    config_file = write_config(tmpdir, '''prototypes =
+	long stride_func(long m, long n, long* a, long lda);
+{}_arguments = a(m, n)
+output_arguments = a
+hide_arguments = m = len(a), n = shape(a, 1), lda = lda(a)
+'''.format(intent))
+    with pytest.raises(ValueError, match=r'lda\(a\) requires input, inplace or inout argument'):
+        get_module_data(config_file)
+
+def test_lda_rank(tmpdir):
+    config_file = write_config(tmpdir, '''prototypes =
+	long stride_func(long n, long* a, long lda);
+input_arguments = a(n)
+hide_arguments = n = len(a), lda = lda(a)
+''')
+    with pytest.raises(ValueError, match=r'lda\(a\) requires 2-d argument'):
+        get_module_data(config_file)
@@ -0,0 +1,34 @@
+
+import json
+from xndtools.kernel_generator.profiling import PhaseProfiler
+
+
+def test_PhaseProfiler(tmpdir, capsys):
+    profiler = PhaseProfiler()
+    with profiler.phase('ignored'):
+        pass
+    profiler.enable()
+    try:
+        for i in range(3):
+            with profiler.phase('outer'):
+                with profiler.phase('inner'):
+                    data = [0] * 100000
+                del data
+    finally:
+        profiler.disable()
+    report = profiler.report()
+    assert [p['name'] for p in report['phases']] == ['inner', 'outer']
+    inner, outer = report['phases']
+    assert inner['calls'] == outer['calls'] == 3
+    assert 0 <= inner['seconds'] <= outer['seconds'] <= report['seconds']
+    assert 800000 <= inner['peak_bytes'] <= outer['peak_bytes'] <= report['peak_bytes']
+
+    filename = str(tmpdir.join('profile.json'))
+    profiler.dump(filename)
+    assert json.load(open(filename))['phases'] == report['phases']
+
+    # JSON is written to stderr, apart from the generator messages
+    profiler.dump()
+    out, err = capsys.readouterr()
+    assert json.loads(err)['phases'] == report['phases']
+    assert 'Profiling results are saved to' in out
@@ -0,0 +1,78 @@
+
+import os
+import time
+import tracemalloc
+import pytest
+from xndtools.kernel_generator.readers import PrototypeReader
+
+#
+# Throughput benchmark of PrototypeReader. Run with
+#
+#   XNDTOOLS_BENCH=. py.test -sv -m bench xndtools/kernel_generator/tests/test_reader_throughput.py
+#
+# For synthetic headers with 1k, 10k and 100k prototypes, the file
+# test_reader_throughput-bench.json contains the time of reading the
+# prototypes, prototypes/second, MB/second and traced peak memory. Use
+# XNDTOOLS_BENCH_PROTOTYPES=<comma-separated list> to change the number
+# of prototypes.
+#
+
+bench_nprototypes = [int(n) for n in os.environ.get('XNDTOOLS_BENCH_PROTOTYPES', '1000,10000,100000').split(',')]
+
+# Prototype patterns of varying complexity, {name} is replaced with the function name
+synthetic_prototypes = [
+    'int {name}(void);',
+    'extern double {name}(const double x, double* y);',
+    'static inline long long {name}(long n, const long* restrict a, long lda);',
+    'void __stdcall {name}(int m,\n    float * a, long,\n    double *, long   long b  [ ] );',
+    'extern const char * {name}(const char* s, int n, volatile int* flags);',
+    'unsigned int ** {name}(unsigned int *x[], const unsigned short y, signed char c);',
+    '/* {name} computes r = f(a) */\nEXTERN void {name}(const int n, const float a[], float r[]); /* MKL style */',
+    'float __cdecl {name}(struct {name}_s * s, enum {name}_e e, _Complex double z);',
+]
+
+def synthetic_header(nprototypes):
+    """Return C header source with nprototypes prototypes of varying
+    complexity interleaved with preprocessor directives and typedefs.
+    """
+    lines = ['#ifndef SYNTHETIC_H', '#define SYNTHETIC_H', '']
+    for i in range(nprototypes):
+        name = 'synthetic_func{}'.format(i)
+        if i % len(synthetic_prototypes) == 0:
+            lines.append('#define SYNTHETIC_FLAG{} {}'.format(i, i))
+            lines.append('typedef struct {{ int n; double* data; }} synthetic_t{};'.format(i))
+        lines.append(synthetic_prototypes[i % len(synthetic_prototypes)].format(name=name))
+    lines.append('#endif')
+    return '\n'.join(lines)
+
+def test_synthetic_header():
+    n = 2 * len(synthetic_prototypes)
+    prototypes = PrototypeReader()(synthetic_header(n))
+    assert [p['name'] for p in prototypes] == ['synthetic_func{}'.format(i) for i in range(n)]
+    assert prototypes[3]['conventions'] == '__stdcall'
+    assert prototypes[2]['specifiers'] == 'static inline'
+    assert prototypes[6]['arguments'][2]['right_modifier'] == '[]'
+
+@pytest.mark.bench
+def test_bench_reader_throughput(bench):
+    for nprototypes in bench_nprototypes:
+        source = synthetic_header(nprototypes)
+        tracemalloc.start()
+        start = time.perf_counter()
+        prototypes = PrototypeReader()(source)
+        seconds = time.perf_counter() - start
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert len(prototypes) == nprototypes
+        # time without tracemalloc overhead
+        start = time.perf_counter()
+        PrototypeReader()(source)
+        seconds = min(seconds, time.perf_counter() - start)
+        result = dict(nprototypes = nprototypes,
+                      source_bytes = len(source),
+                      seconds = seconds,
+                      prototypes_per_second = nprototypes / seconds,
+                      mb_per_second = len(source) / seconds / 1e6,
+                      peak_bytes = peak_bytes)
+        print('{nprototypes}: {prototypes_per_second:.0f} prototypes/s, {mb_per_second:.2f} MB/s, peak {peak_bytes} bytes'.format(**result))
+        bench.results.append(result)
@@ -0,0 +1,139 @@
+
+import os
+import sys
+import json
+import subprocess
+import pytest
+from xndtools.kernel_generator.generate_kernel import get_module_data
+
+#
+# Scalability benchmark of the kernel generator. Run with
+#
+#   XNDTOOLS_BENCH=. py.test -sv -m bench xndtools/kernel_generator/tests/test_scalability.py
+#
+# For synthetic configurations with 10, 100, 1k and 10k kernels, the
+# file test_scalability-bench.json contains the wall time and peak
+# RSS of `xnd_tools kernel` and `xnd_tools module` processes as well
+# as the --profile report (phase timings and traced peak memory). Use
+# XNDTOOLS_BENCH_KERNELS=<comma-separated list> to change the number
+# of kernels.
+#
+
+bench_nkernels = [int(n) for n in os.environ.get('XNDTOOLS_BENCH_KERNELS', '10,100,1000,10000').split(',')]
+xnd_tools_script = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'scripts', 'xnd_tools')
+
+# Kernel patterns, {name} and {t} are replaced with the kernel name and a C type
+synthetic_patterns = [
+    '''kinds = C, Xnd
+prototypes =
+	{t} {name}(long n, {t}* a);
+input_arguments = a(n)
+hide_arguments = n = len(a)''',
+    '''kinds = C, Fortran, Xnd
+ellipses = none, ...
+prototypes =
+	{t} {name}(long m, long n, {t}* a);
+inplace_arguments = a(m, n)
+hide_arguments = m = len(a), n = shape(a, 1)''',
+    '''kinds = C, Xnd
+ellipses = none
+prototypes =
+	{t} {name}(long n, {t}* a);
+inout_arguments = a(n)
+hide_arguments = n = len(a)
+output_arguments = a''',
+    '''kinds = Xnd
+arraytypes = symbolic, variable
+prototypes =
+	void {name}(long n, const {t}* a, {t}* r);
+input_arguments = a(n)
+output_arguments = r(n)
+hide_arguments = n = len(a)''',
+    '''kinds = Strided
+ellipses = none
+prototypes =
+	void {name}(long n, {t}* x, {t}* r);
+inplace_arguments = x(n)
+inout_arguments = r(n)
+hide_arguments = n = len(x)''',
+    '''kinds = C
+prototypes =
+	{t} {name}({t} x, {t}* y);
+input_arguments = x
+output_arguments = y''',
+]
+synthetic_types = ['long', 'double', 'float', 'int']
+
+def synthetic_config(module_name, nkernels):
+    """Return kernel configuration with nkernels kernels of varying
+    prototypes, intents, kinds, ellipses and arraytypes.
+    """
+    lines = ['[MODULE {}]'.format(module_name),
+             'typemaps =',
+             '\tlong: int64', '\tdouble: float64', '\tfloat: float32', '\tint: int32',
+             'includes =', '\t{}.h'.format(module_name),
+             'kinds = C', '']
+    for i in range(nkernels):
+        pattern = synthetic_patterns[i % len(synthetic_patterns)]
+        t = synthetic_types[(i // len(synthetic_patterns)) % len(synthetic_types)]
+        lines.append('[KERNEL {}_kernel{}]'.format(module_name, i))
+        lines.append(pattern.format(name='{}_func{}'.format(module_name, i), t=t))
+        lines.append('')
+    return '\n'.join(lines)
+
+def test_synthetic_config(tmpdir):
+    config_file = str(tmpdir.join('synthetic-kernels.cfg'))
+    with open(config_file, 'w') as f:
+        f.write(synthetic_config('synthetic', 2 * len(synthetic_patterns)))
+    data = get_module_data(config_file)
+    names = set(kernel['kernel_name'] for kernel in data['kernels'])
+    assert len(names) == 2 * len(synthetic_patterns)
+    kinds = set(kernel['kind'] for kernel in data['kernels'])
+    assert kinds == {'C', 'Fortran', 'Xnd', 'Strided'}
+
+# Runs a command and prints its wall time and peak RSS in JSON format.
+# RUSAGE_CHILDREN reports the maximum over all children, so each
+# command is run from its own process.
+rusage_script = '''
+import sys, json, time, resource, subprocess
+start = time.perf_counter()
+returncode = subprocess.call(sys.argv[1:], stdout=subprocess.DEVNULL)
+seconds = time.perf_counter() - start
+print(json.dumps(dict(returncode=returncode, seconds=seconds,
+                      maxrss=resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)))
+'''
+
+def run_xnd_tools(args, profile_file):
+    """Run xnd_tools with args and return its wall time, peak RSS and
+    profile report.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.join(os.path.dirname(xnd_tools_script), '..')]
+                                        + env.get('PYTHONPATH', '').split(os.pathsep))
+    output = subprocess.check_output([sys.executable, '-c', rusage_script, sys.executable, xnd_tools_script]
+                                      + args + ['--profile', profile_file], env=env)
+    r = json.loads(output.decode())
+    assert r['returncode'] == 0, args
+    return dict(seconds = r['seconds'],
+                peak_rss_bytes = r['maxrss'] * (1 if sys.platform == 'darwin' else 1024),
+                profile = json.load(open(profile_file)))
+
+@pytest.mark.bench
+def test_bench_scalability(tmpdir, bench):
+    for nkernels in bench_nkernels:
+        module_name = 'synthetic{}'.format(nkernels)
+        config_file = str(tmpdir.join('{}-kernels.cfg'.format(module_name)))
+        kernels_file = str(tmpdir.join('{}-kernels.c'.format(module_name)))
+        with open(config_file, 'w') as f:
+            f.write(synthetic_config(module_name, nkernels))
+        result = dict(nkernels = nkernels)
+        result['kernel'] = run_xnd_tools(['kernel', config_file, '-t', kernels_file],
+                                         str(tmpdir.join('kernel-profile.json')))
+        result['module'] = run_xnd_tools(['module', config_file, '-k', kernels_file,
+                                          '--source-dir', str(tmpdir)],
+                                         str(tmpdir.join('module-profile.json')))
+        result['kernels_source_bytes'] = os.path.getsize(kernels_file)
+        print('{}: kernel {:.2f}s {}MB, module {:.2f}s {}MB'.format(
+            nkernels, result['kernel']['seconds'], result['kernel']['peak_rss_bytes'] >> 20,
+            result['module']['seconds'], result['module']['peak_rss_bytes'] >> 20))
+        bench.results.append(result)
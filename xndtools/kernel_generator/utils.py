@@ -252,6 +252,12 @@ class Prototype(dict):
                 value = 'xnd_fixed_shape_at(&gmk_input_{}, 0)'.format(args)
             elif f== 'ndim':
                 value = 'xnd_ndim(&gmk_input_{})'.format(args)
+            elif f == 'lda':
+                value = 'xndtools_leading_dimension(&gmk_input_{})'.format(args)
+                self.get_argument(args)['leading_dimension'] = name
+            elif f == 'inc':
+                value = 'xndtools_increment(&gmk_input_{})'.format(args)
+                self.get_argument(args)['increment'] = name
             else:
                 print('{}.set_argument_value:NOT IMPL:{!r}'.format(type(self).__name__, value))
             if 'value' in a:
@@ -3,117 +3,880 @@
   Created: May 2018
 */
 
+#define _POSIX_C_SOURCE 200809L /* clock_gettime */
+
 #include <stdio.h>
+#include <stdarg.h>
+#include <stdlib.h>
 #include <string.h>
+#include <inttypes.h>
 #include <malloc.h>
+#include <pthread.h>
+#include <stdatomic.h>
+#include <time.h>
 
 #include "xndtools.h"
 
+#ifdef XNDTOOLS_USDT
+/* USDT probe semaphores, tracers increment them when attaching probes */
+unsigned short XNDTOOLS_PROBE_SEMAPHORE(kernel_entry) = 0;
+unsigned short XNDTOOLS_PROBE_SEMAPHORE(kernel_exit) = 0;
+unsigned short XNDTOOLS_PROBE_SEMAPHORE(copy_in) = 0;
+unsigned short XNDTOOLS_PROBE_SEMAPHORE(copy_out) = 0;
+#endif
+
 #define GET_ITEM_REF(x, i) ((x)->ptr + ((x)->index + (i) * ((x)->type->Concrete.FixedDim.step)) * (x)->type->Concrete.FixedDim.itemsize)
 
+/*
+  Scratch arena for kernel temporaries.
+
+  Buffers returned by xndtools_malloc are cached per thread in
+  power-of-two size classes when released with xndtools_free, so that
+  repeated kernel calls reuse the same memory instead of going through
+  malloc/free (that is, mmap/munmap for large buffers) on every call.
+  The number of bytes cached by a thread is bounded by the scratch
+  cap, larger buffers are returned to the system.
+ */
+
+#define XNDTOOLS_SCRATCH_ALIGN 64
+#define XNDTOOLS_SCRATCH_MIN_CLASS 6   /* 64 bytes */
+#define XNDTOOLS_SCRATCH_NCLASSES 58
+#define XNDTOOLS_SCRATCH_SLOTS 4       /* cached buffers per size class */
+
+typedef union {
+  struct {
+    int size_class;
+    int64_t nbytes;
+  } info;
+  char align[XNDTOOLS_SCRATCH_ALIGN];
+} xndtools_scratch_header_t;
+
+typedef struct {
+  void* slots[XNDTOOLS_SCRATCH_NCLASSES][XNDTOOLS_SCRATCH_SLOTS];
+  int nslots[XNDTOOLS_SCRATCH_NCLASSES];
+  int64_t cached_bytes;
+} xndtools_scratch_t;
+
+static _Thread_local xndtools_scratch_t* xndtools_scratch_tls = NULL;
+static pthread_key_t xndtools_scratch_key;
+static pthread_once_t xndtools_scratch_once = PTHREAD_ONCE_INIT;
+static int64_t xndtools_scratch_cap = -1;
+static atomic_int_fast64_t xndtools_scratch_hits = 0;
+static atomic_int_fast64_t xndtools_scratch_misses = 0;
+
+/*
+  Bytes of kernel temporaries in use. Allocations that would make the
+  current bytes exceed the memory cap fail with NDT_MemoryError.
+ */
+static atomic_int_fast64_t xndtools_memory_current = 0;
+static atomic_int_fast64_t xndtools_memory_peak = 0;
+static atomic_int_fast64_t xndtools_memory_cap = -1;
+
+static void xndtools_scratch_destroy(void* arg) {
+  xndtools_scratch_t* scratch = (xndtools_scratch_t*)arg;
+  for (int k=0; k<XNDTOOLS_SCRATCH_NCLASSES; k++)
+    for (int i=0; i<scratch->nslots[k]; i++)
+      free(scratch->slots[k][i]);
+  free(scratch);
+}
+
+static void xndtools_scratch_init(void) {
+  pthread_key_create(&xndtools_scratch_key, xndtools_scratch_destroy);
+  if (xndtools_scratch_cap < 0) {
+    const char* value = getenv("XNDTOOLS_SCRATCH_CAP");
+    xndtools_scratch_cap = (value != NULL ? strtoll(value, NULL, 10) : XNDTOOLS_SCRATCH_DEFAULT_CAP);
+  }
+}
+
+static xndtools_scratch_t* xndtools_scratch_get(void) {
+  if (xndtools_scratch_tls == NULL) {
+    pthread_once(&xndtools_scratch_once, xndtools_scratch_init);
+    xndtools_scratch_tls = (xndtools_scratch_t*)calloc(1, sizeof(xndtools_scratch_t));
+    if (xndtools_scratch_tls != NULL)
+      pthread_setspecific(xndtools_scratch_key, xndtools_scratch_tls);
+  }
+  return xndtools_scratch_tls;
+}
+
+static int xndtools_scratch_class(int64_t nbytes) {
+  int k = XNDTOOLS_SCRATCH_MIN_CLASS;
+  while (k < XNDTOOLS_SCRATCH_NCLASSES && ((int64_t)1 << k) < nbytes)
+    k++;
+  return k;
+}
+
+/*
+  Return a scratch buffer of at least nbytes bytes. The buffer must be
+  released with xndtools_free. On failure, set ctx error and return
+  NULL.
+ */
+char* xndtools_malloc(int64_t nbytes, ndt_context_t *ctx) {
+  xndtools_scratch_t* scratch = xndtools_scratch_get();
+  int k = xndtools_scratch_class(nbytes);
+  xndtools_scratch_header_t* header = NULL;
+  int64_t cap = atomic_load_explicit(&xndtools_memory_cap, memory_order_relaxed);
+  int64_t current = atomic_fetch_add_explicit(&xndtools_memory_current, nbytes, memory_order_relaxed) + nbytes;
+  if (cap >= 0 && current > cap) {
+    atomic_fetch_sub_explicit(&xndtools_memory_current, nbytes, memory_order_relaxed);
+    ndt_err_format(ctx, NDT_MemoryError,
+		   "xndtools_malloc: allocating %" PRIi64 " bytes would exceed the memory cap of %" PRIi64 " bytes (%" PRIi64 " bytes in use)",
+		   nbytes, cap, current - nbytes);
+    return NULL;
+  }
+  int64_t peak = atomic_load_explicit(&xndtools_memory_peak, memory_order_relaxed);
+  while (current > peak && !atomic_compare_exchange_weak_explicit(&xndtools_memory_peak, &peak, current, memory_order_relaxed, memory_order_relaxed))
+    ;
+  if (scratch != NULL && k < XNDTOOLS_SCRATCH_NCLASSES && scratch->nslots[k] > 0) {
+    header = (xndtools_scratch_header_t*)scratch->slots[k][--scratch->nslots[k]];
+    scratch->cached_bytes -= (int64_t)1 << k;
+    atomic_fetch_add_explicit(&xndtools_scratch_hits, 1, memory_order_relaxed);
+  } else {
+    if (k < XNDTOOLS_SCRATCH_NCLASSES)
+      header = (xndtools_scratch_header_t*)aligned_alloc(XNDTOOLS_SCRATCH_ALIGN, sizeof(xndtools_scratch_header_t) + ((int64_t)1 << k));
+    if (header == NULL) {
+      atomic_fetch_sub_explicit(&xndtools_memory_current, nbytes, memory_order_relaxed);
+      ndt_err_format(ctx, NDT_MemoryError,
+		     "xndtools_malloc: failed to allocate %" PRIi64 " bytes", nbytes);
+      return NULL;
+    }
+    header->info.size_class = k;
+    atomic_fetch_add_explicit(&xndtools_scratch_misses, 1, memory_order_relaxed);
+  }
+  header->info.nbytes = nbytes;
+  return (char*)(header + 1);
+}
+
+/*
+  Release buffer returned by xndtools_malloc. The buffer is kept in
+  the thread cache for reuse unless the scratch cap would be exceeded.
+ */
+void xndtools_free(void* ptr) {
+  if (ptr == NULL)
+    return;
+  xndtools_scratch_header_t* header = (xndtools_scratch_header_t*)ptr - 1;
+  xndtools_scratch_t* scratch = xndtools_scratch_get();
+  int k = header->info.size_class;
+  atomic_fetch_sub_explicit(&xndtools_memory_current, header->info.nbytes, memory_order_relaxed);
+  if (scratch != NULL && scratch->nslots[k] < XNDTOOLS_SCRATCH_SLOTS
+      && scratch->cached_bytes + ((int64_t)1 << k) <= xndtools_scratch_cap) {
+    scratch->slots[k][scratch->nslots[k]++] = header;
+    scratch->cached_bytes += (int64_t)1 << k;
+  } else
+    free(header);
+}
+
+/*
+  Set the maximal number of bytes that a thread keeps cached in its
+  scratch arena. Negative value restores the default. The initial cap
+  can be specified also via XNDTOOLS_SCRATCH_CAP environment variable.
+ */
+void xndtools_scratch_set_cap(int64_t cap) {
+  pthread_once(&xndtools_scratch_once, xndtools_scratch_init);
+  xndtools_scratch_cap = (cap < 0 ? XNDTOOLS_SCRATCH_DEFAULT_CAP : cap);
+}
+
+void xndtools_scratch_get_stats(xndtools_scratch_stats_t* stats) {
+  stats->hits = atomic_load_explicit(&xndtools_scratch_hits, memory_order_relaxed);
+  stats->misses = atomic_load_explicit(&xndtools_scratch_misses, memory_order_relaxed);
+}
+
+void xndtools_scratch_reset_stats(void) {
+  atomic_store_explicit(&xndtools_scratch_hits, 0, memory_order_relaxed);
+  atomic_store_explicit(&xndtools_scratch_misses, 0, memory_order_relaxed);
+}
+
+/*
+  Set the memory cap of kernel temporaries unless specified by
+  XNDTOOLS_MEMORY_CAP environment variable. Negative cap means
+  unlimited.
+ */
+void xndtools_init_memory_cap(int64_t cap) {
+  const char* value = getenv("XNDTOOLS_MEMORY_CAP");
+  xndtools_set_memory_cap(value != NULL ? strtoll(value, NULL, 10) : cap);
+}
+
+void xndtools_set_memory_cap(int64_t cap) {
+  atomic_store_explicit(&xndtools_memory_cap, (cap < 0 ? -1 : cap), memory_order_relaxed);
+}
+
+void xndtools_memory_get_stats(xndtools_memory_stats_t* stats) {
+  stats->current = atomic_load_explicit(&xndtools_memory_current, memory_order_relaxed);
+  stats->peak = atomic_load_explicit(&xndtools_memory_peak, memory_order_relaxed);
+  stats->cap = atomic_load_explicit(&xndtools_memory_cap, memory_order_relaxed);
+}
+
+/*
+  Reset the high-water mark to the current bytes in use.
+ */
+void xndtools_memory_reset_peak(void) {
+  atomic_store_explicit(&xndtools_memory_peak,
+			atomic_load_explicit(&xndtools_memory_current, memory_order_relaxed),
+			memory_order_relaxed);
+}
+
+/*
+  Kernel wrapper statistics. Generated wrappers count their calls
+  atomically so that kernels can be called from several threads.
+ */
+int64_t xndtools_kernel_stats_get_calls(xndtools_kernel_stats_t* stats) {
+  return atomic_load_explicit(&stats->calls, memory_order_relaxed);
+}
+
+void xndtools_kernel_stats_reset(xndtools_kernel_stats_t* stats) {
+  atomic_store_explicit(&stats->calls, 0, memory_order_relaxed);
+  if (stats->profile != NULL) {
+    for (int i=0; i<XNDTOOLS_PROFILE_BUCKETS; i++)
+      atomic_store_explicit(&stats->profile->counts[i], 0, memory_order_relaxed);
+    atomic_store_explicit(&stats->profile->total_ns, 0, memory_order_relaxed);
+  }
+  if (stats->phases != NULL) {
+    atomic_store_explicit(&stats->phases->copy_in_ns, 0, memory_order_relaxed);
+    atomic_store_explicit(&stats->phases->call_ns, 0, memory_order_relaxed);
+    atomic_store_explicit(&stats->phases->copy_out_ns, 0, memory_order_relaxed);
+  }
+  for (int i=0; i<stats->ncopy_stats; i++) {
+    atomic_store_explicit(&stats->copy_stats[i].zero_copy, 0, memory_order_relaxed);
+    atomic_store_explicit(&stats->copy_stats[i].copy_in, 0, memory_order_relaxed);
+    atomic_store_explicit(&stats->copy_stats[i].copy_out, 0, memory_order_relaxed);
+    atomic_store_explicit(&stats->copy_stats[i].bytes, 0, memory_order_relaxed);
+  }
+}
+
+void xndtools_kernel_phases_get_summary(xndtools_kernel_phases_t* phases,
+					xndtools_kernel_phases_summary_t* summary) {
+  summary->copy_in_ns = atomic_load_explicit(&phases->copy_in_ns, memory_order_relaxed);
+  summary->call_ns = atomic_load_explicit(&phases->call_ns, memory_order_relaxed);
+  summary->copy_out_ns = atomic_load_explicit(&phases->copy_out_ns, memory_order_relaxed);
+}
+
+void xndtools_copy_stats_get_summary(xndtools_copy_stats_t* stats,
+				     xndtools_copy_stats_summary_t* summary) {
+  summary->zero_copy = atomic_load_explicit(&stats->zero_copy, memory_order_relaxed);
+  summary->copy_in = atomic_load_explicit(&stats->copy_in, memory_order_relaxed);
+  summary->copy_out = atomic_load_explicit(&stats->copy_out, memory_order_relaxed);
+  summary->bytes = atomic_load_explicit(&stats->bytes, memory_order_relaxed);
+}
+
+/*
+  Profiled wrappers record their durations, measured with monotonic
+  clock, into log2 histogram buckets.
+ */
+int64_t xndtools_profile_clock(void) {
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (int64_t)ts.tv_sec * 1000000000 + ts.tv_nsec;
+}
+
+void xndtools_kernel_profile_record(xndtools_kernel_profile_t* profile, int64_t start) {
+  int64_t duration = xndtools_profile_clock() - start;
+  int bucket = (duration > 0 ? 63 - __builtin_clzll((unsigned long long)duration) : 0);
+  atomic_fetch_add_explicit(&profile->counts[bucket], 1, memory_order_relaxed);
+  atomic_fetch_add_explicit(&profile->total_ns, duration, memory_order_relaxed);
+}
+
+/*
+  Kernel wrapper log. Messages of enabled levels are written, with the
+  wrapper name prefix, into a ring buffer that keeps the last
+  XNDTOOLS_LOG_CAPACITY entries. When a filter is set, only messages of
+  wrappers whose name contains the filter are written. The initial
+  level can be specified via XNDTOOLS_LOG_LEVEL environment variable.
+ */
+atomic_int xndtools_log_level = XNDTOOLS_LOG_OFF;
+static char xndtools_log_filter[XNDTOOLS_LOG_MESSAGE_SIZE] = "";
+static xndtools_log_entry_t xndtools_log_entries[XNDTOOLS_LOG_CAPACITY];
+static int64_t xndtools_log_start = 0;  /* index of oldest entry */
+static int64_t xndtools_log_count = 0;
+static pthread_mutex_t xndtools_log_mutex = PTHREAD_MUTEX_INITIALIZER;
+
+__attribute__((constructor))
+static void xndtools_log_init(void) {
+  const char* value = getenv("XNDTOOLS_LOG_LEVEL");
+  if (value != NULL)
+    atomic_store_explicit(&xndtools_log_level, atoi(value), memory_order_relaxed);
+}
+
+void xndtools_log_set_level(int level, const char* filter) {
+  pthread_mutex_lock(&xndtools_log_mutex);
+  snprintf(xndtools_log_filter, sizeof(xndtools_log_filter), "%s", (filter == NULL ? "" : filter));
+  atomic_store_explicit(&xndtools_log_level, level, memory_order_relaxed);
+  pthread_mutex_unlock(&xndtools_log_mutex);
+}
+
+int xndtools_log_get_level(void) {
+  return atomic_load_explicit(&xndtools_log_level, memory_order_relaxed);
+}
+
+static void xndtools_log_vwrite(int level, const char* wrapper, const char* fmt, va_list args) {
+  int64_t time_ns = xndtools_profile_clock();
+  pthread_mutex_lock(&xndtools_log_mutex);
+  if (xndtools_log_filter[0] == 0 || strstr(wrapper, xndtools_log_filter) != NULL) {
+    xndtools_log_entry_t* entry = &xndtools_log_entries[(xndtools_log_start + xndtools_log_count) % XNDTOOLS_LOG_CAPACITY];
+    int n = snprintf(entry->message, XNDTOOLS_LOG_MESSAGE_SIZE, "%s: ", wrapper);
+    if (n >= 0 && n < XNDTOOLS_LOG_MESSAGE_SIZE)
+      vsnprintf(entry->message + n, XNDTOOLS_LOG_MESSAGE_SIZE - n, fmt, args);
+    entry->time_ns = time_ns;
+    entry->level = level;
+    if (xndtools_log_count < XNDTOOLS_LOG_CAPACITY)
+      xndtools_log_count++;
+    else
+      xndtools_log_start = (xndtools_log_start + 1) % XNDTOOLS_LOG_CAPACITY;
+  }
+  pthread_mutex_unlock(&xndtools_log_mutex);
+}
+
+void xndtools_log_write(int level, const char* wrapper, const char* fmt, ...) {
+  va_list args;
+  va_start(args, fmt);
+  xndtools_log_vwrite(level, wrapper, fmt, args);
+  va_end(args);
+}
+
+void xndtools_log_write_type(int level, const char* wrapper, const char* name, const ndt_t* type) {
+  NDT_STATIC_CONTEXT(ctx);
+  char* s = ndt_as_string(type, &ctx);
+  if (s == NULL) {
+    xndtools_log_write(level, wrapper, "%s.type=<%s>", name, ndt_context_msg(&ctx));
+    ndt_err_clear(&ctx);
+    return;
+  }
+  xndtools_log_write(level, wrapper, "%s.type=%s", name, s);
+  ndt_free(s);
+}
+
+/*
+  Copy at most max oldest log entries to entries and return the
+  number of copied entries. When clear is true, the copied entries are
+  removed from the log.
+ */
+int64_t xndtools_log_read(xndtools_log_entry_t* entries, int64_t max, bool clear) {
+  pthread_mutex_lock(&xndtools_log_mutex);
+  int64_t n = (xndtools_log_count < max ? xndtools_log_count : max);
+  for (int64_t i=0; i<n; i++)
+    entries[i] = xndtools_log_entries[(xndtools_log_start + i) % XNDTOOLS_LOG_CAPACITY];
+  if (clear) {
+    xndtools_log_start = (xndtools_log_start + n) % XNDTOOLS_LOG_CAPACITY;
+    xndtools_log_count -= n;
+  }
+  pthread_mutex_unlock(&xndtools_log_mutex);
+  return n;
+}
+
+/*
+  Return quantile q of durations, interpolated linearly within the
+  histogram bucket.
+ */
+static int64_t xndtools_profile_quantile(const int64_t* counts, int64_t count, double q) {
+  double target = q * count;
+  int64_t cumulative = 0;
+  for (int i=0; i<XNDTOOLS_PROFILE_BUCKETS; i++) {
+    if (counts[i] > 0 && cumulative + counts[i] >= target) {
+      double lower = (double)((uint64_t)1 << i);
+      return (int64_t)(lower + lower * (target - cumulative) / counts[i]);
+    }
+    cumulative += counts[i];
+  }
+  return 0;
+}
+
+void xndtools_kernel_profile_get_summary(xndtools_kernel_profile_t* profile,
+					 xndtools_kernel_profile_summary_t* summary) {
+  int64_t counts[XNDTOOLS_PROFILE_BUCKETS];
+  summary->count = 0;
+  for (int i=0; i<XNDTOOLS_PROFILE_BUCKETS; i++) {
+    counts[i] = atomic_load_explicit(&profile->counts[i], memory_order_relaxed);
+    summary->count += counts[i];
+  }
+  summary->total_ns = atomic_load_explicit(&profile->total_ns, memory_order_relaxed);
+  summary->p50_ns = xndtools_profile_quantile(counts, summary->count, 0.5);
+  summary->p99_ns = xndtools_profile_quantile(counts, summary->count, 0.99);
+}
+
+/*
+  Return item size of fixed dims stack.
+ */
+static int64_t xndtools_itemsize(const xnd_t* stack_ptr) {
+  if (xnd_ndim(stack_ptr) == 0)
+    return stack_ptr->type->datasize;
+  return stack_ptr->type->Concrete.FixedDim.itemsize;
+}
+
 /*
   Return number of bytes in fixed dims stack.
  */
 int64_t xndtools_fixed_nbytes(const xnd_t* stack_ptr) {
   int64_t items = 1;
-  int64_t itemsize = stack_ptr->type->Concrete.FixedDim.itemsize;
+  int64_t itemsize = xndtools_itemsize(stack_ptr);
   int ndim = xnd_ndim(stack_ptr);
   for (int64_t i=0; i< ndim; i++)
     items *= xnd_fixed_shape_at(stack_ptr, i);
   return items * itemsize;
  }
 
+/*
+  Return number of items in the leading fixed dimensions of stack.
+ */
+int64_t xndtools_fixed_nitems(const xnd_t* stack_ptr) {
+  int64_t items = 1;
+  const ndt_t* t = stack_ptr->type;
+  while (t->tag == FixedDim) {
+    items *= t->FixedDim.shape;
+    t = t->FixedDim.type;
+  }
+  return items;
+}
+
+/*
+  Return true when fixed dims stack is a 2-d array with unit-stride
+  rows so that it can be passed to C functions without copying,
+  together with its leading dimension. Other arrays must be C
+  contiguous.
+ */
+bool xndtools_is_row_strided(const xnd_t* stack_ptr) {
+  if (xnd_ndim(stack_ptr) != 2)
+    return ndt_is_c_contiguous(stack_ptr->type);
+  const ndt_t* t = stack_ptr->type;
+  const ndt_t* r = t->FixedDim.type;
+  int64_t ncols = r->FixedDim.shape;
+  if (ncols > 1 && r->Concrete.FixedDim.step != 1)
+    return false;
+  return (t->FixedDim.shape <= 1 || t->Concrete.FixedDim.step >= (ncols > 1 ? ncols : 1));
+}
+
+/*
+  Return leading dimension of 2-d fixed dims stack as seen by C
+  functions: the row step of row strided arrays, otherwise the number
+  of columns of the C contiguous copy. Other stacks have no rows, 1 is
+  returned.
+ */
+int64_t xndtools_leading_dimension(const xnd_t* stack_ptr) {
+  if (xnd_ndim(stack_ptr) != 2)
+    return 1;
+  const ndt_t* t = stack_ptr->type;
+  int64_t ncols = t->FixedDim.type->FixedDim.shape;
+  if (ncols < 1)
+    ncols = 1;
+  if (t->FixedDim.shape > 1 && xndtools_is_row_strided(stack_ptr))
+    return t->Concrete.FixedDim.step;
+  return ncols;
+}
+
+/*
+  Return increment of 1-d fixed dims stack in items, as expected by
+  BLAS level 1 functions. The increment may be negative. Broadcast
+  stacks (zero step) have zero increment that kernel wrappers reject.
+ */
+int64_t xndtools_increment(const xnd_t* stack_ptr) {
+  const ndt_t* t = stack_ptr->type;
+  if (t->FixedDim.shape <= 1)
+    return 1;
+  return t->Concrete.FixedDim.step;
+}
+
+/*
+  Return pointer to the item of 1-d fixed dims stack with the lowest
+  address. Together with xndtools_increment, this follows the BLAS
+  convention for negative increments.
+ */
+char* xndtools_increment_base(const xnd_t* stack_ptr) {
+  const ndt_t* t = stack_ptr->type;
+  int64_t itemsize = t->Concrete.FixedDim.itemsize;
+  int64_t index = stack_ptr->index;
+  if (t->FixedDim.shape > 1 && t->Concrete.FixedDim.step < 0)
+    index += (t->FixedDim.shape - 1) * t->Concrete.FixedDim.step;
+  return stack_ptr->ptr + index * itemsize;
+}
+
+/*
+  Strided copy engine.
+
+  The layout of a fixed dims stack is described by shape and byte
+  strides vectors that are computed once per copy. Before copying,
+  trivial dimensions are dropped and adjacent dimensions that are
+  contiguous in both source and destination are merged. Contiguous
+  inner runs are copied with memcpy. Copies between two layouts whose
+  fastest varying axes differ (such as C to Fortran conversion) are
+  performed in square tiles so that both source and destination
+  accesses stay in cache.
+ */
+
+#define XNDTOOLS_TILE 32
+
+/*
+  Fill shape and byte strides of fixed dims stack. Return ndim.
+ */
+static int xndtools_layout(const xnd_t* stack_ptr, int64_t* shape, int64_t* strides) {
+  int ndim = xnd_ndim(stack_ptr);
+  int64_t itemsize = xndtools_itemsize(stack_ptr);
+  const ndt_t* t = stack_ptr->type;
+  for (int i=0; i<ndim; i++) {
+    shape[i] = t->FixedDim.shape;
+    strides[i] = t->Concrete.FixedDim.step * itemsize;
+    t = t->FixedDim.type;
+  }
+  return ndim;
+}
+
+/*
+  Fill byte strides of C or Fortran contiguous array.
+ */
+static void xndtools_contiguous_strides(int64_t* strides, const int64_t* shape, int ndim, int64_t itemsize, bool fortran) {
+  int64_t stride = itemsize;
+  for (int j=0; j<ndim; j++) {
+    int i = (fortran ? j : ndim - 1 - j);
+    strides[i] = stride;
+    stride *= shape[i];
+  }
+}
+
+/*
+  Reorder axes so that destination strides are decreasing, drop
+  dimensions of length 1 and merge adjacent dimensions that are
+  contiguous in both source and destination. Return new ndim.
+ */
+static int xndtools_coalesce(int64_t* shape, int64_t* dst_strides, int64_t* src_strides, int ndim) {
+  int n = 0;
+  for (int i=0; i<ndim; i++) {
+    if (shape[i] == 1)
+      continue;
+    int64_t sh = shape[i], ds = dst_strides[i], ss = src_strides[i];
+    int j = n++;
+    for (; j>0 && llabs(dst_strides[j-1]) < llabs(ds); j--) {
+      shape[j] = shape[j-1];
+      dst_strides[j] = dst_strides[j-1];
+      src_strides[j] = src_strides[j-1];
+    }
+    shape[j] = sh;
+    dst_strides[j] = ds;
+    src_strides[j] = ss;
+  }
+  ndim = n;
+  n = 0;
+  for (int i=1; i<ndim; i++) {
+    if (dst_strides[n] == dst_strides[i] * shape[i] && src_strides[n] == src_strides[i] * shape[i])
+      shape[n] *= shape[i];
+    else
+      shape[++n] = shape[i];
+    dst_strides[n] = dst_strides[i];
+    src_strides[n] = src_strides[i];
+  }
+  return (ndim > 0 ? n + 1 : 0);
+}
+
+/*
+  Return the axis with the smallest absolute stride.
+ */
+static int xndtools_fastest_axis(const int64_t* strides, int ndim) {
+  int axis = ndim - 1;
+  for (int i=ndim-2; i>=0; i--)
+    if (llabs(strides[i]) < llabs(strides[axis]))
+      axis = i;
+  return axis;
+}
+
+/*
+  Copy n items between strided lines.
+ */
+static inline void xndtools_line_copy(char* dst, int64_t dst_step, const char* src, int64_t src_step, int64_t n, int64_t itemsize) {
+  if (dst_step == itemsize && src_step == itemsize) {
+    memcpy(dst, src, n * itemsize);
+    return;
+  }
+  switch (itemsize) {
+  case 1:
+    for (int64_t i=0; i<n; i++)
+      *(int8_t*)(dst+i*dst_step) = *(const int8_t*)(src+i*src_step);
+    break;
+  case 2:
+    for (int64_t i=0; i<n; i++)
+      *(int16_t*)(dst+i*dst_step) = *(const int16_t*)(src+i*src_step);
+    break;
+  case 4:
+    for (int64_t i=0; i<n; i++)
+      *(int32_t*)(dst+i*dst_step) = *(const int32_t*)(src+i*src_step);
+    break;
+  case 8:
+    for (int64_t i=0; i<n; i++)
+      *(int64_t*)(dst+i*dst_step) = *(const int64_t*)(src+i*src_step);
+    break;
+  default:
+    for (int64_t i=0; i<n; i++)
+      memcpy(dst+i*dst_step, src+i*src_step, itemsize);
+  }
+}
+
+/*
+  Copy n0 x n1 block in XNDTOOLS_TILE x XNDTOOLS_TILE tiles. Axis 1
+  should be the fastest axis of the destination.
+ */
+static void xndtools_block_copy(char* dst, int64_t dst_s0, int64_t dst_s1,
+				const char* src, int64_t src_s0, int64_t src_s1,
+				int64_t n0, int64_t n1, int64_t itemsize) {
+  for (int64_t i0=0; i0<n0; i0+=XNDTOOLS_TILE) {
+    int64_t m0 = (n0 - i0 < XNDTOOLS_TILE ? n0 - i0 : XNDTOOLS_TILE);
+    for (int64_t i1=0; i1<n1; i1+=XNDTOOLS_TILE) {
+      int64_t m1 = (n1 - i1 < XNDTOOLS_TILE ? n1 - i1 : XNDTOOLS_TILE);
+      for (int64_t i=i0; i<i0+m0; i++)
+	xndtools_line_copy(dst + i*dst_s0 + i1*dst_s1, dst_s1,
+			   src + i*src_s0 + i1*src_s1, src_s1, m1, itemsize);
+    }
+  }
+}
+
+/*
+  Copy items between strided layouts of the same coalesced shape. The
+  innermost destination axis is copied as a line, or together with the
+  fastest source axis as a tiled 2-d transpose when the two
+  differ. Remaining axes are iterated over.
+ */
+static void xndtools_strided_copy_kernel(char* dst, const int64_t* dst_strides,
+					 const char* src, const int64_t* src_strides,
+					 const int64_t* shape, int ndim, int64_t itemsize) {
+  int outer[NDT_MAX_DIM];
+  int64_t index[NDT_MAX_DIM];
+  int nouter = 0;
+  int a1 = ndim - 1;
+  int a0 = xndtools_fastest_axis(src_strides, ndim);
+  for (int i=0; i<ndim; i++)
+    if (i != a0 && i != a1) {
+      index[nouter] = 0;
+      outer[nouter++] = i;
+    }
+  for (;;) {
+    if (a0 == a1)
+      xndtools_line_copy(dst, dst_strides[a1], src, src_strides[a1], shape[a1], itemsize);
+    else
+      xndtools_block_copy(dst, dst_strides[a0], dst_strides[a1],
+			  src, src_strides[a0], src_strides[a1],
+			  shape[a0], shape[a1], itemsize);
+    int k = nouter - 1;
+    for (; k>=0; k--) {
+      int i = outer[k];
+      dst += dst_strides[i];
+      src += src_strides[i];
+      if (++index[k] < shape[i])
+	break;
+      dst -= shape[i] * dst_strides[i];
+      src -= shape[i] * src_strides[i];
+      index[k] = 0;
+    }
+    if (k < 0)
+      break;
+  }
+}
+
+/*
+  Copy n items of 1-d fixed dims stack starting at item start to
+  contiguous destination.
+ */
+void xndtools_tile_gather(char* dest, const xnd_t* stack_ptr, int64_t start, int64_t n) {
+  const ndt_t* t = stack_ptr->type;
+  int64_t itemsize = t->Concrete.FixedDim.itemsize;
+  int64_t step = t->Concrete.FixedDim.step * itemsize;
+  const char* ptr = stack_ptr->ptr + stack_ptr->index * itemsize + start * step;
+  xndtools_line_copy(dest, itemsize, ptr, step, n, itemsize);
+}
+
+/*
+  Copy n items from contiguous source to 1-d fixed dims stack starting
+  at item start.
+ */
+void xndtools_tile_scatter(const char* src, const xnd_t* stack_ptr, int64_t start, int64_t n) {
+  const ndt_t* t = stack_ptr->type;
+  int64_t itemsize = t->Concrete.FixedDim.itemsize;
+  int64_t step = t->Concrete.FixedDim.step * itemsize;
+  char* ptr = stack_ptr->ptr + stack_ptr->index * itemsize + start * step;
+  xndtools_line_copy(ptr, step, src, itemsize, n, itemsize);
+}
+
+/*
+  Copy n items with byte step from strided source (Strided kernel
+  argument) to contiguous destination.
+ */
+void xndtools_strided_gather(char* dest, const char* src, int64_t n, int64_t step, int64_t itemsize) {
+  xndtools_line_copy(dest, itemsize, src, step, n, itemsize);
+}
+
+/*
+  Copy n items from contiguous source to strided destination with
+  byte step (Strided kernel argument).
+ */
+void xndtools_strided_scatter(char* dest, int64_t step, const char* src, int64_t n, int64_t itemsize) {
+  xndtools_line_copy(dest, step, src, itemsize, n, itemsize);
+}
+
+/*
+  Strided kernel counterparts of xndtools_increment and
+  xndtools_increment_base, step is given in bytes.
+ */
+int64_t xndtools_strided_increment(int64_t n, int64_t step, int64_t itemsize) {
+  if (n <= 1)
+    return 1;
+  return step / itemsize;
+}
+
+char* xndtools_strided_increment_base(char* ptr, int64_t n, int64_t step) {
+  if (n > 1 && step < 0)
+    ptr += (n - 1) * step;
+  return ptr;
+}
+
+/*
+  Parallel copy.
+
+  Copies of at least xndtools_copy_threshold bytes are split along the
+  outermost (coalesced) axis into chunks that are copied by
+  xndtools_copy_threads threads. The number of threads is configured
+  per module (see xndtools_set_copy_threads) and can be overridden by
+  XNDTOOLS_COPY_THREADS environment variable. The threshold can be
+  overridden by XNDTOOLS_COPY_THRESHOLD environment variable.
+ */
+
+#define XNDTOOLS_COPY_MAX_THREADS 64
+
+static int xndtools_copy_threads = 1;
+static int64_t xndtools_copy_threshold = XNDTOOLS_COPY_DEFAULT_THRESHOLD;
+static bool xndtools_copy_threads_from_env = false;
+static pthread_once_t xndtools_copy_once = PTHREAD_ONCE_INIT;
+
+typedef struct {
+  char* dst;
+  const char* src;
+  int64_t n0;
+  const int64_t* dst_strides;
+  const int64_t* src_strides;
+  const int64_t* shape;
+  int ndim;
+  int64_t itemsize;
+} xndtools_copy_task_t;
+
+static void xndtools_copy_init(void) {
+  const char* value = getenv("XNDTOOLS_COPY_THREADS");
+  if (value != NULL && atoi(value) > 0) {
+    xndtools_copy_threads = atoi(value);
+    xndtools_copy_threads_from_env = true;
+  }
+  value = getenv("XNDTOOLS_COPY_THRESHOLD");
+  if (value != NULL)
+    xndtools_copy_threshold = strtoll(value, NULL, 10);
+}
+
+/*
+  Set the number of threads used for copying large arrays, unless
+  specified by XNDTOOLS_COPY_THREADS environment variable.
+ */
+void xndtools_set_copy_threads(int nthreads) {
+  pthread_once(&xndtools_copy_once, xndtools_copy_init);
+  if (!xndtools_copy_threads_from_env)
+    xndtools_copy_threads = (nthreads > 0 ? nthreads : 1);
+}
+
+int xndtools_get_copy_threads(void) {
+  pthread_once(&xndtools_copy_once, xndtools_copy_init);
+  return xndtools_copy_threads;
+}
+
+static void* xndtools_copy_task(void* arg) {
+  xndtools_copy_task_t* task = (xndtools_copy_task_t*)arg;
+  int64_t shape[NDT_MAX_DIM];
+  memcpy(shape, task->shape, task->ndim * sizeof(int64_t));
+  shape[0] = task->n0;
+  xndtools_strided_copy_kernel(task->dst, task->dst_strides, task->src, task->src_strides,
+			       shape, task->ndim, task->itemsize);
+  return NULL;
+}
+
+static void xndtools_parallel_copy(char* dst, const int64_t* dst_strides,
+				   const char* src, const int64_t* src_strides,
+				   const int64_t* shape, int ndim, int64_t itemsize, int nthreads) {
+  xndtools_copy_task_t tasks[XNDTOOLS_COPY_MAX_THREADS];
+  pthread_t threads[XNDTOOLS_COPY_MAX_THREADS];
+  bool started[XNDTOOLS_COPY_MAX_THREADS];
+  if (nthreads > XNDTOOLS_COPY_MAX_THREADS)
+    nthreads = XNDTOOLS_COPY_MAX_THREADS;
+  if (nthreads > shape[0])
+    nthreads = shape[0];
+  int64_t chunk = (shape[0] + nthreads - 1) / nthreads;
+  int n = 0;
+  for (int64_t start=0; start<shape[0]; start+=chunk, n++) {
+    tasks[n].dst = dst + start * dst_strides[0];
+    tasks[n].src = src + start * src_strides[0];
+    tasks[n].n0 = (shape[0] - start < chunk ? shape[0] - start : chunk);
+    tasks[n].dst_strides = dst_strides;
+    tasks[n].src_strides = src_strides;
+    tasks[n].shape = shape;
+    tasks[n].ndim = ndim;
+    tasks[n].itemsize = itemsize;
+  }
+  for (int i=1; i<n; i++)
+    started[i] = (pthread_create(&threads[i], NULL, xndtools_copy_task, &tasks[i]) == 0);
+  xndtools_copy_task(&tasks[0]);
+  for (int i=1; i<n; i++) {
+    if (started[i])
+      pthread_join(threads[i], NULL);
+    else
+      xndtools_copy_task(&tasks[i]);
+  }
+}
+
+/*
+  Copy items between arbitrary strided layouts of the same shape.
+ */
+static void xndtools_strided_copy(char* dst, int64_t* dst_strides,
+				  const char* src, int64_t* src_strides,
+				  int64_t* shape, int ndim, int64_t itemsize) {
+  int64_t nbytes = itemsize;
+  for (int i=0; i<ndim; i++)
+    nbytes *= shape[i];
+  if (nbytes == 0)
+    return;
+  ndim = xndtools_coalesce(shape, dst_strides, src_strides, ndim);
+  if (ndim == 0) {
+    memcpy(dst, src, itemsize);
+    return;
+  }
+  int nthreads = xndtools_get_copy_threads();
+  if (nthreads > 1 && nbytes >= xndtools_copy_threshold && shape[0] > 1)
+    xndtools_parallel_copy(dst, dst_strides, src, src_strides, shape, ndim, itemsize, nthreads);
+  else
+    xndtools_strided_copy_kernel(dst, dst_strides, src, src_strides, shape, ndim, itemsize);
+}
+
 /*
   Copy fixed dims stack (possibly sliced) to a C or Fortran contiguous destination.
   Return number of bytes copied.
  */
-int xndtools_cpy(char* dest, const xnd_t* stack_ptr, bool fortran) {
-  int ndim = xnd_ndim(stack_ptr);
-  int64_t itemsize = stack_ptr->type->Concrete.FixedDim.itemsize;
+int64_t xndtools_cpy(char* dest, const xnd_t* stack_ptr, bool fortran) {
+  int64_t shape[NDT_MAX_DIM], strides[NDT_MAX_DIM], dest_strides[NDT_MAX_DIM];
+  int64_t itemsize = xndtools_itemsize(stack_ptr);
+  int64_t nbytes = xndtools_fixed_nbytes(stack_ptr);
   char* ptr0 = stack_ptr->ptr + stack_ptr->index * itemsize;
-  //printf("xndtools_cpy: ndim=%d, c_contiguous=%d\n", ndim, ndt_is_c_contiguous(stack_ptr->type));
-  if (ndim==0) {
-    memcpy(dest, ptr0, itemsize); // avoid broadcasting scalar to 1d array   
-    return itemsize;
-  } else if (!fortran && ndt_is_c_contiguous(stack_ptr->type)) {
-    int64_t nbytes = xndtools_fixed_nbytes(stack_ptr);
-    memcpy(dest, ptr0, nbytes);
-    return nbytes;
-  } else if (fortran && ndt_is_f_contiguous(stack_ptr->type)) {
-    int64_t nbytes = xndtools_fixed_nbytes(stack_ptr);
+  if ((!fortran && ndt_is_c_contiguous(stack_ptr->type))
+      || (fortran && ndt_is_f_contiguous(stack_ptr->type))) {
     memcpy(dest, ptr0, nbytes);
     return nbytes;
-  } else if (ndim>1) {
-    int64_t N = xnd_fixed_shape_at(stack_ptr, 0);
-    int64_t N1 = 1;
-    for (int64_t i=0; i<N; i++) {
-      xnd_t row = xnd_fixed_dim_next(stack_ptr, i);
-      N1 = xndtools_cpy(dest + N1*i, &row, fortran);
-      assert(N1>=1);
-    }
-    return N * N1;
-  } else if (ndim==1) {
-    int64_t N = xnd_fixed_shape_at(stack_ptr, 0);
-    int64_t step = stack_ptr->type->Concrete.FixedDim.step * itemsize;
-    switch (itemsize) { // todo: check if assignment is faster than memcpy or not
-    case 1:
-      {
-	int8_t* out = (int8_t*)dest;
-	for (int64_t i=0; i< N; i++)
-	  out[i] = *(const int8_t*)(ptr0+i*step);
-	break;
-      }
-    case 2:
-      {
-	int16_t* out = (int16_t*)dest;
-	for (int64_t i=0; i< N; i++)
-	  out[i] = *(const int16_t*)(ptr0+i*step);
-	break;
-      }
-    case 4:
-      {
-	int32_t* out = (int32_t*)dest;
-	for (int64_t i=0; i< N; i++)
-	  out[i] = *(const int32_t*)(ptr0+i*step);
-	break;
-      }
-    case 8:
-      {
-	int64_t* out = (int64_t*)dest;
-	for (int64_t i=0; i< N; i++)
-	  out[i] = *(const int64_t*)(ptr0+i*step);
-	break;
-      }
-    default:
-      {
-	for (int64_t i=0; i< N; i++)
-	  memcpy(dest+i*itemsize, ptr0+i*step, itemsize);
-      }
-    }
-    return N*itemsize;
   }
-  return -1;
+  int ndim = xndtools_layout(stack_ptr, shape, strides);
+  xndtools_contiguous_strides(dest_strides, shape, ndim, itemsize, fortran);
+  xndtools_strided_copy(dest, dest_strides, ptr0, strides, shape, ndim, itemsize);
+  return nbytes;
 }
 
 /*
   Return a C contiguous copy of fixed dims stack. Caller is
-  responsible for deallocating the returned array.
+  responsible for deallocating the returned array with xndtools_free.
  */
 
 char* xndtools_copy(const xnd_t* stack_ptr, ndt_context_t *ctx) {
   char* target = NULL;
   int64_t nbytes = xndtools_fixed_nbytes(stack_ptr);
-  target = (char*)malloc(nbytes);
-  if (target==NULL) {
-    ndt_err_format(ctx, NDT_MemoryError,
-		   "xndtools_copy: failed to allocate memory");
+  target = xndtools_malloc(nbytes, ctx);
+  if (target==NULL)
     return NULL;
-  }
   int64_t tbytes = xndtools_cpy(target, stack_ptr, 0);
   if (tbytes!=nbytes) {
     ndt_err_format(ctx, NDT_RuntimeError,
 		   "xndtools_copy: mismatch of allocated and copied memory");
-    free(target);
+    xndtools_free(target);
     target = NULL;
   }
   return target;
@@ -121,97 +884,41 @@ char* xndtools_copy(const xnd_t* stack_ptr, ndt_context_t *ctx) {
 
 /*
   Return a Fortran contiguous copy of fixed dims stack. Caller is
-  responsible for deallocating the returned array.
+  responsible for deallocating the returned array with xndtools_free.
  */
 
 char* xndtools_fcopy(const xnd_t* stack_ptr, ndt_context_t *ctx) {
   char* target = NULL;
   int64_t nbytes = xndtools_fixed_nbytes(stack_ptr);
-  target = (char*)malloc(nbytes);
-  if (target==NULL) {
-    ndt_err_format(ctx, NDT_MemoryError,
-		   "xndtools_fcopy: failed to allocate memory");
+  target = xndtools_malloc(nbytes, ctx);
+  if (target==NULL)
     return NULL;
-  }
   int64_t tbytes = xndtools_cpy(target, stack_ptr, 1);
   if (tbytes!=nbytes) {
     ndt_err_format(ctx, NDT_RuntimeError,
 		   "xndtools_fcopy: mismatch of allocated and copied memory");
-    free(target);
+    xndtools_free(target);
     target = NULL;
   }
   return target;
 }
 
 /*
-  Copy C contiguous data to fixed dims stack (possibly sliced).
+  Copy C or Fortran contiguous data to fixed dims stack (possibly sliced).
   Return number of bytes copied.
  */
-int xndtools_invcpy(const char* src, const xnd_t* stack_ptr, bool fortran) {
-  int ndim = xnd_ndim(stack_ptr);
-  int64_t itemsize = stack_ptr->type->Concrete.FixedDim.itemsize;
+int64_t xndtools_invcpy(const char* src, const xnd_t* stack_ptr, bool fortran) {
+  int64_t shape[NDT_MAX_DIM], strides[NDT_MAX_DIM], src_strides[NDT_MAX_DIM];
+  int64_t itemsize = xndtools_itemsize(stack_ptr);
+  int64_t nbytes = xndtools_fixed_nbytes(stack_ptr);
   char* ptr0 = stack_ptr->ptr + stack_ptr->index * itemsize;
-  if (ndim==0) {
-    memcpy(ptr0, src, itemsize); // avoid broadcasting scalar to 1d array   
-    return itemsize;
-  } else if (!fortran && ndt_is_c_contiguous(stack_ptr->type)) {
-    int64_t nbytes = xndtools_fixed_nbytes(stack_ptr);
-    memcpy(ptr0, src, nbytes);
-    return nbytes;
-  } else if (fortran && ndt_is_f_contiguous(stack_ptr->type)) {
-    int64_t nbytes = xndtools_fixed_nbytes(stack_ptr);
+  if ((!fortran && ndt_is_c_contiguous(stack_ptr->type))
+      || (fortran && ndt_is_f_contiguous(stack_ptr->type))) {
     memcpy(ptr0, src, nbytes);
     return nbytes;
-  } else if (ndim>1) {
-    int64_t N = xnd_fixed_shape_at(stack_ptr, 0);
-    int64_t N1 = 1;
-    for (int64_t i=0; i<N; i++) {
-      xnd_t row = xnd_fixed_dim_next(stack_ptr, i);
-      N1 = xndtools_invcpy(src + N1*i, &row, fortran);
-      assert(N1>=1);
-    }
-    return N * N1;
-  } else if (ndim==1) {
-    int64_t N = xnd_fixed_shape_at(stack_ptr, 0);
-    int64_t step = stack_ptr->type->Concrete.FixedDim.step * itemsize;
-    switch (itemsize) { // todo: check if assignment is faster than memcpy or not
-    case 1:
-      {
-	const int8_t* in = (const int8_t*)src;
-	for (int64_t i=0; i< N; i++)
-	  *(int8_t*)(ptr0+i*step) = in[i];
-	break;
-      }
-    case 2:
-      {
-	const int16_t* in = (const int16_t*)src;
-	for (int64_t i=0; i< N; i++)
-	  *(int16_t*)(ptr0+i*step) = in[i];
-	break;
-      }
-    case 4:
-      {
-	const int32_t* in = (const int32_t*)src;
-	for (int64_t i=0; i< N; i++)
-	  *(int32_t*)(ptr0+i*step) = in[i];
-	break;
-      }
-    case 8:
-      {
-	const int64_t* in = (const int64_t*)src;
-	for (int64_t i=0; i< N; i++)
-	  *(int64_t*)(ptr0+i*step) = in[i];
-	break;
-      }
-    default:
-      {
-	for (int64_t i=0; i< N; i++)
-	  memcpy(ptr0+i*step, src+i*itemsize, itemsize);
-      }
-    }
-    return N*itemsize;
   }
-  return -1;
+  int ndim = xndtools_layout(stack_ptr, shape, strides);
+  xndtools_contiguous_strides(src_strides, shape, ndim, itemsize, fortran);
+  xndtools_strided_copy(ptr0, strides, src, src_strides, shape, ndim, itemsize);
+  return nbytes;
 }
-
-
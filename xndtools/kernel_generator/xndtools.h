@@ -1,14 +1,248 @@
+#ifndef XNDTOOLS_H
+#define XNDTOOLS_H
 
+#include <stdatomic.h>
 #include "xnd.h"
+
+#define XNDTOOLS_SCRATCH_DEFAULT_CAP (64 * 1024 * 1024) /* bytes cached per thread */
+#define XNDTOOLS_COPY_DEFAULT_THRESHOLD (4 * 1024 * 1024) /* min bytes for parallel copy */
+#define XNDTOOLS_ELEMENTWISE_TILE 4096 /* items per tile of elementwise kernels */
+#define XNDTOOLS_PROFILE_BUCKETS 64 /* log2 buckets of wrapper durations in ns */
+#define XNDTOOLS_LOG_CAPACITY 1024 /* entries in log ring buffer */
+#define XNDTOOLS_LOG_MESSAGE_SIZE 256
+
+typedef struct {
+  int64_t hits;    /* scratch requests served from thread cache */
+  int64_t misses;  /* scratch requests that required malloc */
+} xndtools_scratch_stats_t;
+
+typedef struct {
+  int64_t typemaps_ns;    /* checking typemaps */
+  int64_t add_kernels_ns; /* registering kernels with gm_add_kernel */
+  int64_t nsignatures;    /* number of registered kernel signatures */
+} xndtools_init_stats_t;
+
+typedef struct {
+  int64_t current; /* bytes of kernel temporaries in use */
+  int64_t peak;    /* high-water mark of current */
+  int64_t cap;     /* maximal current, negative means unlimited */
+} xndtools_memory_stats_t;
+
+/*
+  Leveled logging of kernel wrappers into a ring buffer. Messages are
+  formatted only when the level is enabled, see xndtools_log_set_level.
+ */
+enum {
+  XNDTOOLS_LOG_OFF = 0,
+  XNDTOOLS_LOG_ERROR,
+  XNDTOOLS_LOG_WARNING,
+  XNDTOOLS_LOG_INFO,
+  XNDTOOLS_LOG_DEBUG
+};
+
+typedef struct {
+  int64_t time_ns;  /* monotonic clock */
+  int level;
+  char message[XNDTOOLS_LOG_MESSAGE_SIZE];
+} xndtools_log_entry_t;
+
+extern atomic_int xndtools_log_level;
+
+#define XNDTOOLS_LOG(level, wrapper, ...)				\
+  do {									\
+    if (__builtin_expect(atomic_load_explicit(&xndtools_log_level, memory_order_relaxed) >= (level), 0)) \
+      xndtools_log_write((level), (wrapper), __VA_ARGS__);		\
+  } while (0)
+
+#define XNDTOOLS_LOG_TYPE(level, wrapper, name, type)			\
+  do {									\
+    if (__builtin_expect(atomic_load_explicit(&xndtools_log_level, memory_order_relaxed) >= (level), 0)) \
+      xndtools_log_write_type((level), (wrapper), (name), (type));	\
+  } while (0)
+
+extern void xndtools_log_set_level(int level, const char* filter);
+extern int xndtools_log_get_level(void);
+extern void xndtools_log_write(int level, const char* wrapper, const char* fmt, ...);
+extern void xndtools_log_write_type(int level, const char* wrapper, const char* name, const ndt_t* type);
+extern int64_t xndtools_log_read(xndtools_log_entry_t* entries, int64_t max, bool clear);
+
+/*
+  USDT probes of kernel wrappers, available when compiled with
+  -DXNDTOOLS_USDT (requires sys/sdt.h from systemtap):
+
+    xndtools:kernel_entry(wrapper, nitems)  nitems of the first argument
+    xndtools:kernel_exit(wrapper, status)
+    xndtools:copy_in(wrapper, argument, nitems, nbytes)
+    xndtools:copy_out(wrapper, argument, nitems, nbytes)
+
+  Probes have semaphores that are nonzero only while a tracer is
+  attached, so that probe arguments are not evaluated otherwise. The
+  semaphores are defined in xndtools.c, separately for each module.
+ */
+#ifdef XNDTOOLS_USDT
+#define _SDT_HAS_SEMAPHORES 1
+#include <sys/sdt.h>
+#define XNDTOOLS_PROBE_SEMAPHORE(name) \
+  xndtools_##name##_semaphore __attribute__((unused, section(".probes"), visibility("hidden")))
+extern unsigned short XNDTOOLS_PROBE_SEMAPHORE(kernel_entry);
+extern unsigned short XNDTOOLS_PROBE_SEMAPHORE(kernel_exit);
+extern unsigned short XNDTOOLS_PROBE_SEMAPHORE(copy_in);
+extern unsigned short XNDTOOLS_PROBE_SEMAPHORE(copy_out);
+#define XNDTOOLS_PROBE_ENABLED(name) __builtin_expect(xndtools_##name##_semaphore, 0)
+#define XNDTOOLS_PROBE_ENTRY(wrapper, nitems) do {				\
+    if (XNDTOOLS_PROBE_ENABLED(kernel_entry))				\
+      DTRACE_PROBE2(xndtools, kernel_entry, wrapper, nitems);		\
+  } while (0)
+#define XNDTOOLS_PROBE_EXIT(wrapper, status) do {				\
+    if (XNDTOOLS_PROBE_ENABLED(kernel_exit))				\
+      DTRACE_PROBE2(xndtools, kernel_exit, wrapper, status);		\
+  } while (0)
+#define XNDTOOLS_PROBE_COPY_IN(wrapper, argument, nitems, nbytes) do {	\
+    if (XNDTOOLS_PROBE_ENABLED(copy_in))				\
+      DTRACE_PROBE4(xndtools, copy_in, wrapper, argument, nitems, nbytes); \
+  } while (0)
+#define XNDTOOLS_PROBE_COPY_OUT(wrapper, argument, nitems, nbytes) do {	\
+    if (XNDTOOLS_PROBE_ENABLED(copy_out))				\
+      DTRACE_PROBE4(xndtools, copy_out, wrapper, argument, nitems, nbytes); \
+  } while (0)
+#else
+#define XNDTOOLS_PROBE_ENTRY(wrapper, nitems)
+#define XNDTOOLS_PROBE_EXIT(wrapper, status)
+#define XNDTOOLS_PROBE_COPY_IN(wrapper, argument, nitems, nbytes)
+#define XNDTOOLS_PROBE_COPY_OUT(wrapper, argument, nitems, nbytes)
+#endif
+
+/* Duration histogram of a kernel wrapper generated with profile = True */
+typedef struct {
+  atomic_int_fast64_t counts[XNDTOOLS_PROFILE_BUCKETS]; /* durations in [2**i, 2**(i+1)) ns */
+  atomic_int_fast64_t total_ns;
+} xndtools_kernel_profile_t;
+
+typedef struct {
+  int64_t count;
+  int64_t total_ns;
+  int64_t p50_ns;
+  int64_t p99_ns;
+} xndtools_kernel_profile_summary_t;
+
+/*
+  Time spent by a kernel wrapper generated with profile_phases = True
+  in staging the arguments before and after function calls, and in
+  the function calls.
+ */
+typedef struct {
+  atomic_int_fast64_t copy_in_ns;  /* before function calls, including between tiles */
+  atomic_int_fast64_t call_ns;     /* in function calls */
+  atomic_int_fast64_t copy_out_ns; /* after the last function call */
+} xndtools_kernel_phases_t;
+
+typedef struct {
+  int64_t copy_in_ns;
+  int64_t call_ns;
+  int64_t copy_out_ns;
+} xndtools_kernel_phases_summary_t;
+
+/* How an array argument of a kernel wrapper is passed to the function */
+typedef struct {
+  const char* name;              /* argument name */
+  const char* wrapper;           /* wrapper name */
+  int64_t itemsize;
+  atomic_int_fast64_t zero_copy; /* calls passing argument data as is */
+  atomic_int_fast64_t copy_in;   /* calls copying argument data to a temporary */
+  atomic_int_fast64_t copy_out;  /* calls copying a temporary to argument data */
+  atomic_int_fast64_t bytes;     /* bytes copied in and out */
+} xndtools_copy_stats_t;
+
+typedef struct {
+  int64_t zero_copy;
+  int64_t copy_in;
+  int64_t copy_out;
+  int64_t bytes;
+} xndtools_copy_stats_summary_t;
+
+/* Call statistics of a kernel wrapper, see gmk_<module>_kernel_stats */
+typedef struct {
+  const char* name;            /* wrapper name */
+  const char* kernel;          /* kernel name */
+  const char* kind;            /* kernel kind */
+  atomic_int_fast64_t calls;   /* number of wrapper calls */
+  xndtools_kernel_profile_t* profile; /* NULL unless profiled */
+  xndtools_kernel_phases_t* phases;   /* NULL unless phases are profiled */
+  xndtools_copy_stats_t* copy_stats;  /* array arguments */
+  int ncopy_stats;
+} xndtools_kernel_stats_t;
+
+static inline void xndtools_kernel_stats_call(xndtools_kernel_stats_t* stats) {
+  atomic_fetch_add_explicit(&stats->calls, 1, memory_order_relaxed);
+}
+
+static inline void xndtools_copy_stats_record(xndtools_copy_stats_t* stats, bool copy_in, bool copy_out, int64_t nbytes) {
+  if (copy_in) {
+    atomic_fetch_add_explicit(&stats->copy_in, 1, memory_order_relaxed);
+    XNDTOOLS_PROBE_COPY_IN(stats->wrapper, stats->name, nbytes / stats->itemsize, nbytes);
+  }
+  if (copy_out) {
+    atomic_fetch_add_explicit(&stats->copy_out, 1, memory_order_relaxed);
+    XNDTOOLS_PROBE_COPY_OUT(stats->wrapper, stats->name, nbytes / stats->itemsize, nbytes);
+  }
+  if (copy_in || copy_out)
+    atomic_fetch_add_explicit(&stats->bytes, nbytes * (copy_in + copy_out), memory_order_relaxed);
+  else
+    atomic_fetch_add_explicit(&stats->zero_copy, 1, memory_order_relaxed);
+}
+
+static inline void xndtools_kernel_phases_record(xndtools_kernel_phases_t* phases, int64_t copy_in_ns, int64_t call_ns, int64_t copy_out_ns) {
+  atomic_fetch_add_explicit(&phases->copy_in_ns, copy_in_ns, memory_order_relaxed);
+  atomic_fetch_add_explicit(&phases->call_ns, call_ns, memory_order_relaxed);
+  atomic_fetch_add_explicit(&phases->copy_out_ns, copy_out_ns, memory_order_relaxed);
+}
+
+extern int64_t xndtools_kernel_stats_get_calls(xndtools_kernel_stats_t* stats);
+extern void xndtools_kernel_stats_reset(xndtools_kernel_stats_t* stats);
+extern void xndtools_copy_stats_get_summary(xndtools_copy_stats_t* stats,
+					    xndtools_copy_stats_summary_t* summary);
+extern void xndtools_kernel_phases_get_summary(xndtools_kernel_phases_t* phases,
+					       xndtools_kernel_phases_summary_t* summary);
+extern int64_t xndtools_profile_clock(void);
+extern void xndtools_kernel_profile_record(xndtools_kernel_profile_t* profile, int64_t start);
+extern void xndtools_kernel_profile_get_summary(xndtools_kernel_profile_t* profile,
+						xndtools_kernel_profile_summary_t* summary);
+
+extern char* xndtools_malloc(int64_t nbytes, ndt_context_t *ctx);
+extern void xndtools_free(void* ptr);
+extern void xndtools_scratch_set_cap(int64_t cap);
+extern void xndtools_scratch_get_stats(xndtools_scratch_stats_t* stats);
+extern void xndtools_scratch_reset_stats(void);
+extern void xndtools_init_memory_cap(int64_t cap);
+extern void xndtools_set_memory_cap(int64_t cap);
+extern void xndtools_memory_get_stats(xndtools_memory_stats_t* stats);
+extern void xndtools_memory_reset_peak(void);
+
+extern void xndtools_set_copy_threads(int nthreads);
+extern int xndtools_get_copy_threads(void);
+
 extern int64_t xndtools_fixed_nbytes(const xnd_t* stack_ptr);
-extern int xndtools_cpy(char* dest, const xnd_t* stack_ptr, bool fortran);
+extern int64_t xndtools_fixed_nitems(const xnd_t* stack_ptr);
+extern void xndtools_tile_gather(char* dest, const xnd_t* stack_ptr, int64_t start, int64_t n);
+extern void xndtools_tile_scatter(const char* src, const xnd_t* stack_ptr, int64_t start, int64_t n);
+extern void xndtools_strided_gather(char* dest, const char* src, int64_t n, int64_t step, int64_t itemsize);
+extern void xndtools_strided_scatter(char* dest, int64_t step, const char* src, int64_t n, int64_t itemsize);
+extern int64_t xndtools_strided_increment(int64_t n, int64_t step, int64_t itemsize);
+extern char* xndtools_strided_increment_base(char* ptr, int64_t n, int64_t step);
+extern bool xndtools_is_row_strided(const xnd_t* stack_ptr);
+extern int64_t xndtools_leading_dimension(const xnd_t* stack_ptr);
+extern int64_t xndtools_increment(const xnd_t* stack_ptr);
+extern char* xndtools_increment_base(const xnd_t* stack_ptr);
+extern int64_t xndtools_cpy(char* dest, const xnd_t* stack_ptr, bool fortran);
 extern char* xndtools_copy(const xnd_t* stack_ptr, ndt_context_t *ctx);
 extern char* xndtools_fcopy(const xnd_t* stack_ptr, ndt_context_t *ctx);
 
-extern int xndtools_invcpy(const char* src, const xnd_t* stack_ptr, bool fortran);
-inline int xndtools_inv_copy(const char* src, const xnd_t* stack_ptr) {
+extern int64_t xndtools_invcpy(const char* src, const xnd_t* stack_ptr, bool fortran);
+inline int64_t xndtools_inv_copy(const char* src, const xnd_t* stack_ptr) {
   return xndtools_invcpy(src, stack_ptr, false);
 }
-inline int xndtools_inv_fcopy(const char* src, const xnd_t* stack_ptr) {
+inline int64_t xndtools_inv_fcopy(const char* src, const xnd_t* stack_ptr) {
   return xndtools_invcpy(src, stack_ptr, true);
 }
+
+#endif /* XNDTOOLS_H */